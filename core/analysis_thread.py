@@ -1,42 +1,177 @@
 import re
-import pandas as pd
-import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal
+from core.code_executor import run_generated_code
+from core.code_profiler import format_profile_report
+from core.cancellation import AnalysisCancelled, CancelToken
+from core.metrics import RunMetrics, span
 
 
 class AnalysisThread(QThread):
     update_signal = pyqtSignal(str)
+    stream_signal = pyqtSignal(str, str)  # 流式输出 (类型, 文本)，类型为 reasoning 或 content
+    progress_signal = pyqtSignal(int, int)  # 进度 (已完成, 总数)
     complete_signal = pyqtSignal(dict)
 
-    def __init__(self, processor, file_paths, request, mode):
+    def __init__(self, processor, file_paths, request, mode, stream=False, timeout=None, memory_limit_mb=None,
+                 profile=False, optimize_from=None, time_range=None):
         super().__init__()
         self.processor = processor
         self.file_paths = file_paths
         self.request = request
         self.mode = mode
+        self.stream = stream
+        self.profile = profile  # 代码执行时收集性能报告
+        self.optimize_from = optimize_from  # 根据上次的代码和性能报告生成更快的代码
+        self.time_range = time_range  # (开始, 结束)：只分析该时间范围内的数据（SQL查询模式除外）
+        # 取消令牌：界面取消按钮、时间上限（秒）和代码执行的内存上限（MB），0或None表示不限制
+        self.cancel_token = CancelToken(timeout, memory_limit_mb)
+        self.partial_result = None  # 取消时已得到的部分结果
+        self._streamed_content = []
+        self._progress = None
+        # 分阶段耗时记录，随完成信号交给界面展示并写入指标日志
+        self.metrics = RunMetrics(mode=mode, files=len(file_paths), request_chars=len(request),
+                                  backend=processor.dataframe_backend)
+
+    def cancel(self):
+        """请求取消分析（界面线程调用），正在进行的模型调用和代码执行会尽快中止"""
+        self.cancel_token.cancel()
+
+    def _on_chunk(self, kind, text):
+        if kind == "content":
+            self._streamed_content.append(text)
+        self.stream_signal.emit(kind, text)
 
     def run(self):
+        metrics_token = self.metrics.activate()
+        try:
+            self._run()
+        finally:
+            RunMetrics.deactivate(metrics_token)
+
+    def _complete(self, status, **payload):
+        self.metrics.finish(status)
+        self.complete_signal.emit({"status": status, "metrics": self.metrics, **payload})
+
+    def _run(self):
         try:
             self.update_signal.emit("正在进行分析...")
+            on_chunk = self._on_chunk if self.stream else None
             if self.mode == "1":
                 # 代码处理模式
-                code_block = self.processor.generate_processing_code(self.request, self.file_paths)
+                code_block = self.processor.generate_processing_code(self.request, self.file_paths,
+                                                                     on_chunk=on_chunk,
+                                                                     cancel_token=self.cancel_token,
+                                                                     optimize_from=self.optimize_from,
+                                                                     time_range=self.time_range)
+                self.cancel_token.check()
                 self.update_signal.emit("代码生成完成，开始执行...")
 
                 # 清理代码块，移除三重反引号和语言标识
                 cleaned_code = self.clean_code_block(code_block)  # 修复方法名引用
+                self.partial_result = {"summary": f"代码已生成，但未完成执行:\n{cleaned_code}"}
 
-                # 执行清理后的代码
+                # 执行清理后的代码，并将执行结果反馈给代码缓存和模型路由
                 result = self.execute_cleaned_code(cleaned_code)
+                succeeded = "error" not in result
+                self.processor.mark_generated_code(succeeded)
+
+                # 快速模型生成的代码执行失败时，改用推理模型重新生成
+                if not succeeded and self.processor.can_escalate_code_model():
+                    self.update_signal.emit("代码执行失败，改用推理模型重新生成...")
+                    code_block = self.processor.generate_processing_code(
+                        self.request, self.file_paths, on_chunk=on_chunk,
+                        model=self.processor.model_router.reasoner_model,
+                        cancel_token=self.cancel_token, time_range=self.time_range
+                    )
+                    self.cancel_token.check()
+                    self.update_signal.emit("代码生成完成，开始执行...")
+                    cleaned_code = self.clean_code_block(code_block)
+                    self.partial_result = {"summary": f"代码已生成，但未完成执行:\n{cleaned_code}"}
+                    result = self.execute_cleaned_code(cleaned_code)
+                    self.processor.mark_generated_code("error" not in result)
+            elif self.mode == "4":
+                # SQL查询模式
+                result = self.run_sql_mode(on_chunk)
+            elif self.mode == "3":
+                # 分块汇总模式
+                result = self.processor.map_reduce_answer(self.request, self.file_paths, progress=self.report_progress,
+                                                          cancel_token=self.cancel_token, time_range=self.time_range)
             else:
                 # 直接回答模式
-                result = self.processor.direct_answer(self.request, self.file_paths)
+                result = self.processor.direct_answer(self.request, self.file_paths, on_chunk=on_chunk,
+                                                      cancel_token=self.cancel_token, time_range=self.time_range)
 
-            self.complete_signal.emit({"status": "success", "result": result})
+            if self.time_range and self.mode != "4" and isinstance(result.get("summary"), str):
+                # 说明实际使用的时间范围，以及因无法识别时间而排除的行
+                result["summary"] = f"{self.processor.time_range_report()}\n\n{result['summary']}"
+            self._complete("success", result=result)
+        except AnalysisCancelled as e:
+            self._complete("cancelled", message=self._cancel_message(str(e)), result=self._collect_partial_result())
         except Exception as e:
-            self.complete_signal.emit({"status": "error", "message": str(e)})
+            self._complete("error", message=str(e))
+
+    def run_sql_mode(self, on_chunk):
+        """SQL查询模式：生成SQL并在嵌入式列式引擎中直接扫描源文件执行"""
+        engine = self.processor.open_sql_engine(self.file_paths)
+        try:
+            sql = self.processor.generate_sql(self.request, engine, on_chunk=on_chunk,
+                                              cancel_token=self.cancel_token)
+            self.cancel_token.check()
+            self.update_signal.emit("SQL生成完成，开始查询...")
+            result = self.execute_sql(engine, sql)
+            self.processor.mark_generated_code("error" not in result)
 
-    def clean_code_block(self, code_block):  # 修复方法名定义
+            # 快速模型生成的SQL执行失败时，改用推理模型重新生成
+            if "error" in result and self.processor.can_escalate_code_model():
+                self.update_signal.emit("SQL执行失败，改用推理模型重新生成...")
+                sql = self.processor.generate_sql(self.request, engine, on_chunk=on_chunk,
+                                                  model=self.processor.model_router.reasoner_model,
+                                                  cancel_token=self.cancel_token)
+                self.cancel_token.check()
+                self.update_signal.emit("SQL生成完成，开始查询...")
+                result = self.execute_sql(engine, sql)
+                self.processor.mark_generated_code("error" not in result)
+            return result
+        finally:
+            engine.close()
+
+    def execute_sql(self, engine, sql):
+        """执行SQL，返回与代码处理模式相同格式的结果"""
+        sql = self.clean_code_block(sql).rstrip(";").strip()
+        self.partial_result = {"summary": f"SQL已生成，但未完成查询:\n{sql}"}
+        try:
+            with span("sql_query") as record:
+                result_table = engine.query(sql, self.cancel_token)
+                record["rows"] = len(result_table)
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            return {"summary": f"SQL执行错误: {str(e)}\n\n执行的SQL:\n{sql}", "error": str(e)}
+        summary = f"查询返回 {len(result_table)} 行 × {len(result_table.columns)} 列\n\n执行的SQL:\n{sql}"
+        return {"result_table": result_table, "summary": summary}
+
+    def _cancel_message(self, reason):
+        if self.mode == "3" and self._progress:
+            done, total = self._progress
+            return f"{reason}：已完成 {done}/{total} 个分块，已完成的分块结论已缓存，重新运行时直接复用"
+        return reason
+
+    def _collect_partial_result(self):
+        """取消时返回已得到的部分结果：已生成的代码或已流式输出的回答"""
+        if self.partial_result:
+            return self.partial_result
+        if self._streamed_content:
+            return {"summary": "".join(self._streamed_content) + "\n\n（回答未完成，分析已中止）"}
+        return None
+
+    def report_progress(self, done, total, message):
+        """上报进度（可在其他线程中调用，信号会排队送达界面线程）"""
+        self._progress = (done, total)
+        self.progress_signal.emit(done, total)
+        self.update_signal.emit(message)
+
+    @staticmethod
+    def clean_code_block(code_block):  # 修复方法名定义
         """清理代码块，移除三重反引号和语言标识"""
         if not code_block:
             return ""
@@ -49,26 +184,33 @@ class AnalysisThread(QThread):
     def execute_cleaned_code(self, cleaned_code):  # 修复方法名
         """执行完整代码（无包装函数）"""
         # 准备数据字典
-        data_dict = self.processor.load_data_files(self.file_paths)
+        data_dict = self.processor.load_data_files(self.file_paths, time_range=self.time_range)
 
         # 构建完整执行代码（修复缩进问题）
         full_code = f"{cleaned_code}\n"  # 不添加额外缩进
 
-        # 执行代码
-        local_vars = {
-            'data_dict': data_dict,
-            'pd': pd,
-            'np': np
-        }
-        try:
-            exec(full_code, globals(), local_vars)
-
-            # 提取结果
-            result_table = local_vars.get('result_table')
-            summary = local_vars.get('summary', '分析完成但未生成总结')
+        # 在独立执行进程中运行（未启用进程池时在当前线程运行，此时无法中途终止执行）
+        self.cancel_token.check()
+        backend = self.processor.dataframe_backend
+        with span("execute", rows=sum(len(df) for df in data_dict.values()), backend=backend,
+                  isolated=self.processor.code_executor is not None) as record:
+            cache_paths = self.processor.helper_cache_paths(data_dict)
+            if self.processor.code_executor:
+                result = self.processor.code_executor.execute(full_code, data_dict, self.cancel_token, backend,
+                                                              self.profile, cache_paths)
+            else:
+                result = run_generated_code(full_code, data_dict, backend, self.profile, cache_paths)
+            if result.get("result_table") is not None:
+                record["output_rows"] = len(result["result_table"])
 
-            return {"result_table": result_table, "summary": summary}
-        except Exception as e:
+        if "error" in result:
             return {
-                "summary": f"代码执行错误: {str(e)}\n\n执行的代码:\n{full_code}"
+                "summary": f"代码执行错误: {result['error']}\n\n执行的代码:\n{full_code}",
+                "error": result["error"]
             }
+        output = {"result_table": result["result_table"], "summary": result["summary"], "code": cleaned_code}
+        if "profile" in result:
+            # 性能报告附在总结之后，并保留供"生成更快的代码"使用
+            output["profile_report"] = format_profile_report(result["profile"])
+            output["summary"] = f"{result['summary']}\n\n【性能分析】\n{output['profile_report']}"
+        return output
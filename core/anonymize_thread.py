@@ -0,0 +1,59 @@
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.cancellation import AnalysisCancelled, CancelToken
+
+
+class AnonymizeThread(QThread):
+    """后台去敏文件，按文件和字节报告进度并估算剩余时间"""
+    # 进度字典：file_index、file_count、file_name、bytes_done、bytes_total、eta_seconds（无法估算时为None）
+    progress_signal = pyqtSignal(dict)
+    complete_signal = pyqtSignal(dict)
+
+    PROGRESS_INTERVAL = 0.1  # 进度信号的最小间隔（秒），避免频繁刷新界面
+
+    def __init__(self, processor, file_names, output_dir):
+        super().__init__()
+        self.processor = processor
+        self.file_names = file_names
+        self.output_dir = output_dir
+        self.cancel_token = CancelToken()
+        self._start = None
+        self._last_emit = 0.0
+        self._last_file = None
+
+    def cancel(self):
+        self.cancel_token.cancel("已取消去敏")
+
+    def _on_progress(self, file_index, file_count, file_name, bytes_done, bytes_total):
+        now = time.perf_counter()
+        # 切换文件和全部完成时立即刷新，其余按间隔节流
+        if file_index == self._last_file and now - self._last_emit < self.PROGRESS_INTERVAL:
+            return
+        self._last_file = file_index
+        self._last_emit = now
+
+        elapsed = now - self._start
+        eta = None
+        if bytes_done > 0 and elapsed > 0.5:
+            eta = elapsed / bytes_done * (bytes_total - bytes_done)
+        self.progress_signal.emit({
+            "file_index": file_index,
+            "file_count": file_count,
+            "file_name": file_name,
+            "bytes_done": bytes_done,
+            "bytes_total": bytes_total,
+            "eta_seconds": eta
+        })
+
+    def run(self):
+        self._start = time.perf_counter()
+        try:
+            results = self.processor.process_and_anonymize_files(
+                self.file_names, self.output_dir,
+                progress=self._on_progress, cancel_token=self.cancel_token
+            )
+            self.complete_signal.emit({"status": "success", "results": results})
+        except AnalysisCancelled as e:
+            self.complete_signal.emit({"status": "cancelled", "message": str(e)})
+        except Exception as e:
+            self.complete_signal.emit({"status": "error", "message": str(e)})
@@ -1,61 +1,519 @@
 import time
 import json
 import os
+import random
+import asyncio
+import hashlib
+import threading
+import queue
+import email.utils
+import concurrent.futures
+import contextvars
+from collections import defaultdict, deque
 from datetime import datetime
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from core.cancellation import CancelToken
+from core.metrics import span
+
+
+class _EventLoopThread:
+    """后台事件循环线程：所有异步API调用共享同一个事件循环和HTTP连接池"""
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="api-event-loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """提交协程到后台事件循环，返回 concurrent.futures.Future；
+        协程继承提交线程的上下文变量（如当前分析的耗时记录器）"""
+        context = contextvars.copy_context()
+
+        async def run_in_context():
+            for var, value in context.items():
+                var.set(value)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(run_in_context(), self.loop)
+
+    def run(self, coro, cancel_token=None):
+        """在后台事件循环中执行协程并等待结果（供同步代码调用）；
+        提供 cancel_token 时定期检查，取消或超时后取消协程并抛出 AnalysisCancelled"""
+        future = self.submit(coro)
+        if cancel_token is None:
+            return future.result()
+        try:
+            while not future.done():
+                cancel_token.check()
+                concurrent.futures.wait([future], timeout=CancelToken.POLL_INTERVAL)
+            return future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+
+class AsyncRateLimiter:
+    """请求速率限制：按固定间隔放行请求；服务端返回 Retry-After 时整体暂停"""
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.next_time = 0.0
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        # 事件循环单线程执行，计算预约时间的过程中没有await，无需加锁
+        now = time.monotonic()
+        start = max(now, self.next_time, self.paused_until)
+        self.next_time = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
 
 class DeepSeekAPI:
-    def __init__(self, api_key, sensitive_processor=None):
+    SYSTEM_PROMPT = "你是专业的信息安全日志分析专家，根据用户要求解决日志分析问题。"
+
+    # 可重试的HTTP状态码（超时、冲突、限流、服务端错误），其余4xx（如鉴权失败）直接失败
+    RETRYABLE_STATUS = {408, 409, 429}
+
+    # 对冲请求：每个模型至少有这么多次耗时样本后才启用
+    HEDGE_MIN_SAMPLES = 10
+
+    def __init__(self, api_key, sensitive_processor=None, base_url="https://api.deepseek.com", response_cache=None,
+                 max_concurrency=4, requests_per_minute=60, timeout=600, backoff_base=1.0, backoff_max=30.0,
+                 hedge_requests=False, hedge_percentile=0.95, hedge_budget=20, hedge_min_delay=2.0):
         self.api_key = api_key
         self.sensitive_processor = sensitive_processor  # 添加敏感词处理器
-        # 官方示例的客户端初始化
-        self.client = OpenAI(
+        # 响应缓存（DiskCache），键为去敏后提示词及调用参数的哈希
+        self.response_cache = response_cache
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 异步客户端内部复用同一个HTTP连接池；重试由本类按错误类型控制，关闭SDK自带重试
+        # （base_url可指向本地OpenAI兼容服务用于测试）
+        self.client = AsyncOpenAI(
             api_key=api_key,
-            base_url="https://api.deepseek.com"
+            base_url=base_url,
+            max_retries=0,
+            timeout=timeout
         )
+        # 并发与速率限制，同一客户端上的所有分析共享
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = AsyncRateLimiter(requests_per_minute)
+        self.loop_thread = _EventLoopThread.get()
+
+        # 对冲请求：超过历史耗时的指定分位数仍未返回时，发送一个重复请求，先返回者胜出
+        self.hedge_requests = hedge_requests
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget  # 本次会话最多发送的重复请求数
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_stats = {"hedged": 0, "hedge_wins": 0}
+        self.latencies = defaultdict(lambda: deque(maxlen=200))  # 格式: {模型: 最近的网络耗时}
+        # 流式请求按首个数据块的等待时间对冲，格式: {模型: 最近的首块耗时}
+        self.first_chunk_latencies = defaultdict(lambda: deque(maxlen=200))
 
-    def completions_create(self, model="deepseek-reasoner", prompt=None, max_tokens=5000, temperature=0.3, retry=3):
+    def _build_messages(self, processed_prompt):
+        return [
+            {"role": "system",
+             "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": processed_prompt}
+        ]
+
+    def _sanitize_prompt(self, prompt):
+        """敏感词替换"""
         if not prompt:
             raise ValueError("prompt不能为空")
-
-        # 敏感词替换
-        replace_count = None
-        processed_prompt = prompt
         if self.sensitive_processor:
+            with span("sanitize", bytes=len(prompt.encode('utf-8'))):
+                processed_prompt, _ = self.sensitive_processor.replace_sensitive_words(prompt)
+            return processed_prompt
+        return prompt
+
+    def _cache_key(self, processed_prompt, model, temperature, max_tokens, use_cache):
+        if not (self.response_cache and use_cache):
+            return None
+        return self.response_cache.make_key(self.SYSTEM_PROMPT, processed_prompt, model, temperature, max_tokens)
+
+    def _cache_get(self, cache_key):
+        """查询响应缓存（缓存中保存的是还原前的原始响应，不含敏感词）"""
+        if not cache_key:
+            return None
+        entry = self.response_cache.get(cache_key)
+        if not entry:
+            return None
+        try:
+            return ChatCompletion.model_validate(entry["response"])
+        except Exception as e:
+            print(f"解析缓存响应失败: {str(e)}")
+            self.response_cache.delete(cache_key)
+            return None
+
+    def _cache_set(self, cache_key, processed_prompt, model, response_data):
+        if cache_key:
+            self.response_cache.set(cache_key, {
+                "prompt_hash": hashlib.sha256(processed_prompt.encode('utf-8')).hexdigest(),
+                "model": model,
+                "response": response_data
+            })
+
+    def _is_retryable(self, error):
+        """区分可重试错误（网络、超时、限流、5xx）与不可重试错误（鉴权、参数错误等）"""
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in self.RETRYABLE_STATUS or error.status_code >= 500
+        return False
+
+    @staticmethod
+    def _retry_after(error):
+        """解析服务端返回的 Retry-After（秒数或HTTP日期），没有则返回None"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                retry_time = email.utils.parsedate_to_datetime(retry_after)
+                return max(0.0, retry_time.timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def _backoff_delay(self, attempt, error):
+        """指数退避（带随机抖动），服务端指定 Retry-After 时以其为准"""
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limiter.pause(retry_after)
+            return retry_after
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    async def _send(self, **kwargs):
+        """发送一次非流式请求（受速率和并发限制），成功时记录网络耗时"""
+        await self.rate_limiter.acquire()
+        async with self.semaphore:
+            start_time = time.monotonic()
+            response = await self.client.chat.completions.create(**kwargs)
+        self.latencies[kwargs["model"]].append(time.monotonic() - start_time)
+        return response
 
-            processed_prompt, replace_count = self.sensitive_processor.replace_sensitive_words(prompt)
+    def _hedge_delay(self, model, latencies=None):
+        """返回发送对冲请求前的等待时间；未启用、样本不足或预算用尽时返回None。
+        latencies 为耗时样本（默认为非流式请求的网络耗时）"""
+        if not self.hedge_requests or self.hedge_stats["hedged"] >= self.hedge_budget:
+            return None
+        samples = sorted((latencies if latencies is not None else self.latencies)[model])
+        if len(samples) < self.HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile))
+        return max(self.hedge_min_delay, samples[index])
 
-            # 显示处理后的请求
+    async def _create_with_hedging(self, **kwargs):
+        """发送请求；超过耗时分位数仍未返回时发送重复请求，取先成功者并取消另一个"""
+        primary = asyncio.ensure_future(self._send(**kwargs))
+        delay = self._hedge_delay(kwargs["model"])
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            # 调用方被取消（用户取消或超时）时，asyncio.wait 不会取消等待中的请求
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self.hedge_stats["hedged"] += 1
+        backup = asyncio.ensure_future(self._send(**kwargs))
+        pending = {primary, backup}
+        first_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_stats["hedge_wins"] += 1
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _start_stream(self, **kwargs):
+        """打开流式请求并等待第一个数据块（受速率和并发限制），返回 (流, 迭代器, 第一个数据块)；
+        数据块为None表示流为空。成功时占用的并发名额由调用方通过 _release_stream 释放"""
+        await self.rate_limiter.acquire()
+        await self.semaphore.acquire()
+        stream = None
+        try:
+            start_time = time.monotonic()
+            stream = await self.client.chat.completions.create(**kwargs)
+            iterator = stream.__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                first = None
+            self.first_chunk_latencies[kwargs["model"]].append(time.monotonic() - start_time)
+            return stream, iterator, first
+        except BaseException:
+            # 出错或被取消（对冲中落败）时关闭连接并释放名额
+            await self._release_stream(stream)
+            raise
+
+    async def _release_stream(self, stream):
+        try:
+            if stream is not None:
+                await stream.close()
+        finally:
+            self.semaphore.release()
+
+    async def _discard_stream_task(self, task):
+        """丢弃打开流的任务：未完成时取消（由 _start_stream 自行释放名额），已打开的流关闭并释放名额"""
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            await self._release_stream(task.result()[0])
+
+    async def _start_stream_with_hedging(self, **kwargs):
+        """打开流式请求；超过首块耗时分位数仍未收到数据时发送重复请求，
+        保留先收到数据的流，取消并关闭另一个"""
+        primary = asyncio.ensure_future(self._start_stream(**kwargs))
+        delay = self._hedge_delay(kwargs["model"], self.first_chunk_latencies)
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            await self._discard_stream_task(primary)
+            raise
+        if done:
+            return primary.result()
+
+        self.hedge_stats["hedged"] += 1
+        backup = asyncio.ensure_future(self._start_stream(**kwargs))
+        pending = {primary, backup}
+        winner = None
+        first_error = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        # 两个请求同时收到数据：关闭落败的流
+                        await self._release_stream(task.result()[0])
+            if winner is None:
+                raise first_error
+            if winner is backup:
+                self.hedge_stats["hedge_wins"] += 1
+            return winner.result()
+        finally:
+            # 取消时 pending 中的任务可能已经打开了流
+            for task in pending:
+                await self._discard_stream_task(task)
+
+    @staticmethod
+    async def _stream_chunks(iterator, first):
+        chunk = first
+        while chunk is not None:
+            yield chunk
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+
+    async def acompletions_create(self, model="deepseek-reasoner", prompt=None, max_tokens=5000, temperature=0.3,
+                                  retry=3, use_cache=True):
+        """异步调用（在共享事件循环中执行），可与其他调用并发"""
+        # 敏感词替换（CPU密集）与磁盘缓存读写放到线程池执行，避免阻塞共享事件循环上的其他并发调用
+        processed_prompt = await asyncio.to_thread(self._sanitize_prompt, prompt)
+
+        cache_key = self._cache_key(processed_prompt, model, temperature, max_tokens, use_cache)
+        cached = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached is not None:
+            return await asyncio.to_thread(self._restore_response, cached)
 
         attempt = 0
-        while attempt < retry:
+        while True:
             try:
-                # 完全对齐官方示例的参数结构
-                response = self.client.chat.completions.create(
+                response = await self._create_with_hedging(
                     model=model,
-                    messages=[
-                        {"role": "system",
-                         "content": "你是专业的信息安全日志分析专家，根据用户要求解决日志分析问题。"},
-                        {"role": "user", "content": processed_prompt}
-                    ],
+                    messages=self._build_messages(processed_prompt),
                     max_tokens=max_tokens,
                     temperature=temperature,
                     stream=False
                 )
 
-                # 敏感词还原
-                if self.sensitive_processor and response.choices[0].message.content:
-                    response.choices[0].message.content = self.sensitive_processor.restore_sensitive_words(
-                        response.choices[0].message.content
-                    )
+                if response.choices and response.choices[0].message.content:
+                    await asyncio.to_thread(self._cache_set, cache_key, processed_prompt, model,
+                                            response.model_dump(mode='json'))
+
+                return await asyncio.to_thread(self._restore_response, response)
+            except Exception as e:
+                attempt += 1
+                print(f"API调用出错 (尝试 {attempt}/{retry}): {str(e)}")
+                if not self._is_retryable(e):
+                    raise Exception(f"API调用失败（不可重试的错误）: {str(e)}") from e
+                if attempt >= retry:
+                    raise Exception(f"API调用失败，已达到最大重试次数 ({retry}次)") from e
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+
+    def completions_create(self, model="deepseek-reasoner", prompt=None, max_tokens=5000, temperature=0.3, retry=3,
+                           use_cache=True, cancel_token=None):
+        return self.loop_thread.run(self.acompletions_create(
+            model=model, prompt=prompt, max_tokens=max_tokens, temperature=temperature,
+            retry=retry, use_cache=use_cache
+        ), cancel_token)
+
+    def _restore_response(self, response):
+        """敏感词还原"""
+        if self.sensitive_processor and response.choices[0].message.content:
+            content = response.choices[0].message.content
+            with span("restore", bytes=len(content.encode('utf-8'))):
+                response.choices[0].message.content = self.sensitive_processor.restore_sensitive_words(content)
+        return response
+
+    async def acompletions_stream(self, model="deepseek-reasoner", prompt=None, max_tokens=5000, temperature=0.3,
+                                  retry=3, use_cache=True):
+        """异步流式调用：逐块产出 (类型, 已还原文本)，类型为 "reasoning"（推理过程）或 "content"（回答）。
+        敏感词还原在数据块之间增量进行，跨块的替换词会等待完整后再输出"""
+        # 敏感词替换（CPU密集）与磁盘缓存读写放到线程池执行，避免阻塞共享事件循环上的其他并发调用
+        processed_prompt = await asyncio.to_thread(self._sanitize_prompt, prompt)
+
+        cache_key = self._cache_key(processed_prompt, model, temperature, max_tokens, use_cache)
+        cached = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached is not None:
+            restored = await asyncio.to_thread(self._restore_response, cached)
+            yield "content", restored.choices[0].message.content
+            return
+
+        attempt = 0
+        while True:
+            restorers = {}
+            content_parts = []
+            emitted = False
+            try:
+                stream, iterator, first = await self._start_stream_with_hedging(
+                    model=model,
+                    messages=self._build_messages(processed_prompt),
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True
+                )
+                try:
+                    async for chunk in self._stream_chunks(iterator, first):
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        for kind, text in (("reasoning", getattr(delta, "reasoning_content", None)),
+                                           ("content", delta.content)):
+                            if not text:
+                                continue
+                            if kind == "content":
+                                content_parts.append(text)
+                            if self.sensitive_processor:
+                                if kind not in restorers:
+                                    restorers[kind] = self.sensitive_processor.create_stream_restorer()
+                                text = restorers[kind].feed(text)
+                            if text:
+                                emitted = True
+                                yield kind, text
+                finally:
+                    await self._release_stream(stream)
+
+                for kind, restorer in restorers.items():
+                    rest = restorer.flush()
+                    if rest:
+                        yield kind, rest
 
-                return response
+                content = "".join(content_parts)
+                if content:
+                    await asyncio.to_thread(self._cache_set, cache_key, processed_prompt, model, {
+                        "id": "stream", "object": "chat.completion", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}]
+                    })
+                return
             except Exception as e:
                 attempt += 1
-                error_msg = f"API调用出错 (尝试 {attempt}/{retry}): {str(e)}"
-                print(error_msg)
+                print(f"API流式调用出错 (尝试 {attempt}/{retry}): {str(e)}")
+                # 已经输出过内容时不能重试，否则界面上会出现重复文本
+                if emitted or not self._is_retryable(e):
+                    raise Exception(f"API调用失败（不可重试的错误）: {str(e)}") from e
+                if attempt >= retry:
+                    raise Exception(f"API调用失败，已达到最大重试次数 ({retry}次)") from e
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+
+    def completions_stream(self, model="deepseek-reasoner", prompt=None, max_tokens=5000, temperature=0.3, retry=3,
+                           use_cache=True, cancel_token=None):
+        """同步流式调用：在后台事件循环中消费异步流，通过队列逐块交给调用线程。
+        提供 cancel_token 时，取消或超时后停止接收并取消后台请求"""
+        chunks = queue.Queue()
+        done = object()
 
-                if attempt < retry:
-                    time.sleep(2)
+        async def pump():
+            try:
+                async for item in self.acompletions_stream(
+                        model=model, prompt=prompt, max_tokens=max_tokens, temperature=temperature,
+                        retry=retry, use_cache=use_cache):
+                    chunks.put(item)
+            except BaseException as e:
+                chunks.put(e)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                chunks.put(done)
 
-        raise Exception(f"API调用失败，已达到最大重试次数 ({retry}次)")
+        future = self.loop_thread.submit(pump())
+        try:
+            while True:
+                if cancel_token is None:
+                    item = chunks.get()
+                else:
+                    cancel_token.check()
+                    try:
+                        item = chunks.get(timeout=CancelToken.POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 调用方提前停止迭代时取消后台请求，释放连接
+            if not future.done():
+                future.cancel()
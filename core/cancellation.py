@@ -0,0 +1,43 @@
+import time
+import threading
+
+
+class AnalysisCancelled(Exception):
+    """分析被取消（用户取消、超时或超出内存上限）"""
+
+
+class CancelToken:
+    """一次分析的取消令牌：由界面线程取消，分析过程中的各阶段定期检查；
+    同时记录本次分析的时间和内存上限"""
+
+    POLL_INTERVAL = 0.1  # 阻塞等待时检查取消状态的间隔（秒）
+
+    def __init__(self, timeout=None, memory_limit_mb=None):
+        self.timeout = timeout or None
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024) if memory_limit_mb else None
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason="分析已取消"):
+        """取消分析（可在任意线程调用，只记录第一次的原因）"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"分析超时（超过 {self.timeout} 秒）")
+        return self._event.is_set()
+
+    def remaining(self):
+        """距离超时的剩余秒数，没有时间上限时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """已取消或超时时抛出 AnalysisCancelled"""
+        if self.cancelled:
+            raise AnalysisCancelled(self.reason)
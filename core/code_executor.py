@@ -0,0 +1,412 @@
+import gc
+import os
+import pickle
+import threading
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from core.template_miner import mine_templates
+from core.token_index import lookup_token_rows
+from core.sketches import open_sketches
+from core.data_profiler import DataProfiler
+from core.cancellation import CancelToken
+from core.code_profiler import exec_profiled
+
+try:
+    import pyarrow as pa
+except ImportError:  # 没有pyarrow时退回pickle序列化（仍通过共享内存传输）
+    pa = None
+
+try:
+    import polars as pl
+except ImportError:  # 未安装polars时只能使用pandas后端
+    pl = None
+
+try:
+    import psutil
+except ImportError:  # 没有psutil时在Linux上读取 /proc 获取内存占用
+    psutil = None
+
+
+def check_backend(backend):
+    """检查数据处理后端是否可用"""
+    if backend == "polars" and pl is None:
+        raise ValueError("polars后端需要安装polars（pip install polars）")
+
+
+def _to_lazy_frame(df):
+    """pandas DataFrame 转为 polars LazyFrame（polars 的查询在所有CPU核心上并行执行）"""
+    if isinstance(df, pl.LazyFrame):
+        return df
+    if isinstance(df, pl.DataFrame):
+        return df.lazy()
+    return pl.from_pandas(df).lazy()
+
+
+def to_pandas(table):
+    """将结果表转换为pandas DataFrame供界面展示；polars结果使用Arrow扩展类型，避免复制数据"""
+    if pl is not None:
+        if isinstance(table, pl.LazyFrame):
+            table = table.collect()
+        if isinstance(table, pl.DataFrame):
+            return table.to_pandas(use_pyarrow_extension_array=True)
+        if isinstance(table, pl.Series):
+            return table.to_frame().to_pandas(use_pyarrow_extension_array=True)
+    return table
+
+
+def _index_frame(df):
+    """建立令牌索引只需要文本列，polars数据转为pandas"""
+    if pl is not None and isinstance(df, pl.DataFrame):
+        return df.select(pl.col(pl.String)).to_pandas()
+    return df
+
+
+def _pandas_frame(df):
+    """计算概要使用pandas数据，polars数据转为pandas"""
+    if pl is not None and isinstance(df, pl.DataFrame):
+        return df.to_pandas()
+    return df
+
+
+def build_exec_namespace(data_dict, backend="pandas", cache_paths=None):
+    """生成代码执行时可用的变量；polars后端时 data_dict 中为 LazyFrame。
+    cache_paths 为 {文件名: {"token_index": 令牌索引路径, "sketches": 概要缓存路径}}：
+    lookup 按IP、用户名、主机名、哈希查找行时使用令牌索引，approx_* 使用近似统计概要（均在首次使用时建立）"""
+    cache_paths = cache_paths or {}
+    # 行号对应读取时的原始数据，生成的代码替换 data_dict 中的表后查找结果不受影响
+    originals = dict(data_dict)
+    sketches = {}  # 没有缓存路径时本次执行内只计算一次
+
+    def lookup_rows(file_name, *tokens):
+        """包含任一令牌的行位置（有序的numpy数组）"""
+        return lookup_token_rows(_index_frame(originals[file_name]), tokens,
+                                 cache_paths.get(file_name, {}).get("token_index"))
+
+    def lookup(file_name, *tokens):
+        """包含任一令牌的行"""
+        rows = lookup_rows(file_name, *tokens)
+        if backend == "polars":
+            return (_to_lazy_frame(originals[file_name]).with_row_index('__row__')
+                    .filter(pl.col('__row__').is_in(rows.tolist())).drop('__row__'))
+        return originals[file_name].iloc[rows]
+
+    def file_sketches(file_name):
+        if file_name not in sketches:
+            df = _pandas_frame(originals[file_name])
+            sketches[file_name] = open_sketches(cache_paths.get(file_name, {}).get("sketches"), df,
+                                                DataProfiler.message_columns(df))
+        return sketches[file_name]
+
+    def approx_distinct(file_name, column):
+        """列的去重数估计（相对误差约1%）"""
+        return file_sketches(file_name).distinct(column)
+
+    def approx_top_k(file_name, column, k=10):
+        """列的高频值估计：DataFrame(值, 次数, 误差)，真实次数在 [次数-误差, 次数] 之间"""
+        return pd.DataFrame(file_sketches(file_name).top_k(column, k), columns=['value', 'count', 'error'])
+
+    def approx_quantile(file_name, column, q):
+        """数值列的分位数估计，q为0~1之间的数或数列"""
+        digest = file_sketches(file_name)
+        if np.ndim(q):
+            return [digest.quantile(column, item) for item in q]
+        return digest.quantile(column, q)
+
+    def approx_count(file_name, column, value):
+        """某个值在列中出现次数的估计（不小于真实次数）"""
+        return file_sketches(file_name).column(column).estimate_count(value)
+
+    namespace = {
+        'data_dict': data_dict,
+        'pd': pd,
+        'np': np,
+        'mine_templates': mine_templates,
+        'lookup': lookup,
+        'lookup_rows': lookup_rows,
+        'approx_distinct': approx_distinct,
+        'approx_top_k': approx_top_k,
+        'approx_quantile': approx_quantile,
+        'approx_count': approx_count
+    }
+    if backend == "polars":
+        namespace['pl'] = pl
+        namespace['data_dict'] = {name: _to_lazy_frame(df) for name, df in data_dict.items()}
+    return namespace
+
+
+def run_generated_code(code, data_dict, backend="pandas", profile=False, cache_paths=None):
+    """执行生成的代码，返回 {"result_table", "summary"}，出错时返回 {"error"}；
+    profile 为True时附加性能报告 {"profile"}（CPU热点行、函数和内存分配）"""
+    # 全局与局部使用同一命名空间，与直接运行脚本的行为一致（推导式、lambda中可引用顶层变量）
+    local_vars = build_exec_namespace(data_dict, backend, cache_paths)
+    report = None
+    try:
+        if profile:
+            report = exec_profiled(code, local_vars)
+        else:
+            exec(code, local_vars)
+        result_table = to_pandas(local_vars.get('result_table'))
+    except Exception as e:
+        return {"error": str(e), "traceback": traceback.format_exc()}
+
+    result = {
+        "result_table": result_table,
+        "summary": local_vars.get('summary', '分析完成但未生成总结')
+    }
+    if report is not None:
+        result["profile"] = report
+    return result
+
+
+def _write_ipc(table, sink):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _write_shared(df):
+    """将DataFrame写入共享内存：优先Arrow IPC格式，无法转换时使用pickle，返回 (共享内存, 描述)"""
+    table = None
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowException, TypeError, ValueError):
+            table = None
+    if table is not None:
+        # 先用不落数据的计数流得到IPC流大小，再直接写入共享内存，避免中间缓冲区和再次复制
+        counter = pa.MockOutputStream()
+        _write_ipc(table, counter)
+        size = counter.size()
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        target = pa.py_buffer(shm.buf)
+        try:
+            _write_ipc(table, pa.FixedSizeBufferWriter(target))
+        except BaseException:
+            del target
+            shm.close()
+            shm.unlink()
+            raise
+        del target  # 释放对共享内存的引用，之后才能关闭映射
+        return shm, {"name": shm.name, "size": size, "format": "arrow"}
+
+    payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    size = len(payload)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shm.buf[:size] = memoryview(payload).cast('B')
+    return shm, {"name": shm.name, "size": size, "format": "pickle"}
+
+
+def _read_shared(desc, backend="pandas"):
+    """从共享内存读取DataFrame，返回 (共享内存, 内存视图, DataFrame)。
+    Arrow格式的数值列直接引用共享内存（零拷贝），使用完DataFrame后才能释放视图和关闭共享内存"""
+    shm = shared_memory.SharedMemory(name=desc["name"])
+    buffer = shm.buf[:desc["size"]]
+    if desc["format"] == "arrow":
+        # 直接在共享内存上解析Arrow数据，不经过pickle；polars后端直接由Arrow表构建
+        table = pa.ipc.open_stream(pa.py_buffer(buffer)).read_all()
+        if backend == "polars":
+            # polars没有行索引，去掉pandas索引列
+            metadata = table.schema.pandas_metadata or {}
+            index_columns = [c for c in metadata.get("index_columns", []) if isinstance(c, str)]
+            df = pl.from_arrow(table.drop_columns(index_columns), rechunk=False)
+        else:
+            df = table.to_pandas()
+        del table
+    else:
+        df = pickle.loads(buffer)
+    return shm, buffer, df
+
+
+def _close_shared(segments):
+    """释放内存视图并关闭共享内存映射；仍被引用时保留映射，由进程退出时回收"""
+    for shm, buffer in segments:
+        try:
+            buffer.release()
+            shm.close()
+        except BufferError:
+            _unreleased.append((shm, buffer))
+
+
+_unreleased = []
+
+
+def _process_memory(pid):
+    """进程的物理内存占用（字节），无法获取时返回None"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker_main(conn):
+    """执行进程主循环：启动时已导入pandas/numpy（预热），逐个接收任务并返回结果"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        segments = []
+        data_dict = {}
+        backend = task.get("backend", "pandas")
+        try:
+            for filename, desc in task["data"].items():
+                shm, buffer, df = _read_shared(desc, backend)
+                segments.append((shm, buffer))
+                data_dict[filename] = df
+            result = run_generated_code(task["code"], data_dict, backend, task.get("profile", False),
+                                        task.get("cache_paths"))
+        except Exception as e:
+            result = {"error": f"加载数据失败: {str(e)}", "traceback": traceback.format_exc()}
+
+        try:
+            conn.send(result)
+        except Exception as e:
+            # 结果无法序列化时只返回错误信息
+            conn.send({"error": f"结果传回失败: {str(e)}"})
+
+        # 释放对共享内存的引用后再关闭映射
+        del data_dict, result
+        df = None
+        gc.collect()
+        _close_shared(segments)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True,
+                                       name="code-executor")
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        """强制结束执行进程（取消、超时或内存超限时使用）"""
+        self.process.kill()
+        self.process.join(timeout=1)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class CodeExecutor:
+    """预热的独立执行进程池：生成的代码在子进程中执行，不占用界面进程的GIL，
+    异常代码也不会导致主程序崩溃；数据通过共享内存（Arrow IPC）传入"""
+
+    def __init__(self, workers=2):
+        self.size = max(1, workers)
+        self.context = mp.get_context("spawn")  # 界面进程有多个线程，避免fork
+        self._idle = []
+        self._all = set()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def start(self):
+        """启动并预热所有执行进程（不等待子进程就绪）"""
+        with self._condition:
+            while len(self._all) < self.size:
+                worker = _Worker(self.context)
+                self._all.add(worker)
+                self._idle.append(worker)
+
+    def _acquire(self, cancel_token=None):
+        """取得空闲执行进程；等待期间检查取消和超时，触发时抛出 AnalysisCancelled"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("执行进程池已关闭")
+                if not self._all:
+                    self.start()
+                if self._idle:
+                    return self._idle.pop()
+                if cancel_token is not None:
+                    cancel_token.check()
+                self._condition.wait(CancelToken.POLL_INTERVAL)
+
+    def _release(self, worker, healthy=True):
+        with self._condition:
+            if healthy and worker.is_alive() and not self._closed:
+                self._idle.append(worker)
+            else:
+                self._all.discard(worker)
+                worker.stop()
+                if not self._closed:
+                    replacement = _Worker(self.context)
+                    self._all.add(replacement)
+                    self._idle.append(replacement)
+            self._condition.notify()
+
+    def _wait_result(self, worker, cancel_token):
+        """等待执行结果，期间检查取消、超时和内存上限，触发时结束执行进程并抛出 AnalysisCancelled"""
+        while not worker.conn.poll(CancelToken.POLL_INTERVAL):
+            if cancel_token is None:
+                continue
+            if cancel_token.memory_limit:
+                memory = _process_memory(worker.process.pid)
+                if memory is not None and memory > cancel_token.memory_limit:
+                    cancel_token.cancel(f"代码执行内存超出上限（{cancel_token.memory_limit // (1024 * 1024)} MB）")
+            if cancel_token.cancelled:
+                worker.kill()
+                cancel_token.check()
+        return worker.conn.recv()
+
+    def execute(self, code, data_dict, cancel_token=None, backend="pandas", profile=False, cache_paths=None):
+        """在空闲执行进程中运行代码，返回格式与 run_generated_code 相同。
+        cancel_token 取消、超时或执行进程内存超出上限时结束该进程（由新进程替换）并抛出 AnalysisCancelled"""
+        worker = self._acquire(cancel_token)
+        segments = []
+        healthy = True
+        try:
+            data = {}
+            for filename, df in data_dict.items():
+                shm, desc = _write_shared(df)
+                segments.append(shm)
+                data[filename] = desc
+
+            worker.conn.send({"code": code, "data": data, "backend": backend, "profile": profile,
+                              "cache_paths": cache_paths})
+            try:
+                return self._wait_result(worker, cancel_token)
+            except EOFError:
+                healthy = False
+                worker.process.join(timeout=1)
+                return {"error": f"执行进程异常退出 (退出码: {worker.process.exitcode})"}
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+            self._release(worker, healthy)
+
+    def shutdown(self):
+        """关闭所有执行进程"""
+        with self._condition:
+            self._closed = True
+            workers = list(self._all)
+            self._all.clear()
+            self._idle.clear()
+            self._condition.notify_all()
+        for worker in workers:
+            worker.stop()
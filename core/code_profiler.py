@@ -0,0 +1,143 @@
+import sys
+import ast
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+# 生成代码编译时使用的文件名，用于在采样、调用统计和内存分配中定位到生成代码的行
+GENERATED_FILENAME = "<generated>"
+
+
+class _LineSampler:
+    """定时采样执行线程的调用栈，统计生成代码中各行的耗时占比"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="line-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None and frame.f_code.co_filename != GENERATED_FILENAME:
+                frame = frame.f_back
+            self.samples += 1
+            if frame is not None:
+                self.counts[frame.f_lineno] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _source_line(code_lines, lineno):
+    if 0 < lineno <= len(code_lines):
+        return code_lines[lineno - 1].strip()[:120]
+    return ""
+
+
+def _short_function(func):
+    filename, lineno, name = func
+    if filename == GENERATED_FILENAME:
+        return f"生成代码:{lineno} {name}"
+    if filename == "~":
+        return name  # 内置函数
+    parts = filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-2:])}:{lineno} {name}"
+
+
+def _compile_statements(code):
+    """将代码按顶层语句分别编译（保留原行号），返回 [(起始行, 结束行, 代码对象)]"""
+    tree = ast.parse(code, GENERATED_FILENAME)
+    return [(stmt.lineno, stmt.end_lineno,
+             compile(ast.Module(body=[stmt], type_ignores=[]), GENERATED_FILENAME, "exec"))
+            for stmt in tree.body]
+
+
+def exec_profiled(code, namespace, top_n=8):
+    """执行代码并收集性能数据：CPU调用统计（cProfile）、按行采样耗时、内存峰值及各语句执行期间的内存峰值（tracemalloc）。
+    代码按顶层语句逐条执行，每条语句前重置峰值，执行后的峰值减去执行前的占用即为该语句的峰值分配，
+    执行中创建又释放的临时数据也计算在内。
+    返回精简的报告字典（只含基本类型，可跨进程传递）；代码抛出的异常原样向上抛出"""
+    code_lines = code.splitlines()
+    statements = _compile_statements(code)
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    allocated = Counter()  # (起始行, 结束行) -> 执行期间比执行前多占用的内存峰值
+    peak = 0
+    start = time.perf_counter()
+    try:
+        with _LineSampler(threading.get_ident()) as sampler:
+            profiler.enable()
+            try:
+                for first, last, compiled in statements:
+                    before, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    try:
+                        exec(compiled, namespace)
+                    finally:
+                        _, statement_peak = tracemalloc.get_traced_memory()
+                        peak = max(peak, statement_peak)
+                        allocated[(first, last)] = max(allocated[(first, last)], statement_peak - before)
+            finally:
+                profiler.disable()
+    finally:
+        elapsed = time.perf_counter() - start
+        if started_tracing:
+            tracemalloc.stop()
+
+    stats = pstats.Stats(profiler)
+    functions = sorted(
+        ((func, data[3], data[2], data[1]) for func, data in stats.stats.items()
+         if "cProfile" not in func[2] and "builtins.exec" not in func[2] and func[0] != GENERATED_FILENAME),
+        key=lambda item: item[1], reverse=True
+    )[:top_n]
+
+    total_samples = max(sampler.samples, 1)
+    return {
+        "耗时秒": round(elapsed, 3),
+        "内存峰值MB": round(peak / 1024 / 1024, 1),
+        "热点行": [
+            {"行号": lineno, "代码": _source_line(code_lines, lineno), "耗时占比": round(count / total_samples, 3)}
+            for lineno, count in sampler.counts.most_common(top_n)
+        ],
+        "热点函数": [
+            {"函数": _short_function(func), "累计秒": round(cumulative, 3), "自身秒": round(own, 3),
+             "调用次数": int(calls)}
+            for func, cumulative, own, calls in functions
+        ],
+        "内存分配": [
+            {"行号": first if first == last else f"{first}-{last}", "代码": _source_line(code_lines, first),
+             "MB": round(size / 1024 / 1024, 2)}
+            for (first, last), size in allocated.most_common(top_n) if size >= 10 * 1024
+        ]
+    }
+
+
+def format_profile_report(report):
+    """生成供结果页展示、也可放入优化提示词的文本报告"""
+    lines = [f"执行耗时: {report['耗时秒']} 秒，Python内存峰值: {report['内存峰值MB']} MB"]
+    if report["热点行"]:
+        lines.append("耗时最多的代码行:")
+        lines.extend(f"  第{item['行号']}行 {item['耗时占比']:.0%}: {item['代码']}" for item in report["热点行"])
+    if report["内存分配"]:
+        lines.append("执行期间内存峰值最高的代码行（含已释放的临时数据）:")
+        lines.extend(f"  第{item['行号']}行 {item['MB']} MB: {item['代码']}" for item in report["内存分配"])
+    if report["热点函数"]:
+        lines.append("累计耗时最多的函数:")
+        lines.extend(f"  {item['函数']} 累计 {item['累计秒']} 秒（自身 {item['自身秒']} 秒，调用 {item['调用次数']} 次）"
+                     for item in report["热点函数"])
+    return "\n".join(lines)
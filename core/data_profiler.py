@@ -0,0 +1,173 @@
+import os
+import json
+import pandas as pd
+from utils.helpers import get_file_fingerprint
+from core.template_miner import template_histogram
+from core.sketches import FileSketches, open_sketches
+from core.metrics import span
+
+
+class DataProfiler:
+    """文件画像：一次向量化扫描生成数值统计、高频值、空值比例、基数和时间范围，
+    并按文件指纹缓存（内存+磁盘），同一文件重复提问时直接复用。
+    另外按文件保存可合并的近似统计概要（去重数、高频项、分位数），见 core.sketches"""
+
+    # 画像内容变化后需递增，使旧的画像缓存失效
+    PROFILE_VERSION = 2
+    TIME_KEYWORDS = ('time', 'date', 'timestamp', '时间', '日期')
+    # 平均长度超过该值且含空格的文本列视为日志消息列，做模板挖掘
+    MESSAGE_MIN_LENGTH = 20
+
+    def __init__(self, cache_dir, top_k=5, sample_rows=3):
+        self.cache_dir = cache_dir
+        self.top_k = top_k
+        self.sample_rows = sample_rows
+        self._memory_cache = {}  # 格式: {文件指纹: 画像}
+
+    def get_profile(self, file_path, df):
+        """获取文件画像，优先使用缓存"""
+        fingerprint = get_file_fingerprint(file_path)
+
+        profile = self._memory_cache.get(fingerprint)
+        if profile is not None:
+            return profile
+
+        cache_path = os.path.join(self.cache_dir, f"{fingerprint}_v{self.PROFILE_VERSION}.json")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+                self._memory_cache[fingerprint] = profile
+                return profile
+            except Exception as e:
+                print(f"读取画像缓存失败: {str(e)}")
+
+        with span("profile", rows=len(df)):
+            profile = self.build_profile(df)
+        profile["文件指纹"] = fingerprint
+        self._memory_cache[fingerprint] = profile
+        try:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, ensure_ascii=False, default=str)
+        except Exception as e:
+            print(f"写入画像缓存失败: {str(e)}")
+        return profile
+
+    def build_profile(self, df):
+        """对DataFrame做一次向量化画像"""
+        row_count = len(df)
+        profile = {
+            "记录数": row_count,
+            "列名": [str(col) for col in df.columns],
+            "数据类型分布": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+            "数据样本": json.loads(
+                df.head(min(self.sample_rows, row_count)).to_json(orient='records', force_ascii=False,
+                                                                  date_format='iso')
+            )
+        }
+        if row_count == 0 or df.shape[1] == 0:
+            return profile
+
+        # 空值比例与基数：整表一次计算
+        profile["空值比例"] = {str(col): round(float(ratio), 4) for col, ratio in df.isna().mean().items()}
+        profile["基数估计"] = {str(col): int(count) for col, count in self._nunique(df).items()}
+
+        # 数值列统计：一次agg完成所有数值列
+        numeric_df = df.select_dtypes(include='number')
+        if not numeric_df.empty:
+            stats = numeric_df.agg(['mean', 'std', 'min', 'max', 'count'])
+            quantiles = numeric_df.quantile([0.5, 0.95])
+            profile["数值列统计"] = {
+                str(col): {
+                    "平均值": self._to_scalar(stats.at['mean', col]),
+                    "标准差": self._to_scalar(stats.at['std', col]),
+                    "最小值": self._to_scalar(stats.at['min', col]),
+                    "最大值": self._to_scalar(stats.at['max', col]),
+                    "中位数": self._to_scalar(quantiles.at[0.5, col]),
+                    "P95": self._to_scalar(quantiles.at[0.95, col]),
+                    "非空值数量": int(stats.at['count', col])
+                }
+                for col in numeric_df.columns
+            }
+
+        # 文本/类别列高频值
+        top_values = {}
+        for col in df.select_dtypes(include=['object', 'string', 'category', 'bool']).columns:
+            counts = df[col].value_counts(dropna=True).head(self.top_k)
+            if not counts.empty:
+                top_values[str(col)] = {str(k): int(v) for k, v in counts.items()}
+        if top_values:
+            profile["高频值"] = top_values
+
+        time_range = self._time_range(df)
+        if time_range:
+            profile["时间范围"] = time_range
+
+        # 日志消息列：用模板直方图概括整列，代替原始样本行
+        templates = {}
+        for col in self.message_columns(df):
+            templates[str(col)] = template_histogram(df[col].dropna())
+        if templates:
+            profile["日志模板"] = templates
+
+        return profile
+
+    @classmethod
+    def message_columns(cls, df):
+        """识别日志消息类文本列（如 TxtFileProcessor 输出的 event 列）"""
+        columns = []
+        for col in df.select_dtypes(include=['object', 'string']).columns:
+            sample = df[col].dropna().head(200)
+            if sample.empty or not all(isinstance(value, str) for value in sample):
+                continue
+            if sample.str.len().mean() >= cls.MESSAGE_MIN_LENGTH and sample.str.contains(' ').mean() > 0.5:
+                columns.append(col)
+        return columns
+
+    def sketch_path(self, file_path):
+        """文件概要的缓存路径（与画像缓存放在一起，按文件指纹区分）"""
+        return os.path.join(self.cache_dir,
+                            f"{get_file_fingerprint(file_path)}_sketch_v{FileSketches.VERSION}.json")
+
+    def get_sketches(self, file_path, df):
+        """获取文件的近似统计概要，优先使用缓存；file_path为None时对df直接计算"""
+        path = self.sketch_path(file_path) if file_path else None
+        with span("sketch", rows=len(df)):
+            return open_sketches(path, df, self.message_columns(df))
+
+    def _nunique(self, df):
+        """计算各列基数，不可哈希的值（如嵌套JSON）按字符串处理"""
+        try:
+            return df.nunique(dropna=True)
+        except TypeError:
+            return df.astype(str).nunique(dropna=True)
+
+    def _time_range(self, df):
+        """识别时间列并计算时间范围"""
+        time_range = {}
+        for col in df.columns:
+            series = df[col]
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                name = str(col).lower()
+                if not any(keyword in name for keyword in self.TIME_KEYWORDS):
+                    continue
+                if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+                    continue
+                # 先用样本判断是否可解析，避免对非时间列做全量转换
+                sample = series.dropna().head(100)
+                if sample.empty or pd.to_datetime(sample, errors='coerce').notna().mean() < 0.8:
+                    continue
+                series = pd.to_datetime(series, errors='coerce')
+
+            valid = series.dropna()
+            if valid.empty:
+                continue
+            time_range[str(col)] = {"开始": str(valid.min()), "结束": str(valid.max())}
+        return time_range
+
+    @staticmethod
+    def _to_scalar(value):
+        """将numpy标量转为可JSON序列化的Python值"""
+        if pd.isna(value):
+            return None
+        return value.item() if hasattr(value, 'item') else value
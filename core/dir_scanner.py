@@ -0,0 +1,78 @@
+import os
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# 扩展名 -> 格式名称（与文件处理器支持的格式一致，其余显示为“其他”）
+FORMAT_LABELS = {
+    '.csv': "CSV",
+    '.xlsx': "Excel",
+    '.xls': "Excel",
+    '.json': "JSON",
+    '.txt': "文本",
+    '.log': "文本"
+}
+
+
+def detect_format(file_name):
+    return FORMAT_LABELS.get(os.path.splitext(file_name)[1].lower(), "其他")
+
+
+class DirScanThread(QThread):
+    """后台扫描数据目录（os.scandir），分批发送文件信息，避免大目录阻塞界面。
+    传入上次扫描得到的文件名集合时只比较文件名：只对新增的文件取stat并发送，结束时报告已删除的文件
+    （已有文件的大小变化由文件监视处理）；结束时附带本次的文件名集合（在扫描线程中建立），供下次比较"""
+    # 每批为 [(文件名, 大小, 修改时间, 格式)]
+    batch_signal = pyqtSignal(list)
+    # {"status": "success"/"cancelled"/"error", "directory", "removed": [文件名], "names": 文件名集合,
+    #  "count": 文件总数, "message"}
+    complete_signal = pyqtSignal(dict)
+
+    BATCH_SIZE = 2000
+
+    def __init__(self, directory, known_names=None):
+        super().__init__()
+        self.directory = directory
+        self.known_names = known_names  # 上次扫描的文件名集合（扫描期间不会被修改），为None时发送全部文件
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        batch = []
+        names = set()
+        known = self.known_names
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if self._cancelled:
+                        self.complete_signal.emit({"status": "cancelled", "directory": self.directory})
+                        return
+                    # 只列出文件，跳过目录和隐藏文件
+                    if entry.name.startswith('.'):
+                        continue
+                    if known is not None and entry.name in known:
+                        names.add(entry.name)  # 已知文件不取stat
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # 扫描期间被删除或无权限访问
+
+                    names.add(entry.name)
+                    batch.append((entry.name, stat.st_size, stat.st_mtime, detect_format(entry.name)))
+                    if len(batch) >= self.BATCH_SIZE:
+                        self.batch_signal.emit(batch)
+                        batch = []
+        except Exception as e:
+            if batch:
+                self.batch_signal.emit(batch)
+            self.complete_signal.emit({"status": "error", "directory": self.directory, "message": str(e)})
+            return
+
+        if batch:
+            self.batch_signal.emit(batch)
+        removed = list(known - names) if known is not None else []
+        self.complete_signal.emit({"status": "success", "directory": self.directory,
+                                   "removed": removed, "names": names, "count": len(names)})
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class DiskCache:
+    """持久化磁盘缓存：每个条目一个JSON文件，键为内容哈希，支持过期时间(TTL)和容量淘汰(LRU)。
+    条目数和总大小在内存中维护，只有超出容量或到了过期清理间隔时才扫描缓存目录"""
+
+    SWEEP_INTERVAL = 200  # 启用TTL时，每写入这么多次清理一次过期条目
+    LOW_WATER = 0.9  # 超出容量时淘汰到上限的这一比例，避免之后每次写入都触发扫描
+
+    def __init__(self, cache_dir, ttl_seconds=None, max_entries=None, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes = None  # 格式: {文件路径: 字节数}，首次写入时扫描目录建立
+        self._total_bytes = 0
+        self._writes_since_sweep = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """根据任意可JSON序列化的内容生成缓存键"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """读取缓存，不存在或已过期返回None"""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except Exception as e:
+            print(f"读取缓存失败: {str(e)}")
+            self.delete(key)
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self.delete(key)
+            return None
+
+        # 更新访问时间，作为LRU淘汰依据
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key, value):
+        """写入缓存（先写临时文件再替换，避免并发读到半个文件）"""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"created_at": time.time(), "value": value}, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"写入缓存失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        if self.ttl_seconds or self.max_entries or self.max_bytes:
+            with self._lock:
+                if self._sizes is None:
+                    self._scan(evict=True)
+                else:
+                    self._forget(path)
+                    self._sizes[path] = size
+                    self._total_bytes += size
+                    self._writes_since_sweep += 1
+                    self._evict()
+        return True
+
+    def delete(self, key):
+        """删除缓存条目"""
+        path = self._entry_path(key)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._forget(path)
+
+    def clear(self):
+        """清空缓存"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._sizes = None
+
+    def _forget(self, path):
+        if self._sizes is not None and path in self._sizes:
+            self._total_bytes -= self._sizes.pop(path)
+
+    def _over_capacity(self, ratio=1.0):
+        return ((self.max_entries and len(self._sizes) > max(1, int(self.max_entries * ratio)))
+                or (self.max_bytes and self._total_bytes > self.max_bytes * ratio))
+
+    def _evict(self):
+        """超出容量或到了过期清理间隔时扫描目录：淘汰过期条目，并按最近访问时间淘汰到容量下限"""
+        sweep_due = self.ttl_seconds and self._writes_since_sweep >= self.SWEEP_INTERVAL
+        if sweep_due or self._over_capacity():
+            self._scan(evict=True)
+
+    def _scan(self, evict=False):
+        """扫描缓存目录重建条目索引（也用于纠正其他进程写入造成的偏差）；
+        evict 为True时同时淘汰过期条目和超出容量的条目"""
+        self._writes_since_sweep = 0
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            # 文件修改时间在写入时等于创建时间，读取时会被更新，超过TTL未访问的一定已过期
+            if evict and self.ttl_seconds and now - stat.st_mtime > self.ttl_seconds:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        self._sizes = {path: size for _, size, path in entries}
+        self._total_bytes = sum(self._sizes.values())
+        if not evict or not self._over_capacity():
+            return
+
+        entries.sort()  # 最久未访问的在前
+        for _, size, path in entries:
+            if not self._over_capacity(self.LOW_WATER):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._forget(path)
@@ -0,0 +1,29 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.cancellation import AnalysisCancelled, CancelToken
+from core.result_exporter import ResultExporter
+
+
+class ExportThread(QThread):
+    """后台导出结果表，避免大结果写文件时阻塞界面"""
+    progress_signal = pyqtSignal(int, int)  # 进度 (已写入行数, 总行数)
+    complete_signal = pyqtSignal(dict)
+
+    def __init__(self, df, file_path, fmt):
+        super().__init__()
+        self.df = df
+        self.file_path = file_path
+        self.fmt = fmt
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        self.cancel_token.cancel("已取消保存")
+
+    def run(self):
+        try:
+            path = ResultExporter().export(self.df, self.file_path, self.fmt,
+                                           progress=self.progress_signal.emit, cancel_token=self.cancel_token)
+            self.complete_signal.emit({"status": "success", "path": path})
+        except AnalysisCancelled as e:
+            self.complete_signal.emit({"status": "cancelled", "message": str(e)})
+        except Exception as e:
+            self.complete_signal.emit({"status": "error", "message": str(e)})
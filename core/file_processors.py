@@ -1,3 +1,4 @@
+import io
 import pandas as pd
 import json
 from abc import ABC, abstractmethod
@@ -6,6 +7,9 @@ from abc import ABC, abstractmethod
 class FileProcessor(ABC):
     """文件处理器基类，所有文件类型处理器需继承此类"""
 
+    # 是否支持按行追加的增量解析（跟踪模式），支持时需实现 read_bytes
+    supports_append = False
+
     @abstractmethod
     def get_supported_extensions(self):
         """返回支持的文件扩展名列表（如 ['.csv']）"""
@@ -25,8 +29,21 @@ class FileProcessor(ABC):
         """
         pass
 
+    def read_bytes(self, data, encodings=None, columns=None, **kwargs):
+        """解析文件中的一段字节（整行），用于跟踪模式下读取新追加的内容
+        Args:
+            data: 字节数据
+            encodings: 尝试的编码列表
+            columns: 已知列名；为None时表示从文件开头读取（按文件自身规则识别表头）
+        Returns:
+            (pd.DataFrame, 使用的编码)
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持增量解析")
+
 
 class CsvFileProcessor(FileProcessor):
+    supports_append = True
+
     def get_supported_extensions(self):
         return ['.csv']
 
@@ -54,6 +71,25 @@ class CsvFileProcessor(FileProcessor):
                 continue
         raise ValueError(f"CSV文件读取失败，已尝试编码: {encodings}")
 
+    def read_bytes(self, data, encodings=None, columns=None, **kwargs):
+        encodings = encodings or ['utf-8', 'gbk', 'gb2312', 'ansi', 'utf-16', 'utf-16-le']
+        for encoding in encodings:
+            try:
+                df = pd.read_csv(
+                    io.BytesIO(data),
+                    encoding=encoding,
+                    sep=kwargs.get('sep', ','),
+                    engine=kwargs.get('engine', 'python'),
+                    # 追加内容没有表头，沿用首次读取时的列名
+                    header=kwargs.get('header', 'infer') if columns is None else None,
+                    names=columns,
+                    skip_blank_lines=True
+                )
+                return df, encoding
+            except (UnicodeDecodeError, LookupError, pd.errors.ParserError):
+                continue
+        raise ValueError(f"CSV内容解析失败，已尝试编码: {encodings}")
+
 
 class ExcelFileProcessor(FileProcessor):
     def get_supported_extensions(self):
@@ -105,6 +141,8 @@ class JsonFileProcessor(FileProcessor):
         raise ValueError(f"JSON文件读取失败，已尝试编码: {encodings}")
 
 class TxtFileProcessor(FileProcessor):
+    supports_append = True
+
     def get_supported_extensions(self):
         return ['.txt', '.log']
 
@@ -123,4 +161,22 @@ class TxtFileProcessor(FileProcessor):
                 )
             except Exception:
                 continue
-        raise ValueError(f"TXT/LOG文件读取失败，已尝试编码: {encodings}")
\ No newline at end of file
+        raise ValueError(f"TXT/LOG文件读取失败，已尝试编码: {encodings}")
+
+    def read_bytes(self, data, encodings=None, columns=None, **kwargs):
+        encodings = encodings or ['utf-8', 'gbk', 'gb2312', 'ansi']
+        delimiter = kwargs.get('delimiter', '\t')
+        for encoding in encodings:
+            try:
+                df = pd.read_csv(
+                    io.BytesIO(data),
+                    encoding=encoding,
+                    sep=delimiter,
+                    engine='python',
+                    header=None,
+                    names=['event']
+                )
+                return df, encoding
+            except Exception:
+                continue
+        raise ValueError(f"TXT/LOG内容解析失败，已尝试编码: {encodings}")
\ No newline at end of file
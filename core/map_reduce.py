@@ -0,0 +1,180 @@
+import re
+import json
+import asyncio
+import numpy as np
+
+
+def estimate_tokens(text):
+    """粗略估计token数：中文字符约1个token，其余字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk_count = len(re.findall(r'[\u4e00-\u9fff]', text))
+    return cjk_count + (len(text) - cjk_count) // 4 + 1
+
+
+class MapReduceAnswerer:
+    """分块汇总问答：将数据按token预算切块，并发总结各块（Map），再逐层合并部分结论（Reduce）"""
+
+    # 分块提示词版本，修改提示词后需递增，使旧的分块结论缓存失效
+    PROMPT_VERSION = 1
+
+    def __init__(self, client, chunk_cache, map_model="deepseek-chat", reduce_model="deepseek-reasoner",
+                 chunk_tokens=6000, max_parallel=4, max_total_tokens=2000000, map_max_tokens=800):
+        self.client = client
+        self.chunk_cache = chunk_cache
+        self.map_model = map_model
+        self.reduce_model = reduce_model
+        self.chunk_tokens = chunk_tokens
+        self.max_parallel = max_parallel
+        self.max_total_tokens = max_total_tokens  # 成本上限：本次最多发送的输入token数
+        self.map_max_tokens = map_max_tokens
+
+    def split_chunks(self, df):
+        """按token预算切分数据，返回 [(起始行, 结束行, 文本)]"""
+        if df.empty:
+            return []
+
+        # 按列拼接每行文本（Series.str.cat 逐列处理，不逐行调用Python），再按累计token数切分
+        columns = [df[col].astype(str) for col in df.columns]
+        lines = columns[0].str.cat(columns[1:], sep=" | ", na_rep="") if len(columns) > 1 else columns[0].fillna("")
+        row_tokens = lines.str.len().to_numpy() // 3 + 1
+        cumulative = np.cumsum(row_tokens)
+
+        header = " | ".join(str(col) for col in df.columns)
+        chunks = []
+        start = 0
+        while start < len(df):
+            offset = cumulative[start - 1] if start > 0 else 0
+            end = int(np.searchsorted(cumulative, offset + self.chunk_tokens, side='right'))
+            end = max(end, start + 1)  # 单行超出预算时也至少包含一行
+            text = header + "\n" + "\n".join(lines.iloc[start:end].tolist())
+            chunks.append((start, end, text))
+            start = end
+        return chunks
+
+    def _map_prompt(self, filename, question, chunk_text, start, end):
+        return f"""以下是日志文件 {filename} 的第 {start + 1}-{end} 行（首行为列名）:
+{chunk_text}
+
+用户问题: {question}
+
+要求:
+1. 只根据本数据块回答，列出与问题相关的具体事实（时间、数量、关键实体、异常）
+2. 尽量简洁，保留关键数值，不要复述原始数据
+3. 本数据块没有相关内容时只回答"无相关信息\""""
+
+    def _reduce_prompt(self, question, partials, context=None, final=False):
+        joined = "\n\n".join(f"[部分结论{i + 1}]\n{text}" for i, text in enumerate(partials))
+        context_text = f"文件概况: {json.dumps(context, ensure_ascii=False, default=str)}\n" if context else ""
+        if final:
+            requirement = """回答要求:
+1. 综合全部部分结论，深入分析日志数据特征、潜在规律和关键信息
+2. 直接给出自然语言总结，不生成任何表格或结构化数据
+3. 内容具体有针对性，涉及统计信息时自然体现关键数值（跨块数量需累加）
+4. 用简洁易懂的中文表达"""
+        else:
+            requirement = "请合并以下部分结论，去除重复和\"无相关信息\"，保留所有具体事实和数值（跨块数量需累加），尽量简洁"
+        return f"""{context_text}用户问题: {question}
+以下是对日志不同部分分别分析得到的结论:
+{joined}
+
+{requirement}"""
+
+    async def _complete(self, semaphore, model, prompt, max_tokens):
+        async with semaphore:
+            response = await self.client.acompletions_create(
+                model=model, prompt=prompt, max_tokens=max_tokens, temperature=0.3
+            )
+        return response.choices[0].message.content.strip()
+
+    async def _map_chunk(self, semaphore, task, question, progress, counter):
+        filename, fingerprint, start, end, text = task
+        cache_key = self.chunk_cache.make_key(
+            fingerprint, start, end, question, self.map_model, self.chunk_tokens, self.PROMPT_VERSION
+        )
+        # 磁盘缓存读写放到线程池执行，避免阻塞共享事件循环上的其他并发请求
+        summary = await asyncio.to_thread(self.chunk_cache.get, cache_key)
+        if summary is None:
+            summary = await self._complete(
+                semaphore, self.map_model, self._map_prompt(filename, question, text, start, end), self.map_max_tokens
+            )
+            await asyncio.to_thread(self.chunk_cache.set, cache_key, summary)
+
+        counter["done"] += 1
+        if progress:
+            progress(counter["done"], counter["total"], f"分块汇总 {counter['done']}/{counter['total']}")
+        return f"{filename} 第{start + 1}-{end}行: {summary}"
+
+    async def _answer(self, files, question, context, progress):
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        # 切块并按成本上限截断：超出上限后停止，之后的行（含后续文件）均不分析，保证已分析部分连续
+        tasks = []
+        spent_tokens = 0
+        uncovered = []  # [(文件名, 起始行, 结束行)]
+        for filename, (fingerprint, df) in files.items():
+            if uncovered:
+                uncovered.append((filename, 0, len(df)))
+                continue
+            for start, end, text in self.split_chunks(df):
+                tokens = estimate_tokens(text)
+                if spent_tokens + tokens > self.max_total_tokens:
+                    uncovered.append((filename, start, len(df)))
+                    break
+                spent_tokens += tokens
+                tasks.append((filename, fingerprint, start, end, text))
+
+        if not tasks:
+            raise ValueError("没有可分析的数据，或单个数据块已超出成本上限")
+
+        counter = {"done": 0, "total": len(tasks)}
+        partials = await asyncio.gather(*[
+            self._map_chunk(semaphore, task, question, progress, counter) for task in tasks
+        ])
+
+        # 逐层合并：每组不超过一个分块的token预算，直到剩余结论可一次性汇总
+        level = 1
+        while len(partials) > 1 and sum(estimate_tokens(p) for p in partials) > self.chunk_tokens:
+            groups, current, current_tokens = [], [], 0
+            for partial in partials:
+                tokens = estimate_tokens(partial)
+                if current and current_tokens + tokens > self.chunk_tokens:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(partial)
+                current_tokens += tokens
+            groups.append(current)
+            if len(groups) == len(partials):
+                break  # 单条结论已超出预算，无法继续合并，直接进入最终汇总
+
+            if progress:
+                progress(counter["done"], counter["total"], f"第{level}层合并：{len(partials)} → {len(groups)}")
+            partials = await asyncio.gather(*[
+                self._complete(semaphore, self.map_model, self._reduce_prompt(question, group), self.map_max_tokens)
+                for group in groups
+            ])
+            level += 1
+
+        if progress:
+            progress(counter["done"], counter["total"], "生成最终结论...")
+        answer = await self._complete(
+            semaphore, self.reduce_model, self._reduce_prompt(question, partials, context, final=True), 5000
+        )
+
+        if uncovered:
+            ranges = "、".join(f"{filename} 第{start + 1}-{end}行" for filename, start, end in uncovered if end > start)
+            answer = f"注意：受成本上限限制，以下数据未分析，结论不包含这部分内容: {ranges}\n\n" + answer
+        return answer
+
+    def answer(self, files, question, context=None, progress=None, cancel_token=None):
+        """分块汇总回答
+        Args:
+            files: {文件名: (文件指纹, DataFrame)}
+            question: 用户问题
+            context: 附加在最终汇总提示词中的文件概况
+            progress: 进度回调 progress(已完成块数, 总块数, 说明)
+            cancel_token: 取消令牌，取消或超时后停止所有分块请求（已完成的分块结论保留在缓存中）
+        Returns:
+            str: 最终回答
+        """
+        return self.client.loop_thread.run(self._answer(files, question, context, progress), cancel_token)
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+# 当前分析的阶段耗时记录器；后台事件循环中的协程会继承提交时的值（见 _EventLoopThread.submit）
+_current_metrics = contextvars.ContextVar("analysis_metrics", default=None)
+
+
+class RunMetrics:
+    """一次分析的分阶段耗时记录：每个阶段记录耗时及处理的行数、字节数、token数等"""
+
+    STAGE_NAMES = {
+        "load": "加载文件",
+        "profile": "文件画像",
+        "build_prompt": "构建提示词",
+        "sanitize": "敏感词替换",
+        "api_call": "模型调用",
+        "restore": "敏感词还原",
+        "execute": "代码执行",
+        "sql_query": "SQL查询",
+        "map_reduce": "分块汇总",
+        "render": "结果渲染"
+    }
+
+    def __init__(self, **info):
+        self.info = info  # 分析的基本信息（模式、文件数等）
+        self.spans = []
+        self.status = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.total_seconds = None
+        self._lock = threading.Lock()
+
+    def activate(self):
+        """设为当前线程的记录器，返回用于 deactivate 的令牌"""
+        return _current_metrics.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_metrics.reset(token)
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """记录一个阶段的耗时；可在 with 块内向返回的字典补充 rows、bytes、tokens 等信息"""
+        record = {"stage": stage}
+        record.update(attrs)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            with self._lock:
+                self.spans.append(record)
+
+    def finish(self, status):
+        """标记分析结束，记录总耗时（结果渲染在结束后追加，不计入总耗时）"""
+        self.status = status
+        self.total_seconds = round(time.perf_counter() - self._start, 4)
+
+    def to_record(self):
+        return {
+            "time": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "status": self.status,
+            "total_seconds": self.total_seconds,
+            **self.info,
+            "spans": list(self.spans)
+        }
+
+    def stage_totals(self):
+        """按阶段汇总耗时，返回 [(阶段, 次数, 总耗时)]，按首次出现顺序排列"""
+        totals = {}
+        for record in self.spans:
+            count, seconds = totals.get(record["stage"], (0, 0.0))
+            totals[record["stage"]] = (count + 1, seconds + record["seconds"])
+        return [(stage, count, seconds) for stage, (count, seconds) in totals.items()]
+
+    def format_text(self):
+        """生成供结果页展示的耗时明细"""
+        lines = []
+        if self.total_seconds is not None:
+            lines.append(f"总耗时: {self.total_seconds:.2f} 秒")
+        for stage, count, seconds in self.stage_totals():
+            name = self.STAGE_NAMES.get(stage, stage)
+            details = []
+            for key, label in (("rows", "行"), ("bytes", "字节"), ("prompt_tokens", "输入token"),
+                               ("completion_tokens", "输出token"), ("hedged", "对冲请求"),
+                               ("hedge_wins", "对冲胜出")):
+                values = [r[key] for r in self.spans if r["stage"] == stage and r.get(key) is not None]
+                if values:
+                    details.append(f"{label} {sum(values):,}")
+            cached = sum(1 for r in self.spans if r["stage"] == stage and r.get("cached"))
+            if cached:
+                details.append(f"缓存命中 {cached} 次")
+            count_text = f" ×{count}" if count > 1 else ""
+            detail_text = f"（{'，'.join(details)}）" if details else ""
+            lines.append(f"{name}{count_text}: {seconds:.3f} 秒{detail_text}")
+        return "\n".join(lines)
+
+    def append_to_log(self, log_file):
+        """追加到本地JSONL指标日志，便于统计耗时趋势"""
+        try:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.to_record(), ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            print(f"写入耗时日志失败: {str(e)}")
+
+
+@contextmanager
+def span(stage, **attrs):
+    """在当前分析的记录器中记录一个阶段；没有正在进行的分析时只返回一个普通字典"""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield dict(attrs)
+        return
+    with metrics.span(stage, **attrs) as record:
+        yield record
+
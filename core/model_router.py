@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import threading
+
+
+class ModelRouter:
+    """模型路由：根据请求复杂度、历史成功率和推理模型最近的耗时选择快速模型或推理模型，并记录各模型的耗时和token统计"""
+
+    COMPLEX_KEYWORDS = (
+        '关联', '趋势', '异常', '预测', '原因', '溯源', '攻击链', '对比', '相关', '聚类', '为什么', '推断', '合并',
+        'correlat', 'trend', 'anomal', 'predict', 'why', 'root cause', 'cluster'
+    )
+    # 快速模型在某类任务上至少调用这么多次后，才依据成功率决定是否弃用
+    MIN_SAMPLES = 5
+    LATENCY_WINDOW = 50  # 每个模型保留的最近耗时样本数
+    # 复杂度分数低于此值的复杂请求视为临界请求：推理模型最近P95耗时超过上限时改用快速模型
+    BORDERLINE_SCORE = 4
+
+    def __init__(self, stats_file, fast_model="deepseek-chat", reasoner_model="deepseek-reasoner",
+                 enabled=True, min_success_rate=0.6, max_reasoner_latency=None):
+        self.stats_file = stats_file
+        self.fast_model = fast_model
+        self.reasoner_model = reasoner_model
+        self.enabled = enabled
+        self.min_success_rate = min_success_rate
+        self.max_reasoner_latency = max_reasoner_latency  # 秒，None表示不按耗时路由
+        self._lock = threading.Lock()
+        self.stats = self._load()
+
+    def _load(self):
+        if os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"读取模型统计失败: {str(e)}")
+        return {}
+
+    def _save(self):
+        """先写临时文件再替换，写入中途崩溃不会损坏统计文件"""
+        tmp_path = f"{self.stats_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.stats_file)
+        except Exception as e:
+            print(f"保存模型统计失败: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _entry(self, task, model):
+        return self.stats.setdefault(task, {}).setdefault(model, {
+            "calls": 0, "successes": 0, "failures": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "latencies": []
+        })
+
+    def estimate_complexity(self, request, file_count=1):
+        """粗略估计请求复杂度，分数越高越需要推理模型"""
+        lowered = request.lower()
+        score = sum(2 for keyword in self.COMPLEX_KEYWORDS if keyword in lowered)
+        if len(request) > 80:
+            score += 1
+        if file_count > 1:
+            score += 1
+        return score
+
+    def success_rate(self, task, model):
+        """返回 (成功率, 样本数)；没有执行结果时成功率为None"""
+        entry = self.stats.get(task, {}).get(model)
+        if not entry:
+            return None, 0
+        samples = entry["successes"] + entry["failures"]
+        return (entry["successes"] / samples if samples else None), samples
+
+    def reasoner_too_slow(self, task):
+        """推理模型在该类任务上最近的P95耗时是否超过上限（样本不足时视为否）"""
+        if not self.max_reasoner_latency:
+            return False
+        summary = self.latency_summary(task, self.reasoner_model)
+        return (summary is not None and summary["samples"] >= self.MIN_SAMPLES
+                and summary["p95"] > self.max_reasoner_latency)
+
+    def route(self, task, request, file_count=1, default_max_tokens=5000):
+        """选择模型和token预算，返回 (模型, max_tokens)"""
+        if not self.enabled:
+            return self.reasoner_model, default_max_tokens
+
+        rate, samples = self.success_rate(task, self.fast_model)
+        if rate is not None and samples >= self.MIN_SAMPLES and rate < self.min_success_rate:
+            return self.reasoner_model, default_max_tokens
+
+        score = self.estimate_complexity(request, file_count)
+        if score >= self.BORDERLINE_SCORE or (score >= 2 and not self.reasoner_too_slow(task)):
+            return self.reasoner_model, default_max_tokens
+
+        # 快速模型没有长推理过程，较小的token预算即可
+        return self.fast_model, min(default_max_tokens, 2000)
+
+    def record_call(self, task, model, latency, prompt_tokens=0, completion_tokens=0):
+        """记录一次模型调用的耗时和token数"""
+        with self._lock:
+            entry = self._entry(task, model)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += int(prompt_tokens or 0)
+            entry["completion_tokens"] += int(completion_tokens or 0)
+            entry["latencies"] = (entry["latencies"] + [round(latency, 3)])[-self.LATENCY_WINDOW:]
+            entry["last_used"] = time.time()
+            self._save()
+
+    def record_outcome(self, task, model, succeeded):
+        """记录模型输出是否可用（如生成代码是否执行成功）"""
+        with self._lock:
+            entry = self._entry(task, model)
+            entry["successes" if succeeded else "failures"] += 1
+            self._save()
+
+    def latency_summary(self, task, model):
+        """最近调用的耗时中位数、P95和样本数"""
+        latencies = sorted(self.stats.get(task, {}).get(model, {}).get("latencies", []))
+        if not latencies:
+            return None
+        return {
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "samples": len(latencies)
+        }
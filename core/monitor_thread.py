@@ -0,0 +1,169 @@
+import os
+import time
+import hashlib
+import threading
+import pandas as pd
+from datetime import datetime, timedelta
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.analysis_thread import AnalysisThread
+from core.cancellation import AnalysisCancelled, CancelToken
+from core.code_executor import run_generated_code
+from core.time_window import find_time_column, extract_times
+
+
+class MonitorThread(QThread):
+    """持续监控：按固定间隔（或数据文件变化时）对最近一段时间窗口内的数据重新执行生成的代码。
+    代码只在开始时生成一次（优先复用代码缓存），数据通过跟踪模式增量读取，结果变化时才推送到界面"""
+    status_signal = pyqtSignal(str)
+    # {"result": 分析结果, "tick": 第几次执行, "rows": 窗口内行数}
+    result_signal = pyqtSignal(dict)
+    complete_signal = pyqtSignal(dict)
+
+    MIN_GAP = 2.0  # 文件变化触发执行时，与上次执行的最短间隔（秒）
+
+    def __init__(self, processor, file_names, request, interval_seconds=60, window_minutes=60, memory_limit_mb=None):
+        super().__init__()
+        self.processor = processor
+        self.file_names = file_names
+        self.request = request
+        self.interval_seconds = interval_seconds
+        self.window_minutes = window_minutes  # 0表示不限时间窗口
+        self.cancel_token = CancelToken(memory_limit_mb=memory_limit_mb)
+        self.code = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._times = {}  # 文件名 -> (时间列, 解析方式, 各行时间)
+        self._last_digest = None
+
+    def stop(self):
+        """停止监控（界面线程调用），正在执行的代码会被中止"""
+        self._stop.set()
+        self._wake.set()
+        self.cancel_token.cancel("监控已停止")
+
+    def trigger(self):
+        """数据文件变化时调用，提前进行下一次执行"""
+        self._wake.set()
+
+    def _is_appendable(self, file_name):
+        processor = self.processor.extension_map.get(os.path.splitext(file_name)[1].lower())
+        return processor is not None and processor.supports_append
+
+    def _row_times(self, file_name, df):
+        """各行的时间，找不到时间列时返回None。
+        可追加的文件只解析上次之后新增的行（上次的最后一行可能未写完，重新解析）"""
+        cached = self._times.get(file_name)
+        if (cached is None or not self._is_appendable(file_name)
+                or cached[0] not in df.columns or len(df) < len(cached[2])):
+            column, method = find_time_column(df)
+            if column is None:
+                self._times.pop(file_name, None)
+                return None
+            times = extract_times(df, column, method)
+        else:
+            column, method, times = cached
+            keep = max(len(times) - 1, 0)
+            times = pd.concat([times.iloc[:keep], extract_times(df.iloc[keep:], column, method)],
+                              ignore_index=True)
+        self._times[file_name] = (column, method, times.reset_index(drop=True))
+        return self._times[file_name][2]
+
+    @staticmethod
+    def _digest(result):
+        """结果摘要，用于判断结果是否变化"""
+        digest = hashlib.sha1(str(result.get("summary")).encode('utf-8'))
+        table = result.get("result_table")
+        if isinstance(table, pd.DataFrame):
+            digest.update(",".join(map(str, table.columns)).encode('utf-8'))
+            try:
+                digest.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+            except TypeError:
+                # 含列表、字典等不可哈希的值时按文本比较
+                digest.update(table.to_csv(index=False).encode('utf-8'))
+        elif table is not None:
+            digest.update(str(table).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _tick(self, tick):
+        """执行一次：增量读取数据，截取时间窗口，执行代码；结果变化时推送"""
+        now = datetime.now()
+        start = now - timedelta(minutes=self.window_minutes) if self.window_minutes else None
+        data_dict = self.processor.load_data_files(self.file_names, follow=True)
+
+        window_data = {}
+        untimed = []
+        for file_name, df in data_dict.items():
+            times = self._row_times(file_name, df) if start is not None else None
+            if times is None:
+                window_data[file_name] = df
+                if start is not None:
+                    untimed.append(file_name)
+            else:
+                window_data[file_name] = df[(times >= start).to_numpy()].reset_index(drop=True)
+        rows = sum(len(df) for df in window_data.values())
+
+        self.cancel_token.check()
+        backend = self.processor.dataframe_backend
+        if self.processor.code_executor:
+            result = self.processor.code_executor.execute(self.code, window_data, self.cancel_token, backend)
+        else:
+            result = run_generated_code(self.code, window_data, backend)
+        if "error" in result:
+            return result
+
+        digest = self._digest(result)
+        changed = digest != self._last_digest
+        self._last_digest = digest
+        if changed:
+            window_text = f"最近 {self.window_minutes} 分钟（{start:%Y-%m-%d %H:%M:%S} 起）" if start else "全部数据"
+            header = f"【监控】{now:%H:%M:%S} 第 {tick} 次执行，时间窗口: {window_text}，窗口内 {rows} 行"
+            if untimed:
+                header += f"\n以下文件未识别到时间列，按全部数据计算: {', '.join(untimed)}"
+            self.result_signal.emit({
+                "result": {"result_table": result["result_table"], "summary": f"{header}\n\n{result['summary']}",
+                           "code": self.code},
+                "tick": tick,
+                "rows": rows
+            })
+        else:
+            self.status_signal.emit(f"监控 {now:%H:%M:%S} 第 {tick} 次执行：结果无变化（窗口内 {rows} 行）")
+        return result
+
+    def _wait_next(self, last_run):
+        """等待到下一次执行：到达间隔，或文件变化且距上次执行超过最短间隔"""
+        deadline = last_run + self.interval_seconds
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self._wake.wait(remaining):
+                self._wake.clear()
+                deadline = min(deadline, last_run + self.MIN_GAP)
+
+    def run(self):
+        try:
+            self.status_signal.emit("正在准备监控代码...")
+            code_block = self.processor.generate_processing_code(self.request, self.file_names,
+                                                                 cancel_token=self.cancel_token)
+            self.code = AnalysisThread.clean_code_block(code_block)
+
+            tick = 0
+            while not self._stop.is_set():
+                tick += 1
+                last_run = time.monotonic()
+                result = self._tick(tick)
+                if tick == 1:
+                    # 首次执行结果反馈给代码缓存；代码本身有错误时停止监控
+                    self.processor.mark_generated_code("error" not in result)
+                    if "error" in result:
+                        self.complete_signal.emit({"status": "error",
+                                                   "message": f"监控代码执行错误: {result['error']}"})
+                        return
+                elif "error" in result:
+                    self.status_signal.emit(f"监控第 {tick} 次执行失败: {result['error']}")
+                self._wait_next(last_run)
+            self.complete_signal.emit({"status": "stopped"})
+        except AnalysisCancelled:
+            self.complete_signal.emit({"status": "stopped"})
+        except Exception as e:
+            self.complete_signal.emit({"status": "error", "message": str(e)})
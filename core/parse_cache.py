@@ -0,0 +1,213 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  pandas读写Parquet需要
+except ImportError:  # 没有pyarrow时解析结果只缓存在内存中
+    pyarrow = None
+
+# 写时复制（pandas 3起默认启用）下浅拷贝即可保证调用方修改数据不影响缓存，否则需要深拷贝
+_COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3 or pd.options.mode.copy_on_write is True
+
+
+class ParseCache:
+    """已解析文件的缓存（跟踪模式）：按文件记录已读取的字节偏移、inode和开头内容的哈希。
+    文件只在末尾追加时，只解析新增的完整行并追加到缓存的DataFrame；
+    inode变化、文件变短或开头内容变化时视为轮转/替换，重新完整读取。
+    解析结果按段保存为Parquet（每次追加一段），重启后无需重新解析已读过的内容"""
+
+    STATE_VERSION = 1
+    HEAD_BYTES = 4096  # 用于识别文件被替换的开头字节数
+    MAX_SEGMENTS = 16  # 超过该段数时合并为一段
+    MAX_MEMORY_FILES = 8  # 内存中保留最近读取的文件数，其余文件再次读取时从Parquet段加载
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        # 完整路径 -> (状态, 已完整解析的DataFrame, 末尾未完成行解析出的DataFrame)，按最近使用排序
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()  # 分析线程和监控线程可能同时读取同一文件
+
+    def _key(self, path):
+        return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+    def _state_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _segment_path(self, key, index):
+        return os.path.join(self.cache_dir, f"{key}.{index:04d}.parquet")
+
+    def _head_hash(self, path, length):
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read(min(length, self.HEAD_BYTES))).hexdigest()
+
+    def _is_same_file(self, path, state, stat):
+        """判断文件是否仍是上次读取的那个文件（只在末尾追加）"""
+        return (state["inode"] == stat.st_ino
+                and state["device"] == stat.st_dev
+                and stat.st_size >= state["offset"]
+                and self._head_hash(path, state["offset"]) == state["head_hash"])
+
+    def _load_state(self, path):
+        """从内存或磁盘取得缓存，返回 (状态, 完整行DataFrame, 未完成行DataFrame)"""
+        cached = self._memory.get(path)
+        if cached is not None:
+            self._memory.move_to_end(path)
+            return cached
+
+        key = self._key(path)
+        try:
+            with open(self._state_path(key), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("version") != self.STATE_VERSION or state.get("path") != path:
+                return None, None, None
+            segments = [pd.read_parquet(self._segment_path(key, index)) for index in range(state["segments"])]
+            df = pd.concat(segments, ignore_index=True) if segments else None
+            return state, df, None
+        except FileNotFoundError:
+            return None, None, None
+        except Exception as e:
+            print(f"读取解析缓存失败: {str(e)}")
+            return None, None, None
+
+    def _save_segment(self, path, state, new_rows, df):
+        """将新解析的完整行追加保存为一段；段数过多时合并"""
+        if pyarrow is None:
+            return
+        key = self._key(path)
+        try:
+            if state["segments"] >= self.MAX_SEGMENTS:
+                for index in range(state["segments"]):
+                    os.remove(self._segment_path(key, index))
+                state["segments"] = 0
+                new_rows = df
+            if len(new_rows):
+                new_rows.to_parquet(self._segment_path(key, state["segments"]), index=False)
+                state["segments"] += 1
+            tmp_path = f"{self._state_path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self._state_path(key))
+        except Exception as e:
+            # 混合类型等无法写入Parquet的数据只缓存在内存中
+            print(f"保存解析缓存失败: {str(e)}")
+            self._drop_disk(key)
+
+    def _drop_disk(self, key):
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(key + "."):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _concat(*frames):
+        frames = [frame for frame in frames if frame is not None and len(frame)]
+        if not frames:
+            return pd.DataFrame()
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def _remember(self, path, state, df, partial):
+        """保留在内存中；超出文件数上限时丢弃最久未读取的文件（磁盘上的Parquet段仍保留）"""
+        self._memory[path] = (state, df, partial)
+        self._memory.move_to_end(path)
+        while len(self._memory) > self.MAX_MEMORY_FILES:
+            self._memory.popitem(last=False)
+
+    def _result(self, df, partial):
+        """返回给调用方的DataFrame：有未完成行时合并（合并结果本身是新对象），否则拷贝缓存的DataFrame"""
+        if partial is not None and len(partial):
+            return self._concat(df, partial)
+        if df is None:
+            return pd.DataFrame()
+        return df.copy(deep=not _COPY_ON_WRITE)
+
+    def load(self, full_path, processor, encodings=None):
+        """读取文件（见 _load）；增量解析失败或文件为UTF-16编码（不能按字节换行切分）时改为完整读取，不缓存"""
+        with self._lock:
+            return self._load_or_read(full_path, processor, encodings)
+
+    def _load_or_read(self, full_path, processor, encodings):
+        try:
+            with open(full_path, 'rb') as f:
+                bom = f.read(2)
+            if bom not in (b"\xff\xfe", b"\xfe\xff"):
+                return self._load(full_path, processor, encodings)
+        except Exception as e:
+            print(f"增量解析 {os.path.basename(full_path)} 失败，改为完整读取: {str(e)}")
+            path = os.path.abspath(full_path)
+            self._memory.pop(path, None)
+            self._drop_disk(self._key(path))
+        return processor.read_file(full_path, encodings=encodings)
+
+    def _load(self, full_path, processor, encodings=None):
+        """读取文件：未变化时直接返回缓存，只追加时只解析新增部分，否则完整读取
+        Args:
+            full_path: 文件路径
+            processor: 支持 read_bytes 的文件处理器
+            encodings: 首次读取时尝试的编码列表
+        Returns:
+            DataFrame（副本，调用方修改不影响缓存）
+        """
+        path = os.path.abspath(full_path)
+        stat = os.stat(path)
+        state, df, partial = self._load_state(path)
+
+        if state is None or not self._is_same_file(path, state, stat):
+            # 首次读取或文件已轮转：从头读取
+            state = {
+                "version": self.STATE_VERSION, "path": path, "inode": stat.st_ino, "device": stat.st_dev,
+                "offset": 0, "head_hash": None, "encoding": None, "columns": None, "rows": 0, "segments": 0
+            }
+            self._drop_disk(self._key(path))
+            df, partial = None, None
+        elif stat.st_size == state["size"] and stat.st_mtime_ns == state["mtime_ns"]:
+            self._remember(path, state, df, partial)
+            return self._result(df, partial)
+
+        with open(path, 'rb') as f:
+            f.seek(state["offset"])
+            data = f.read(stat.st_size - state["offset"])
+
+        # 只有以换行结束的行才计入偏移；末尾未写完的行暂时解析显示，下次从该行开头重新解析
+        cut = data.rfind(b"\n") + 1
+        complete, tail = data[:cut], data[cut:]
+        encodings = [state["encoding"]] + [e for e in (encodings or []) if e != state["encoding"]] \
+            if state["encoding"] else encodings
+
+        new_rows = None
+        if complete.strip():
+            new_rows, encoding = processor.read_bytes(complete, encodings, columns=state["columns"])
+            if state["columns"] is None:
+                state["columns"] = [str(col) for col in new_rows.columns]
+                new_rows.columns = state["columns"]
+                state["encoding"] = encoding
+        partial = None
+        if tail.strip():
+            partial, _ = processor.read_bytes(tail, encodings, columns=state["columns"])
+            if state["columns"] is None:
+                partial.columns = [str(col) for col in partial.columns]
+
+        df = self._concat(df, new_rows)
+        state["offset"] += cut
+        state["rows"] = len(df)
+        state["size"] = stat.st_size
+        state["mtime_ns"] = stat.st_mtime_ns
+        state["head_hash"] = self._head_hash(path, state["offset"])
+        if new_rows is not None:
+            self._save_segment(path, state, new_rows, df)
+
+        self._remember(path, state, df, partial)
+        return self._result(df, partial)
+
+    def file_state(self, full_path):
+        """文件的缓存状态（偏移、行数等），未缓存时返回None"""
+        cached = self._memory.get(os.path.abspath(full_path))
+        return dict(cached[0]) if cached else None
@@ -1,8 +1,24 @@
 import os
+import re
+import time
+import hashlib
 import pandas as pd
 import json
-from utils.helpers import get_file_list, sanitize_filename
+from utils.helpers import get_file_list, sanitize_filename, get_cache_dir, get_file_fingerprint
 from core.api_client import DeepSeekAPI
+from core.data_profiler import DataProfiler
+from core.disk_cache import DiskCache
+from core.map_reduce import MapReduceAnswerer, estimate_tokens
+from core.model_router import ModelRouter
+from core.code_executor import CodeExecutor, check_backend
+from core.sql_engine import SqlEngine
+from core.parse_cache import ParseCache
+from core.token_index import index_base_path
+from core.time_partitions import TimePartitionStore
+from core.time_window import (filter_time_range, format_time_range, extract_times, is_clock_range,
+                              anchor_clock_range)
+from core.metrics import span
+from core.cancellation import AnalysisCancelled
 from core.file_processors import (
     CsvFileProcessor, ExcelFileProcessor,
     JsonFileProcessor, TxtFileProcessor
@@ -10,6 +26,10 @@ from core.file_processors import (
 
 
 class LogAIProcessor:
+    # 代码生成提示词版本，修改提示词后需递增，使旧的代码缓存失效
+    CODE_PROMPT_VERSION = 4
+    SQL_PROMPT_VERSION = 1
+
     def __init__(self, config):
         self.config = config
         self.api_key = config.get("api_key", "")
@@ -28,13 +48,63 @@ class LogAIProcessor:
         self.verbose = config.get("verbose_logging", False)
         self.supported_encodings = ['utf-8', 'gbk', 'gb2312', 'ansi', 'utf-16', 'utf-16-le']
 
+        # LLM响应缓存（相同去敏提示词和参数直接复用响应）
+        self.response_cache = DiskCache(
+            get_cache_dir(config, "responses"),
+            ttl_seconds=config.get("response_cache_ttl_hours", 24) * 3600,
+            max_bytes=config.get("response_cache_max_mb", 200) * 1024 * 1024
+        )
+
+        # 分块汇总结论缓存（同一文件再次提问相同问题时复用）
+        self.chunk_cache = DiskCache(
+            get_cache_dir(config, "chunk_summaries"),
+            ttl_seconds=config.get("response_cache_ttl_hours", 24) * 3600,
+            max_entries=config.get("chunk_cache_max_entries", 5000)
+        )
+
         # 初始化API客户端，传入敏感词处理器
-        self.client = DeepSeekAPI(api_key=self.api_key,
-                                  sensitive_processor=self.sensitive_processor) if self.api_key else None
+        self.client = self._create_client()
 
         # 存储当前选择的文件和数据
         self.current_files = None
         self.current_data = None
+        self.current_file_paths = {}  # 格式: {文件名: 完整路径}
+        self.current_time_range = None  # 当前数据的时间范围 (开始, 结束)，None表示全部数据
+        self.requested_time_range = None  # 请求的时间范围（没有日期的时段在读取时按数据日期确定）
+        self.current_untimed_rows = {}  # 文件名 -> 按时间范围读取时因无法识别时间而排除的行数
+
+        # 跟踪模式下已解析文件的缓存（按字节偏移增量解析追加内容）
+        self.parse_cache = ParseCache(get_cache_dir(config, "parsed"))
+
+        # 按时间分区的数据缓存（按时间范围分析时跳过范围外的分区和文件）
+        self.partition_store = TimePartitionStore(get_cache_dir(config, "partitions"))
+
+        # 文件画像（按文件指纹缓存）
+        self.profiler = DataProfiler(get_cache_dir(config, "profiles"))
+
+        # 生成代码缓存：(规范化请求, 数据结构指纹, 模型, 提示词版本) -> 代码
+        self.code_cache = DiskCache(
+            get_cache_dir(config, "generated_code"),
+            ttl_seconds=config.get("code_cache_ttl_days", 7) * 86400,
+            max_entries=config.get("code_cache_max_entries", 200)
+        )
+        self._pending_code_entry = None  # 等待执行结果确认的缓存条目 (键, 条目, 是否新生成)
+
+        # 模型路由：简单请求使用快速模型，生成的代码执行失败时回退到推理模型
+        self.model_router = ModelRouter(
+            os.path.join(get_cache_dir(config), "model_stats.json"),
+            fast_model=config.get("fast_model", "deepseek-chat"),
+            reasoner_model=config.get("reasoner_model", "deepseek-reasoner"),
+            enabled=config.get("model_routing", True),
+            max_reasoner_latency=config.get("max_reasoner_latency", 120)
+        )
+        self.last_code_model = None  # 最近一次生成代码所用模型
+
+        # 生成代码的独立执行进程池，启动时预热
+        self.code_executor = None
+        if config.get("isolated_execution", True):
+            self.code_executor = CodeExecutor(config.get("executor_workers", 2))
+            self.code_executor.start()
 
         # 初始化文件处理器（核心扩展点：添加新类型只需在这里注册）
         self.file_processors = [
@@ -50,6 +120,30 @@ class LogAIProcessor:
             for ext in processor.get_supported_extensions():
                 self.extension_map[ext.lower()] = processor
 
+    def _create_client(self):
+        """根据当前API Key创建API客户端"""
+        if not self.api_key:
+            return None
+        return DeepSeekAPI(api_key=self.api_key,
+                           sensitive_processor=self.sensitive_processor,
+                           base_url=self.config.get("api_base_url") or "https://api.deepseek.com",
+                           response_cache=self.response_cache,
+                           max_concurrency=self.config.get("api_max_concurrency", 4),
+                           requests_per_minute=self.config.get("api_requests_per_minute", 60),
+                           hedge_requests=self.config.get("hedge_requests", False),
+                           hedge_percentile=self.config.get("hedge_percentile", 0.95),
+                           hedge_budget=self.config.get("hedge_budget", 20))
+
+    def set_api_key(self, api_key):
+        """更新API Key并重新初始化客户端"""
+        self.api_key = api_key
+        self.client = self._create_client()
+
+    def shutdown(self):
+        """释放后台资源（执行进程池）"""
+        if self.code_executor:
+            self.code_executor.shutdown()
+
     def set_default_data_dir(self, new_dir):
         if new_dir:
             self.default_data_dir = new_dir
@@ -74,102 +168,295 @@ class LogAIProcessor:
             return []
         return get_file_list(self.current_data_dir)
 
-    def load_data_files(self, file_names):
-        """从当前数据目录加载文件"""
+    def load_data_files(self, file_names, follow=None, time_range=None):
+        """从当前数据目录加载文件；follow 为True时强制使用跟踪模式（增量解析），None时按配置；
+        time_range 为 (开始, 结束) 时只保留该时间范围内的行"""
         if not self.current_data_dir or not os.path.exists(self.current_data_dir):
             raise ValueError("当前数据目录未设置或不存在")
 
-        return self._load_file_data(file_names)
+        return self._load_file_data(file_names, follow, time_range)
+
+    @property
+    def follow_mode(self):
+        """跟踪模式：日志文件持续追加时只解析新增的内容"""
+        return self.config.get("follow_mode", False)
 
-    def _load_file_data(self, file_names):
+    @property
+    def time_partition(self):
+        """按时间范围读取时的分区粒度：day、hour，off表示不分区（读取后再按时间筛选）"""
+        return self.config.get("time_partition", "day")
+
+    def _load_file_data(self, file_names, follow=None, time_range=None):
         """从当前数据目录读取文件数据"""
-        if self.current_data and set(file_names) == set(self.current_data.keys()):
+        follow = self.follow_mode if follow is None else follow
+        # 跟踪模式下文件可能已追加内容，每次都经过解析缓存检查
+        if (not follow and self.current_data and time_range == self.requested_time_range
+                and set(file_names) == set(self.current_data.keys())):
             return self.current_data
 
-        data_dict = {}
-        for file_name in file_names:
-            safe_file = sanitize_filename(file_name)
-            full_path = os.path.join(self.current_data_dir, safe_file)
+        requested = time_range
+        files = [self._resolve_file_path(file_name) for file_name in file_names]
+        preloaded = {}
+        if is_clock_range(time_range):
+            time_range = self._anchor_clock_range(files, time_range, follow, preloaded)
 
-            if not os.path.exists(full_path):
-                raise FileNotFoundError(f"文件不存在: {full_path}")
+        data_dict = {}
+        file_paths = {}
+        untimed_rows = {}
+        for safe_file, full_path in files:
+            with span("load", file=safe_file, bytes=os.path.getsize(full_path)) as record:
+                data_dict[safe_file] = self._read_file(safe_file, full_path, follow, time_range, record,
+                                                       preloaded.pop(safe_file, None))
+                record["rows"] = len(data_dict[safe_file])
+                if record.get("untimed_rows"):
+                    untimed_rows[safe_file] = record["untimed_rows"]
+            file_paths[safe_file] = full_path
 
-            # 获取文件扩展名
-            _, ext = os.path.splitext(full_path)
-            ext = ext.lower()
+        self.current_data = data_dict
+        self.current_file_paths = file_paths
+        self.current_time_range = time_range
+        self.requested_time_range = requested
+        self.current_untimed_rows = untimed_rows
+        return data_dict
 
-            # 检查是否支持该类型
+    def _uses_partitions(self, ext, follow, time_range):
+        """按时间范围读取时是否使用时间分区（跟踪模式下可追加的文件使用解析缓存）"""
+        processor = self.extension_map[ext]
+        return bool(time_range) and self.time_partition in ("day", "hour") and not (follow and processor.supports_append)
+
+    def _anchor_clock_range(self, files, time_range, follow, preloaded):
+        """没有日期的时段（如 02:00到03:00）对应到数据中最晚时间之前最近一次出现的该时段。
+        最晚时间优先取自时间分区清单（没有时建立）；不使用分区时读取文件，读取结果放入 preloaded 供后续使用"""
+        latest = None
+        for safe_file, full_path in files:
+            ext = os.path.splitext(full_path)[1].lower()
             if ext not in self.extension_map:
-                supported_exts = ", ".join(self.extension_map.keys())
-                raise ValueError(
-                    f"不支持的文件格式: {ext}。支持的格式: {supported_exts}"
-                )
+                continue
+            processor = self.extension_map[ext]
+            if self._uses_partitions(ext, follow, time_range):
+                manifest = self.partition_store.manifest(full_path, self.time_partition)
+                if manifest is None:
+                    df = processor.read_file(full_path, encodings=self.supported_encodings)
+                    manifest, _ = self.partition_store.build(full_path, df, self.time_partition)
+                file_latest = pd.Timestamp(manifest["max"]) if manifest["max"] else None
+            else:
+                df = self._read_file(safe_file, full_path, follow)
+                preloaded[safe_file] = df
+                times = extract_times(df)
+                file_latest = times.max() if times is not None else None
+            if file_latest is not None and not pd.isna(file_latest):
+                latest = max(latest, file_latest.to_pydatetime()) if latest else file_latest.to_pydatetime()
+        return anchor_clock_range(time_range, latest)
+
+    def helper_cache_paths(self, data_dict):
+        """生成代码中辅助函数使用的缓存路径 {文件名: {"token_index": 令牌索引路径, "sketches": 概要缓存路径}}。
+        令牌索引与解析缓存存放在一起，概要与画像缓存存放在一起，均按文件指纹区分；未启用令牌索引时不含索引路径。
+        按时间范围筛选后的数据与文件不对应，此时都不使用缓存（概要在执行时对筛选后的数据计算）"""
+        if self.current_time_range:
+            return {}
+        paths = {}
+        for name in data_dict:
+            if name not in self.current_file_paths:
+                continue
+            full_path = self.current_file_paths[name]
+            paths[name] = {"sketches": self.profiler.sketch_path(full_path)}
+            if self.config.get("token_index", True):
+                paths[name]["token_index"] = index_base_path(self.parse_cache.cache_dir, full_path)
+        return paths
+
+    def _file_profile(self, filename, df):
+        """当前数据的文件画像；按时间范围筛选后的数据每次重新计算，不写入画像缓存"""
+        if self.current_time_range:
+            with span("profile", rows=len(df)):
+                return self.profiler.build_profile(df)
+        return self.profiler.get_profile(self.current_file_paths[filename], df)
+
+    def _file_sketches(self, filename, df):
+        """当前数据的近似统计概要；按时间范围筛选后的数据每次重新计算，不写入缓存"""
+        if self.current_time_range:
+            return self.profiler.get_sketches(None, df)
+        return self.profiler.get_sketches(self.current_file_paths[filename], df)
+
+    def _time_range_note(self):
+        if not self.current_time_range:
+            return ""
+        return (f"\n数据时间范围: {format_time_range(self.current_time_range)}"
+                f"（数据中已只包含该时间范围内的记录，无需再按时间筛选）{self._untimed_note()}")
+
+    def _untimed_note(self):
+        if not self.current_untimed_rows:
+            return ""
+        files = "、".join(f"{name} {count} 行" for name, count in self.current_untimed_rows.items())
+        return f"\n注意：以下文件中无法识别时间的行不在时间范围内，已排除: {files}"
+
+    def time_range_report(self):
+        """本次分析的时间范围说明（含因无法识别时间而排除的行数），未按时间范围读取时为空"""
+        if not self.current_time_range:
+            return ""
+        return f"【时间范围】{format_time_range(self.current_time_range)}{self._untimed_note()}"
+
+    def _resolve_file_path(self, file_name):
+        """返回 (清理后的文件名, 完整路径)，文件不存在时抛出异常"""
+        safe_file = sanitize_filename(file_name)
+        full_path = os.path.join(self.current_data_dir, safe_file)
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"文件不存在: {full_path}")
+        return safe_file, full_path
+
+    def _read_file(self, safe_file, full_path, follow=None, time_range=None, record=None, preloaded=None):
+        """使用扩展名对应的文件处理器读取单个文件；指定时间范围时只返回范围内的行，
+        启用时间分区时只读取与范围重叠的分区（不可追加的文件或未开启跟踪模式时）。
+        preloaded 为已读取的整个文件数据，此时只按时间范围筛选"""
+        # 获取文件扩展名
+        _, ext = os.path.splitext(full_path)
+        ext = ext.lower()
+
+        # 检查是否支持该类型
+        if ext not in self.extension_map:
+            supported_exts = ", ".join(self.extension_map.keys())
+            raise ValueError(
+                f"不支持的文件格式: {ext}。支持的格式: {supported_exts}"
+            )
 
-            # 使用对应的处理器读取文件
-            try:
-                processor = self.extension_map[ext]
+        # 使用对应的处理器读取文件
+        try:
+            processor = self.extension_map[ext]
+            follow = self.follow_mode if follow is None else follow
+            if preloaded is not None:
+                df = preloaded
+            elif follow and processor.supports_append:
+                df = self.parse_cache.load(full_path, processor, self.supported_encodings)
+            elif self._uses_partitions(ext, follow, time_range):
+                df, read_partitions, total_partitions, untimed = self.partition_store.load(
+                    full_path, self.time_partition,
+                    lambda: processor.read_file(full_path, encodings=self.supported_encodings),
+                    *time_range
+                )
+                if record is not None:
+                    record["partitions"] = f"{read_partitions}/{total_partitions}"
+                    record["untimed_rows"] = untimed
+                return df
+            else:
                 df = processor.read_file(
                     full_path,
                     encodings=self.supported_encodings
                 )
-                data_dict[safe_file] = df
-            except Exception as e:
-                raise RuntimeError(f"读取文件 {safe_file} 失败: {str(e)}")
-
-        self.current_data = data_dict
-        return data_dict
-
-    def process_and_anonymize_files(self, file_names, output_dir):
-        """处理并去敏文件"""
+            if time_range:
+                df, _, untimed = filter_time_range(df, *time_range)
+                if record is not None:
+                    record["untimed_rows"] = untimed
+            return df
+        except Exception as e:
+            raise RuntimeError(f"读取文件 {safe_file} 失败: {str(e)}")
+
+    def process_and_anonymize_files(self, file_names, output_dir, progress=None, cancel_token=None):
+        """处理并去敏文件（逐个文件读取、去敏、保存）
+        Args:
+            file_names: 文件名列表
+            output_dir: 去敏文件保存目录
+            progress: 进度回调 progress(当前文件序号, 文件总数, 文件名, 已处理字节数, 总字节数)
+            cancel_token: 取消令牌；取消时删除正在写入的文件并抛出 AnalysisCancelled
+        """
         if not file_names:
             raise ValueError("未选择文件")
 
         if not output_dir or not os.path.exists(output_dir):
             raise ValueError("无效的输出目录")
 
-        data_dict = self._load_file_data(file_names)
+        files = [self._resolve_file_path(file_name) for file_name in file_names]
+        sizes = [os.path.getsize(full_path) for _, full_path in files]
+        total_bytes = sum(sizes)
+        done_bytes = 0
         results = {}
 
-        for filename, df in data_dict.items():
-            # 对DataFrame中的文本进行去敏处理
-            anonymized_df = self._anonymize_dataframe(df)
-
-            # 保存去敏后的文件
-            base_name = os.path.splitext(filename)[0]
-            ext = os.path.splitext(filename)[1]
-            output_path = os.path.join(
-                output_dir,
-                f"{base_name}_anonymized{ext}"
-            )
-
-            # 根据文件类型保存
-            _, ext = os.path.splitext(filename)
-            if ext.lower() in ['.csv']:
-                anonymized_df.to_csv(output_path, index=False, encoding='utf-8-sig')
-            elif ext.lower() in ['.xlsx', '.xls']:
-                anonymized_df.to_excel(output_path, index=False)
-            elif ext.lower() in ['.json']:
-                anonymized_df.to_json(output_path, orient='records', force_ascii=False)
-            else:  # 文本文件
-                content = "\n".join(anonymized_df.iloc[:, 0].astype(str).tolist())
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-
-            results[filename] = output_path
+        def report(index, filename, processed):
+            if progress:
+                progress(index, len(files), filename, processed, total_bytes)
+
+        try:
+            for index, ((filename, full_path), size) in enumerate(zip(files, sizes)):
+                if cancel_token:
+                    cancel_token.check()
+                report(index, filename, done_bytes)
+                df = self._read_file(filename, full_path)
+
+                # 对DataFrame中的文本进行去敏处理，按已处理单元格比例折算为字节进度
+                anonymized_df = self._anonymize_dataframe(
+                    df,
+                    progress=lambda fraction: report(index, filename, done_bytes + int(size * fraction)),
+                    cancel_token=cancel_token
+                )
 
+                # 保存去敏后的文件
+                base_name, ext = os.path.splitext(filename)
+                output_path = os.path.join(
+                    output_dir,
+                    f"{base_name}_anonymized{ext}"
+                )
+                self._save_anonymized(anonymized_df, output_path, ext.lower())
+
+                results[filename] = output_path
+                done_bytes += size
+        except AnalysisCancelled:
+            # 取消时删除本次已生成的文件，不留下只完成一部分的结果
+            for output_path in results.values():
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            raise
+
+        report(len(files), None, total_bytes)
         return results
 
-    def _anonymize_dataframe(self, df):
-        """对DataFrame进行去敏处理"""
+    def _save_anonymized(self, df, output_path, ext):
+        """根据文件类型保存去敏结果；先写入临时文件，完成后再重命名，失败时不留下不完整的文件"""
+        temp_path = output_path + ".part"
+        try:
+            if ext in ['.csv']:
+                df.to_csv(temp_path, index=False, encoding='utf-8-sig')
+            elif ext in ['.xlsx', '.xls']:
+                # 临时文件扩展名无法识别，显式指定Excel写入引擎
+                with pd.ExcelWriter(temp_path, engine='openpyxl') as writer:
+                    df.to_excel(writer, index=False)
+            elif ext in ['.json']:
+                df.to_json(temp_path, orient='records', force_ascii=False)
+            else:  # 文本文件
+                content = "\n".join(df.iloc[:, 0].astype(str).tolist())
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _anonymize_dataframe(self, df, progress=None, cancel_token=None, chunk_rows=20000):
+        """对DataFrame进行去敏处理
+        Args:
+            progress: 进度回调 progress(已处理比例 0~1)
+            cancel_token: 取消令牌，每处理一批行检查一次
+        """
         df_copy = df.copy()
 
-        # 对每一列进行处理
-        for col in df_copy.columns:
-            # 处理字符串类型的列
-            if df_copy[col].dtype == 'object':
-                df_copy[col] = df_copy[col].apply(
+        # 处理字符串类型的列（pandas 3 默认使用str类型存储文本）
+        text_columns = [col for col in df_copy.columns if pd.api.types.is_string_dtype(df_copy[col].dtype)]
+        total_cells = len(df_copy) * len(text_columns)
+        done_cells = 0
+
+        for col in text_columns:
+            column = df_copy[col]
+            chunks = []
+            for start in range(0, len(column), chunk_rows):
+                if cancel_token:
+                    cancel_token.check()
+                chunk = column.iloc[start:start + chunk_rows]
+                chunks.append(chunk.apply(
                     lambda x: self._anonymize_text(str(x)) if pd.notna(x) else x
-                )
+                ))
+                done_cells += len(chunk)
+                if progress:
+                    progress(done_cells / total_cells)
+            if chunks:
+                df_copy[col] = pd.concat(chunks)
 
         return df_copy
 
@@ -182,26 +469,171 @@ class LogAIProcessor:
         anonymized_text, _ = self.sensitive_processor.replace_sensitive_words(text)
         return anonymized_text
 
-    def generate_processing_code(self, user_request, file_names):
-        """生成完整可执行代码，而非函数内部逻辑"""
+    @property
+    def dataframe_backend(self):
+        """生成代码使用的数据处理库：pandas（默认）或 polars"""
+        return self.config.get("dataframe_backend", "pandas")
+
+    def _normalize_request(self, user_request):
+        """规范化用户请求（合并空白、忽略大小写），用于缓存键"""
+        return re.sub(r'\s+', ' ', user_request).strip().lower()
+
+    def _schema_fingerprint(self, data_dict):
+        """数据结构指纹：各文件的列名和类型（不含文件名，同结构的新日志也能命中）"""
+        return [
+            [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+            for df in data_dict.values()
+        ]
+
+    def _rebind_file_names(self, code, old_names, new_names):
+        """将缓存代码中引用的原文件名替换为当前文件名。
+        所有文件名一次扫描完成替换，避免先替换的结果被后面的文件名再次替换（如前后两天的日志名互相重叠）"""
+        mapping = {old_name: new_name for old_name, new_name in zip(old_names, new_names) if old_name != new_name}
+        if not mapping:
+            return code
+        names = "|".join(re.escape(name) for name in sorted(mapping, key=len, reverse=True))
+        pattern = re.compile(f"""(['"])({names})\\1""")
+        return pattern.sub(lambda m: f"{m.group(1)}{mapping[m.group(2)]}{m.group(1)}", code)
+
+    def mark_generated_code(self, succeeded):
+        """记录最近一次生成代码的执行结果：成功则标记可复用，失败则从缓存移除"""
+        if not self._pending_code_entry:
+            return
+
+        cache_key, entry, fresh = self._pending_code_entry
+        self._pending_code_entry = None
+        if fresh:
+            self.model_router.record_outcome(entry.get("task", "code"), entry.get("model", self.last_code_model),
+                                             succeeded)
+        if succeeded:
+            entry["succeeded"] = True
+            self.code_cache.set(cache_key, entry)
+        else:
+            self.code_cache.delete(cache_key)
+
+    def _record_hedges(self, record, before):
+        """将调用期间新发送的对冲请求数及其中胜出的次数记入耗时记录，便于统计对冲带来的额外调用"""
+        for key, value in self.client.hedge_stats.items():
+            if value > before.get(key, 0):
+                record[key] = value - before.get(key, 0)
+
+    def can_escalate_code_model(self):
+        """最近一次代码是否由快速模型生成（执行失败时可改用推理模型重新生成）"""
+        return bool(self.last_code_model) and self.last_code_model != self.model_router.reasoner_model
+
+    def _request_completion(self, model, prompt, max_tokens, temperature, on_chunk=None, task=None,
+                            cancel_token=None):
+        """调用模型并返回回答文本；提供 on_chunk 时使用流式调用，逐块回调 on_chunk(类型, 文本)。
+        指定 task 时记录该模型的耗时和token统计；cancel_token 取消或超时时中止请求"""
+        with span("api_call", task=task, model=model, stream=on_chunk is not None) as record:
+            hedges_before = dict(self.client.hedge_stats)
+            start_time = time.perf_counter()
+            if on_chunk is None:
+                response = self.client.completions_create(
+                    model=model,
+                    prompt=prompt,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    cancel_token=cancel_token
+                )
+                content = response.choices[0].message.content.strip()
+                usage = response.usage
+                record["prompt_tokens"] = usage.prompt_tokens if usage else estimate_tokens(prompt)
+                record["completion_tokens"] = usage.completion_tokens if usage else estimate_tokens(content)
+            else:
+                content_parts = []
+                for kind, text in self.client.completions_stream(
+                        model=model,
+                        prompt=prompt,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        cancel_token=cancel_token):
+                    on_chunk(kind, text)
+                    if kind == "content":
+                        content_parts.append(text)
+                content = "".join(content_parts).strip()
+                # 流式响应不返回用量，按文本长度估计
+                record["prompt_tokens"] = estimate_tokens(prompt)
+                record["completion_tokens"] = estimate_tokens(content)
+            self._record_hedges(record, hedges_before)
+
+        if task:
+            self.model_router.record_call(
+                task, model, time.perf_counter() - start_time, record["prompt_tokens"], record["completion_tokens"]
+            )
+        return content
+
+    def generate_processing_code(self, user_request, file_names, use_cache=True, on_chunk=None, model=None,
+                                 cancel_token=None, optimize_from=None, time_range=None):
+        """生成完整可执行代码，而非函数内部逻辑。未指定model时由模型路由根据请求复杂度选择。
+        optimize_from 为 {"code": 原代码, "report": 性能报告文本} 时，要求模型据此重写更快的代码；
+        time_range 为 (开始, 结束) 时数据已按时间范围筛选，提示模型无需再筛选"""
+        self._pending_code_entry = None
+        self.last_code_model = None
         if not self.client:
             # 默认代码：直接返回所有数据
             return """import pandas as pd
     result_table = pd.concat(data_dict.values(), ignore_index=True)
     summary = f'共{len(result_table)}条记录'"""
 
-        data_dict = self._load_file_data(file_names)
-
-        # 准备文件元数据
-        file_info = {}
-        for filename, df in data_dict.items():
-            file_info[filename] = {
-                "columns": df.columns.tolist(),
-                "sample": df.head(2).to_dict(orient='records')
-            }
+        backend = self.dataframe_backend
+        check_backend(backend)
+        data_dict = self._load_file_data(file_names, time_range=time_range)
+        current_names = list(data_dict.keys())
+
+        if optimize_from:
+            # 性能优化需要理解原代码的瓶颈，使用推理模型且不复用缓存；优化后的代码执行成功后覆盖原缓存
+            use_cache = False
+            model = model or self.model_router.reasoner_model
+
+        if model is None:
+            model, max_tokens = self.model_router.route("code", user_request, len(current_names))
+        else:
+            max_tokens = 5000
+
+        # 相同请求作用于相同结构的数据时，直接复用执行成功过的代码（任一模型生成的均可）
+        normalized_request = self._normalize_request(user_request)
+        schema = self._schema_fingerprint(data_dict)
+        # polars后端生成的代码不能在pandas下执行，缓存键中区分
+        prompt_version = self.CODE_PROMPT_VERSION if backend == "pandas" else f"{self.CODE_PROMPT_VERSION}-{backend}"
+        if time_range:
+            # 按时间范围筛选后生成的代码不再包含时间筛选，不能用于全部数据
+            prompt_version = f"{prompt_version}-ranged"
+        cache_key = self.code_cache.make_key(normalized_request, schema, model, prompt_version)
+        if use_cache:
+            candidate_models = [model] + [m for m in (self.model_router.reasoner_model,
+                                                      self.model_router.fast_model) if m != model]
+            for candidate in candidate_models:
+                candidate_key = self.code_cache.make_key(normalized_request, schema, candidate, prompt_version)
+                entry = self.code_cache.get(candidate_key)
+                if entry and entry.get("succeeded"):
+                    self._pending_code_entry = (candidate_key, entry, False)
+                    self.last_code_model = candidate
+                    return self._rebind_file_names(entry["code"], entry["file_names"], current_names)
+
+        # 准备文件元数据（日志消息列用模板直方图代替原始样本，覆盖整个文件且更省token）
+        with span("build_prompt", files=len(data_dict)):
+            file_info = {}
+            for filename, df in data_dict.items():
+                profile = self._file_profile(filename, df)
+                file_info[filename] = {"columns": df.columns.tolist()}
+                if "日志模板" in profile:
+                    file_info[filename]["sample"] = df.head(1).to_dict(orient='records')
+                    file_info[filename]["templates"] = profile["日志模板"]
+                else:
+                    file_info[filename]["sample"] = df.head(2).to_dict(orient='records')
+
+        if backend == "polars":
+            backend_notes = """
+12. 使用polars（import polars as pl）而不是pandas处理数据：data_dict中的值为 pl.LazyFrame，
+   尽量使用惰性API（filter、with_columns、group_by、agg、join等）组合查询，最后调用 collect()；
+   不要转换为pandas，result_table 为 pl.DataFrame 或 pl.LazyFrame 均可；
+   mine_templates 只接受pandas Series，需要时对单列使用 df.select('列名').collect().to_series().to_pandas()"""
+        else:
+            backend_notes = ""
 
         prompt = f"""根据用户请求编写完整的Python处理代码:
-用户需求: {user_request}
+用户需求: {user_request}{self._time_range_note()}
 数据信息: {json.dumps(file_info, ensure_ascii=False)}
 
 说明：
@@ -221,54 +653,149 @@ class LogAIProcessor:
 5. 不需要return语句，只需确保定义了上述两个变量
 6. 处理日志时，务必将包含类似"低/中/高"等含中文的字符串的列显式转换为字符串类型（如df['level'] = df['level'].astype(str)）
 7. 对于时间/日期类型的列（如包含timestamp、datetime的列），必须显式转换为字符串类型（如df['time'] = df['time'].astype(str)），确保导出格式正确
-8. 处理日志时，对于确定同义的表头信息，建议使用统一的名称，并对内容进行整合"""
-
-        response = self.client.completions_create(
-            model='deepseek-reasoner',
+8. 处理日志时，对于确定同义的表头信息，建议使用统一的名称，并对内容进行整合
+9. 数据信息中的templates是日志消息列的模板统计（<*>、<IP>、<NUM>等为变量），可直接调用已存在的函数 mine_templates(df['列名'])，
+   返回与原数据行对齐的DataFrame，包含 template_id、template 及 param_1、param_2... 列（变量位置的原始值）
+10. 按IP、用户名、主机名、哈希值等查找相关记录时，使用已存在的函数 lookup(文件名, 值1, 值2...)（使用倒排索引，比 str.contains 全表扫描快得多），
+   返回原数据中完整包含任一值（不区分大小写）的行；lookup_rows(文件名, 值...) 返回这些行的位置（numpy数组）
+11. 用户只需要去重数、排名前几的值或分位数等近似结果时，可使用已存在的函数（基于缓存的概要，无需全表分组统计）：
+   approx_distinct(文件名, 列名) 返回去重数估计；approx_top_k(文件名, 列名, k) 返回包含 value、count、error 列的DataFrame（真实次数在 count-error 与 count 之间）；
+   approx_quantile(文件名, 列名, q) 返回数值列分位数估计；approx_count(文件名, 列名, 值) 返回出现次数估计（不小于真实次数）。
+   日志消息列中的IP地址可用伪列名 "列名[IP]" 统计；使用近似结果时在summary中注明为估计值{backend_notes}"""
+
+        if optimize_from:
+            prompt += f"""
+
+以下是此前为该需求生成的代码及其执行性能报告。请在保证结果完全相同的前提下，针对报告中的热点行重写为更快、更省内存的代码
+（优先使用向量化操作，避免apply和逐行循环、不必要的复制和中间大表）:
+原代码:
+{optimize_from["code"]}
+
+性能报告:
+{optimize_from["report"]}"""
+
+        code_block = self._request_completion(
+            model=model,
             prompt=prompt,
-            max_tokens=5000,
-            temperature=0.3
+            max_tokens=max_tokens,
+            temperature=0.3,
+            on_chunk=on_chunk,
+            task="code",
+            cancel_token=cancel_token
         )
+        self.last_code_model = model
 
-        code_block = response.choices[0].message.content.strip()
+        # 先记录为未验证，执行成功后由 mark_generated_code 标记为可复用
+        entry = {"code": code_block, "file_names": current_names, "model": model, "succeeded": False}
+        self.code_cache.set(cache_key, entry)
+        self._pending_code_entry = (cache_key, entry, True)
 
         return code_block
 
-    def direct_answer(self, user_request, file_names):
-        """直接回答模式：生成日志总结，不返回表格数据"""
-        data_dict = self._load_file_data(file_names)
+    def open_sql_engine(self, file_names):
+        """创建SQL引擎并将所选文件注册为表（能直接扫描的文件不载入内存）"""
+        if not self.current_data_dir or not os.path.exists(self.current_data_dir):
+            raise ValueError("当前数据目录未设置或不存在")
 
-        # 收集文件详细信息
-        file_details = []
-        for filename, df in data_dict.items():
-            # 基础信息
-            details = {
-                "文件名": filename,
-                "记录数": len(df),
-                "列名": df.columns.tolist(),
-                "数据类型分布": {col: str(df[col].dtype) for col in df.columns},
-                "数据样本": df.head(min(3, len(df))).to_dict(orient='records')  # 最多3行样本
-            }
-
-            # 数值列统计
-            numeric_stats = {}
-            for col in df.columns:
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    numeric_stats[col] = {
-                        "平均值": df[col].mean(),
-                        "最小值": df[col].min(),
-                        "最大值": df[col].max(),
-                        "非空值数量": df[col].count()
-                    }
-            if numeric_stats:
-                details["数值列统计"] = numeric_stats
-
-            file_details.append(details)
+        engine = SqlEngine(
+            threads=self.config.get("sql_threads", 0),
+            temp_dir=self.config.get("sql_temp_dir") or get_cache_dir(self.config, "duckdb_tmp")
+        )
+        try:
+            for file_name in file_names:
+                safe_file, full_path = self._resolve_file_path(file_name)
+                with span("load", file=safe_file, bytes=os.path.getsize(full_path)):
+                    engine.register_file(safe_file, full_path,
+                                         loader=lambda name, path=full_path: self._read_file(name, path))
+        except Exception:
+            engine.close()
+            raise
+        return engine
+
+    def generate_sql(self, user_request, engine, on_chunk=None, model=None, cancel_token=None, use_cache=True):
+        """生成在SQL引擎上执行的查询语句（DuckDB方言）"""
+        self._pending_code_entry = None
+        self.last_code_model = None
+        tables = list(engine.tables.values())
+        if not self.client:
+            # 默认查询：直接返回第一个文件的数据
+            return f'SELECT * FROM "{tables[0]}"'
+
+        with span("build_prompt", files=len(tables)):
+            table_info = {table: engine.describe(table) for table in tables}
+        if model is None:
+            model, max_tokens = self.model_router.route("sql", user_request, len(tables))
+        else:
+            max_tokens = 5000
+
+        # 与代码缓存共用存储，按表结构（不含表名）区分
+        normalized_request = self._normalize_request(user_request)
+        schema = [info["columns"] for info in table_info.values()]
+        cache_key = self.code_cache.make_key(normalized_request, schema, model, "sql", self.SQL_PROMPT_VERSION)
+        if use_cache:
+            candidate_models = [model] + [m for m in (self.model_router.reasoner_model,
+                                                      self.model_router.fast_model) if m != model]
+            for candidate in candidate_models:
+                candidate_key = self.code_cache.make_key(
+                    normalized_request, schema, candidate, "sql", self.SQL_PROMPT_VERSION
+                )
+                entry = self.code_cache.get(candidate_key)
+                if entry and entry.get("succeeded"):
+                    self._pending_code_entry = (candidate_key, entry, False)
+                    self.last_code_model = candidate
+                    return self._rebind_file_names(entry["code"], entry["file_names"], tables)
+
+        prompt = f"""根据用户请求编写一条DuckDB SQL查询:
+用户需求: {user_request}
+数据表信息（表名: 列名和类型、样本数据）: {json.dumps(table_info, ensure_ascii=False, default=str)}
+
+说明：
+重要提示：返回的内容只能是一条可直接执行的SQL查询语句，绝对不要有任何其他说明
+1. 只能使用上面列出的表，表名和列名一律用双引号括起来
+2. 只能编写一条 SELECT（可使用 WITH）查询，不要修改数据，不要读取或写入其他文件
+3. 使用DuckDB支持的函数（如 regexp_extract、strptime、date_trunc、approx_count_distinct）
+4. 时间列为字符串时先用 TRY_CAST 或 strptime 转换后再比较
+5. 查询结果即为展示给用户的结果表，列名使用有意义的中文或英文别名
+6. 结果行数可能很大时按用户需求排序并用 LIMIT 限制行数"""
+
+        sql = self._request_completion(
+            model=model,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=0.3,
+            on_chunk=on_chunk,
+            task="sql",
+            cancel_token=cancel_token
+        )
+        self.last_code_model = model
+
+        entry = {"code": sql, "file_names": tables, "model": model, "task": "sql", "succeeded": False}
+        self.code_cache.set(cache_key, entry)
+        self._pending_code_entry = (cache_key, entry, True)
+        return sql
+
+    def direct_answer(self, user_request, file_names, on_chunk=None, cancel_token=None, time_range=None):
+        """直接回答模式：生成日志总结，不返回表格数据"""
+        data_dict = self._load_file_data(file_names, time_range=time_range)
+
+        # 收集文件详细信息（画像和近似统计概要按文件指纹缓存，重复提问直接复用）
+        with span("build_prompt", files=len(data_dict)):
+            file_details = []
+            for filename, df in data_dict.items():
+                profile = self._file_profile(filename, df)
+                details = {"文件名": filename}
+                # 基数和高频值由概要给出（含日志消息列中的IP），不再重复列出
+                details.update({k: v for k, v in profile.items() if k not in ("文件指纹", "基数估计", "高频值")})
+                details["近似统计"] = self._file_sketches(filename, df).summary(top_k=self.profiler.top_k)
+                # 已有模板直方图概括全文件时，只保留一行样本
+                if "日志模板" in details:
+                    details["数据样本"] = details["数据样本"][:1]
+                file_details.append(details)
 
         # 构建提示词
         prompt = f"""基于以下日志文件的详细信息，回答用户问题并生成总结:
     文件详情: {json.dumps(file_details, ensure_ascii=False, default=str)}
-    用户问题: {user_request}
+    用户问题: {user_request}{self._time_range_note()}
 
     回答要求:
     1. 深入分析日志数据特征、潜在规律和关键信息
@@ -277,13 +804,57 @@ class LogAIProcessor:
     4. 涉及统计信息时自然体现关键数值
     5. 用简洁易懂的中文表达"""
 
-        # 调用API
-        response = self.client.completions_create(
-            model='deepseek-reasoner',
+        # 调用API（简单问题使用快速模型）
+        model, max_tokens = self.model_router.route("answer", user_request, len(data_dict))
+        answer = self._request_completion(
+            model=model,
             prompt=prompt,
-            max_tokens=5000,
-            temperature=0.6
+            max_tokens=max_tokens,
+            temperature=0.6,
+            on_chunk=on_chunk,
+            task="answer",
+            cancel_token=cancel_token
         )
 
+        return {"summary": answer}
+
+    def map_reduce_answer(self, user_request, file_names, progress=None, cancel_token=None, time_range=None):
+        """分块汇总模式：覆盖全部数据（或时间范围内的全部数据），适合大日志上的细粒度问题"""
+        if not self.client:
+            raise ValueError("请先配置API Key")
 
-        return {"summary": response.choices[0].message.content.strip()}
+        data_dict = self._load_file_data(file_names, time_range=time_range)
+        files = {}
+        context = []
+        for filename, df in data_dict.items():
+            fingerprint = get_file_fingerprint(self.current_file_paths[filename])
+            if time_range:
+                # 分块结论按行号缓存，筛选后的数据需与全部数据区分
+                fingerprint = hashlib.sha1(
+                    f"{fingerprint}|{format_time_range(self.current_time_range)}".encode('utf-8')).hexdigest()
+            files[filename] = (fingerprint, df)
+            profile = self._file_profile(filename, df)
+            context.append({
+                "文件名": filename,
+                "记录数": profile.get("记录数"),
+                "列名": profile.get("列名"),
+                "时间范围": profile.get("时间范围", {})
+            })
+
+        answerer = MapReduceAnswerer(
+            self.client,
+            self.chunk_cache,
+            map_model=self.config.get("map_reduce_model", "deepseek-chat"),
+            # 最终汇总模型：未单独配置时与直接回答模式一样由模型路由选择
+            reduce_model=(self.config.get("map_reduce_reduce_model")
+                          or self.model_router.route("answer", user_request, len(files))[0]),
+            chunk_tokens=self.config.get("map_reduce_chunk_tokens", 6000),
+            max_parallel=self.config.get("map_reduce_parallel", 4),
+            max_total_tokens=self.config.get("map_reduce_max_tokens", 2000000)
+        )
+        with span("map_reduce", rows=sum(len(df) for _, df in files.values())) as record:
+            hedges_before = dict(self.client.hedge_stats)
+            summary = answerer.answer(files, user_request, context=context, progress=progress,
+                                      cancel_token=cancel_token)
+            self._record_hedges(record, hedges_before)
+        return {"summary": summary}
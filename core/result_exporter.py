@@ -0,0 +1,187 @@
+import os
+import gzip
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 没有pyarrow时不支持Parquet/Feather和zstd压缩
+    pa = None
+    pq = None
+
+try:
+    import xlsxwriter
+except ImportError:  # 没有xlsxwriter时使用openpyxl的只写模式
+    xlsxwriter = None
+
+
+class ResultExporter:
+    """结果导出：按行分批写入多种格式，支持进度回调和取消；先写入临时文件，完成后再重命名"""
+
+    # 格式键 -> (保存对话框中的说明, 扩展名)
+    FORMATS = {
+        "csv": ("CSV 文件", ".csv"),
+        "csv.gz": ("CSV gzip压缩", ".csv.gz"),
+        "csv.zst": ("CSV zstd压缩", ".csv.zst"),
+        "parquet": ("Parquet 列式文件", ".parquet"),
+        "feather": ("Feather/Arrow 文件", ".feather"),
+        "ndjson": ("NDJSON（每行一个JSON）", ".ndjson"),
+        "xlsx": ("Excel 工作簿", ".xlsx")
+    }
+    EXCEL_MAX_ROWS = 1048576
+
+    def __init__(self, batch_rows=50000):
+        self.batch_rows = batch_rows
+
+    @classmethod
+    def dialog_filters(cls):
+        """保存对话框的文件类型过滤器，返回 (过滤器字符串, {过滤器: 格式键})"""
+        filters = {f"{label} (*{ext})": fmt for fmt, (label, ext) in cls.FORMATS.items()}
+        return ";;".join(filters), filters
+
+    @classmethod
+    def detect_format(cls, file_path, default="csv"):
+        """根据文件扩展名判断格式（先匹配较长的复合扩展名）"""
+        lowered = file_path.lower()
+        for fmt, (_, ext) in sorted(cls.FORMATS.items(), key=lambda item: -len(item[1][1])):
+            if lowered.endswith(ext):
+                return fmt
+        return default
+
+    @classmethod
+    def ensure_extension(cls, file_path, fmt):
+        ext = cls.FORMATS[fmt][1]
+        return file_path if file_path.lower().endswith(ext) else file_path + ext
+
+    def _batches(self, df, progress, cancel_token):
+        """按批返回数据，每批前检查取消，每批后回调进度"""
+        total = len(df)
+        for start in range(0, max(total, 1), self.batch_rows):
+            if cancel_token:
+                cancel_token.check()
+            batch = df.iloc[start:start + self.batch_rows]
+            yield start == 0, batch
+            if progress:
+                progress(min(start + self.batch_rows, total), total)
+
+    def export(self, df, file_path, fmt, progress=None, cancel_token=None):
+        """导出DataFrame
+        Args:
+            df: 结果表
+            file_path: 目标文件路径
+            fmt: 格式键（见 FORMATS）
+            progress: 进度回调 progress(已写入行数, 总行数)
+            cancel_token: 取消令牌，取消时删除未完成的文件并抛出 AnalysisCancelled
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt in ("parquet", "feather", "csv.zst") and pa is None:
+            raise ValueError(f"导出 {self.FORMATS[fmt][0]} 需要安装pyarrow（pip install pyarrow）")
+        if fmt == "xlsx" and len(df) >= self.EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel最多支持 {self.EXCEL_MAX_ROWS - 1} 行数据，请选择其他格式")
+
+        temp_path = file_path + ".part"
+        writer = getattr(self, "_write_" + fmt.replace(".", "_"))
+        try:
+            writer(df, temp_path, progress, cancel_token)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path
+
+    def _write_csv_stream(self, df, stream, progress, cancel_token):
+        for first, batch in self._batches(df, progress, cancel_token):
+            batch.to_csv(stream, index=False, header=first)
+
+    def _write_csv(self, df, path, progress, cancel_token):
+        # 与原保存方式一致使用utf-8-sig，Excel可直接打开
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            self._write_csv_stream(df, f, progress, cancel_token)
+
+    def _write_csv_gz(self, df, path, progress, cancel_token):
+        with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6) as f:
+            self._write_csv_stream(df, f, progress, cancel_token)
+
+    def _write_csv_zst(self, df, path, progress, cancel_token):
+        with pa.CompressedOutputStream(path, "zstd") as raw:
+            for first, batch in self._batches(df, progress, cancel_token):
+                raw.write(batch.to_csv(index=False, header=first).encode('utf-8'))
+
+    def _write_ndjson(self, df, path, progress, cancel_token):
+        with open(path, 'w', encoding='utf-8') as f:
+            for _, batch in self._batches(df, progress, cancel_token):
+                if len(batch):
+                    f.write(batch.to_json(orient='records', lines=True, force_ascii=False, date_format='iso'))
+                    f.write("\n")
+
+    @staticmethod
+    def _arrow_frame(df):
+        """Arrow要求每列类型一致：列名转为字符串，无法推断统一类型的object列转为字符串"""
+        df = df.rename(columns=str)
+        try:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            object_columns = [col for col in df.columns if df[col].dtype == object]
+            df = df.astype({col: str for col in object_columns})
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+        return df, schema
+
+    def _write_parquet(self, df, path, progress, cancel_token):
+        df, schema = self._arrow_frame(df)
+        # 每批写为一个行组，读取时可按行组跳过
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for _, batch in self._batches(df, progress, cancel_token):
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+
+    def _write_feather(self, df, path, progress, cancel_token):
+        df, schema = self._arrow_frame(df)
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+            for _, batch in self._batches(df, progress, cancel_token):
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+
+    @staticmethod
+    def _excel_value(value):
+        """转换为Excel可写入的值：空值写为空单元格，numpy数值转为Python数值，其余转为文本"""
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or value is pd.NA or value is pd.NaT:
+            return None
+        if isinstance(value, float) and value != value:
+            return None
+        if isinstance(value, (int, float, str, bool)):
+            return value
+        return str(value)
+
+    def _excel_rows(self, df, progress, cancel_token):
+        for first, batch in self._batches(df, progress, cancel_token):
+            if first:
+                yield [str(col) for col in df.columns]
+            for row in batch.itertuples(index=False, name=None):
+                yield [self._excel_value(value) for value in row]
+
+    def _write_xlsx(self, df, path, progress, cancel_token):
+        if xlsxwriter is not None:
+            # 常量内存模式：每写完一行即刷新到磁盘，内存占用与行数无关
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+            try:
+                sheet = workbook.add_worksheet("结果")
+                for row_index, row in enumerate(self._excel_rows(df, progress, cancel_token)):
+                    sheet.write_row(row_index, 0, row)
+            finally:
+                workbook.close()
+            return
+
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ValueError("导出Excel需要安装xlsxwriter或openpyxl")
+        # openpyxl只写模式同样按行流式写出
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("结果")
+        for row in self._excel_rows(df, progress, cancel_token):
+            sheet.append(row)
+        workbook.save(path)
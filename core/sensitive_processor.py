@@ -164,9 +164,10 @@ class SensitiveWordProcessor:
             df = df.fillna("")
 
             count = 0
-            for _, row in df.iterrows():
-                word = str(row["敏感词"]).strip()
-                replacement = str(row.get("替换词", "")).strip()
+            replacements = df["替换词"] if "替换词" in df.columns else [""] * len(df)
+            for word, replacement in zip(df["敏感词"], replacements):
+                word = str(word).strip()
+                replacement = str(replacement).strip()
 
                 if not word:
                     continue
@@ -175,8 +176,8 @@ class SensitiveWordProcessor:
                 if word in self.sensitive_words:
                     continue
 
-                # 添加敏感词
-                self.add_sensitive_word(word, replacement)
+                # 先逐个加入字典，全部导入后只排序和保存一次
+                self.sensitive_words[word] = replacement or self._generate_replacement()
                 count += 1
 
             self._sort_sensitive_words()
@@ -268,7 +269,65 @@ class SensitiveWordProcessor:
 
         return restored_text
 
+    def get_replacement(self, word):
+        """获取敏感词对应的替换词，不存在时返回None"""
+        return self.sensitive_words.get(word)
+
     def get_all_sensitive_words(self):
         """获取所有敏感词列表"""
         return [(k, v) for k, v in self.sensitive_words.items()]
 
+    def create_stream_restorer(self):
+        """创建流式还原器，用于逐块还原流式响应"""
+        return StreamRestorer(self)
+
+
+class StreamRestorer:
+    """流式敏感词还原：替换词可能被拆分在两个数据块之间，
+    因此缓冲区末尾可能构成替换词前缀的部分暂不输出，等待后续数据块"""
+
+    def __init__(self, sensitive_processor):
+        self.buffer = ""
+        # 所有替换词的真前缀（忽略大小写，与还原逻辑一致）
+        self.prefixes = set()
+        for replacement in sensitive_processor.replacement_map:
+            lowered = replacement.lower()
+            for i in range(1, len(lowered)):
+                self.prefixes.add(lowered[:i])
+        self.max_hold = max((len(p) for p in self.prefixes), default=0)
+        # 所有替换词合并为一个正则（长词优先），每个数据块只扫描一遍，按小写替换词查表还原
+        self.lookup = {}
+        for replacement, word in sorted(sensitive_processor.replacement_map.items(),
+                                        key=lambda x: len(x[0]), reverse=True):
+            self.lookup.setdefault(replacement.lower(), word)
+        self.pattern = None
+        if self.lookup:
+            self.pattern = re.compile("|".join(re.escape(r) for r in self.lookup), re.IGNORECASE)
+
+    def _restore(self, text):
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(lambda m: self.lookup[m.group(0).lower()], text)
+
+    def feed(self, chunk):
+        """输入一个数据块，返回可以安全输出的已还原文本"""
+        if not chunk:
+            return ""
+        self.buffer += chunk
+
+        # 找到缓冲区末尾最长的、可能是替换词前缀的部分
+        hold = 0
+        lowered_tail = self.buffer[-self.max_hold:].lower() if self.max_hold else ""
+        for length in range(min(self.max_hold, len(self.buffer)), 0, -1):
+            if lowered_tail[-length:] in self.prefixes:
+                hold = length
+                break
+
+        ready = self.buffer[:len(self.buffer) - hold]
+        self.buffer = self.buffer[len(self.buffer) - hold:]
+        return self._restore(ready)
+
+    def flush(self):
+        """输出缓冲区剩余内容"""
+        ready, self.buffer = self.buffer, ""
+        return self._restore(ready)
@@ -0,0 +1,461 @@
+import os
+import json
+import zlib
+import base64
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # 没有pyarrow时全部用Python正则提取IP
+    pa = pc = None
+
+# 日志消息列中提取IP地址，作为伪列 "列名[IP]" 统计
+IP_PATTERN = r'(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])'
+# pyarrow正则（RE2）不支持断言：先统计疑似IP个数，只含一个的行用捕获组提取，其余行用 IP_PATTERN
+_IP_CANDIDATE = r'(?:\d{1,3}\.){3}\d{1,3}'
+_IP_SINGLE = r'(?:^|[^\d.])(?P<ip>(?:\d{1,3}\.){3}\d{1,3})(?:[^\d.]|$)'
+
+
+def _encode_array(array):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes())).decode('ascii')
+
+
+def _decode_array(text, dtype, shape=None):
+    array = np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=dtype).copy()
+    return array.reshape(shape) if shape is not None else array
+
+
+def hash_values(series):
+    """64位哈希（固定哈希键，不同进程、不同文件的结果一致，概要可以合并）"""
+    return pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+
+
+def extract_ips(text):
+    """文本Series中的IP地址，返回以原行索引为索引的Series（每个IP一项）"""
+    if pc is not None:
+        try:
+            array = pa.array(text, type=pa.string())
+            counts = pc.count_substring_regex(array, _IP_CANDIDATE).to_numpy(zero_copy_only=False)
+            single = counts == 1
+            first = pc.struct_field(pc.extract_regex(array.filter(pa.array(single)), _IP_SINGLE), 0)
+            first = pd.Series(first.to_pandas().to_numpy(dtype=object), index=text.index[single])
+            several = text[counts > 1].str.findall(IP_PATTERN).explode()
+            return pd.concat([first, several]).dropna().astype(str)
+        except (pa.ArrowException, TypeError) as e:
+            print(f"pyarrow提取IP失败，改用正则逐行提取: {str(e)}")
+    return text.str.findall(IP_PATTERN).explode().dropna().astype(str)
+
+
+def _leading_zeros(values):
+    """64位无符号整数的前导零个数（向量化二分）"""
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_zero = (values >> np.uint64(64 - shift)) == 0
+        zeros[top_zero] += shift
+        values[top_zero] <<= np.uint64(shift)
+    zeros[values == 0] += 1  # 全零时上面只累计到63
+    return zeros
+
+
+class HyperLogLog:
+    """HyperLogLog 去重计数：2^p 个寄存器，相对误差约 1.04/sqrt(2^p)（p=14 时约0.8%），合并取逐位最大值"""
+
+    def __init__(self, p=14, registers=None):
+        self.p = p
+        self.registers = registers if registers is not None else np.zeros(1 << p, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        if not len(hashes):
+            return
+        buckets = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        ranks = np.minimum(_leading_zeros(rest) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * np.log(m / empty)  # 小基数时使用线性计数
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {"p": self.p, "registers": _encode_array(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["p"], _decode_array(data["registers"], np.uint8))
+
+
+class CountMinSketch:
+    """Count-Min 频次估计：depth 行 × width 列计数器，估计值不小于真实值，
+    高估不超过 e/width × 总数（概率 1-e^-depth）；合并为计数器相加"""
+
+    def __init__(self, width=8192, depth=4, counts=None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else np.zeros((depth, width), dtype=np.int64)
+
+    def _indexes(self, hashes):
+        # 双重哈希：由一个64位哈希生成 depth 个位置
+        first = hashes & np.uint64(0xFFFFFFFF)
+        second = (hashes >> np.uint64(32)) | np.uint64(1)
+        return [((first + np.uint64(row) * second) % np.uint64(self.width)).astype(np.int64)
+                for row in range(self.depth)]
+
+    def update_hashes(self, hashes):
+        for row, indexes in enumerate(self._indexes(hashes)):
+            self.counts[row] += np.bincount(indexes, minlength=self.width)
+
+    def estimate_hashes(self, hashes):
+        return np.min([self.counts[row][indexes] for row, indexes in enumerate(self._indexes(hashes))], axis=0)
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def to_dict(self):
+        return {"width": self.width, "depth": self.depth, "counts": _encode_array(self.counts)}
+
+    @classmethod
+    def from_dict(cls, data):
+        counts = _decode_array(data["counts"], np.int64, (data["depth"], data["width"]))
+        return cls(data["width"], data["depth"], counts)
+
+
+class SpaceSaving:
+    """SpaceSaving 高频项（可合并版本）：最多保留 capacity 个值的计数上界和误差，
+    未保留的值出现次数不超过 floor；真实次数在 [计数-误差, 计数] 之间"""
+
+    def __init__(self, capacity=200, counts=None, errors=None, floor=0):
+        self.capacity = capacity
+        self.counts = counts or {}
+        self.errors = errors or {}
+        self.floor = floor
+
+    @classmethod
+    def from_value_counts(cls, value_counts, capacity=200):
+        """由一个分块的精确计数（按次数降序）生成概要"""
+        top = value_counts.head(capacity)
+        floor = int(value_counts.iloc[capacity]) if len(value_counts) > capacity else 0
+        counts = {str(value): int(count) for value, count in top.items()}
+        return cls(capacity, counts, dict.fromkeys(counts, 0), floor)
+
+    def merge(self, other):
+        merged = {}
+        for value in set(self.counts) | set(other.counts):
+            merged[value] = (self.counts.get(value, self.floor) + other.counts.get(value, other.floor),
+                             self.errors.get(value, self.floor) + other.errors.get(value, other.floor))
+        ranked = sorted(merged.items(), key=lambda item: (-item[1][0], item[0]))  # 次数相同时按值排序，结果稳定
+        dropped = ranked[self.capacity][1][0] if len(ranked) > self.capacity else 0
+        kept = ranked[:self.capacity]
+        self.counts = {value: count for value, (count, _) in kept}
+        self.errors = {value: error for value, (_, error) in kept}
+        self.floor = max(self.floor + other.floor, dropped)
+
+    def top_k(self, k=10):
+        """[(值, 计数上界, 误差)]，按计数降序"""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(value, count, self.errors.get(value, 0)) for value, count in ranked]
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "counts": self.counts, "errors": self.errors, "floor": self.floor}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["capacity"], data["counts"], data["errors"], data["floor"])
+
+
+class TDigest:
+    """t-digest 分位数估计：按k1尺度函数将排序后的值合并为质心，两端质心更小，尾部分位数更准确；
+    合并时把两组质心放在一起重新压缩"""
+
+    def __init__(self, compression=200, means=None, weights=None, min_value=np.inf, max_value=-np.inf):
+        self.compression = compression
+        self.means = means if means is not None else np.zeros(0)
+        self.weights = weights if weights is not None else np.zeros(0)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.min_value = min(self.min_value, float(values.min()))
+        self.max_value = max(self.max_value, float(values.max()))
+        self._compress(values, np.ones(len(values)))
+
+    def merge(self, other):
+        if not len(other.means):
+            return
+        self.min_value = min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+        self._compress(other.means, other.weights)
+
+    def _compress(self, means, weights):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # 每个质心占用的k值范围不超过1：按中点的k值取整分组
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        groups = np.floor(k - k[0]).astype(np.int64)
+        group_weights = np.bincount(groups, weights=weights)
+        group_sums = np.bincount(groups, weights=means * weights)
+        used = group_weights > 0
+        self.weights = group_weights[used]
+        self.means = group_sums[used] / self.weights
+
+    def count(self):
+        return int(self.weights.sum())
+
+    def quantile(self, q):
+        if not len(self.means):
+            return None
+        total = self.weights.sum()
+        positions = np.concatenate([[0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min_value], self.means, [self.max_value]])
+        return float(np.interp(q * total, positions, values))
+
+    def to_dict(self):
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+                "min": self.min_value, "max": self.max_value}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["compression"], np.array(data["means"], dtype=np.float64),
+                   np.array(data["weights"], dtype=np.float64), data["min"], data["max"])
+
+
+class ColumnSketch:
+    """单列的概要：去重数（HLL）、高频项（SpaceSaving）和任意值频次（Count-Min）、数值分位数（t-digest）"""
+
+    def __init__(self, dtype, rows=0, distinct=None, heavy=None, frequency=None, digest=None):
+        self.dtype = dtype
+        self.rows = rows  # 非空值数量
+        self.distinct = distinct or HyperLogLog()
+        self.heavy = heavy
+        self.frequency = frequency
+        self.digest = digest
+
+    @classmethod
+    def for_series(cls, series):
+        numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+        continuous = pd.api.types.is_float_dtype(series.dtype)
+        return cls(
+            str(series.dtype),
+            heavy=None if continuous else SpaceSaving(),
+            frequency=None if continuous else CountMinSketch(),
+            digest=TDigest() if numeric else None
+        )
+
+    def update(self, series):
+        series = series.dropna()
+        if series.empty:
+            return
+        self.rows += len(series)
+        try:
+            hashes = hash_values(series)
+        except TypeError:
+            # 嵌套JSON等不可哈希的值按字符串统计
+            series = series.astype(str)
+            hashes = hash_values(series)
+        self.distinct.update_hashes(hashes)
+        if self.frequency is not None:
+            self.frequency.update_hashes(hashes)
+        if self.heavy is not None:
+            self.heavy.merge(SpaceSaving.from_value_counts(series.astype(str).value_counts(), self.heavy.capacity))
+        if self.digest is not None:
+            self.digest.update(series.to_numpy(dtype=np.float64))
+
+    def distinct_count(self):
+        """去重数估计（不超过非空值数量）"""
+        return min(self.distinct.estimate(), self.rows)
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.distinct.merge(other.distinct)
+        for name in ("heavy", "frequency", "digest"):
+            if getattr(self, name) is not None and getattr(other, name) is not None:
+                getattr(self, name).merge(getattr(other, name))
+
+    def estimate_count(self, value):
+        """某个值出现次数的估计（不小于真实值）"""
+        if self.frequency is None:
+            raise ValueError("连续数值列不支持频次估计")
+        series = pd.Series([value])
+        try:
+            series = series.astype(self.dtype)
+        except (TypeError, ValueError):
+            return 0
+        estimate = int(self.frequency.estimate_hashes(hash_values(series))[0])
+        # 高频项中的计数同样是上界，取两者较小值
+        heavy_count = self.heavy.counts.get(str(value)) if self.heavy is not None else None
+        return min(estimate, heavy_count) if heavy_count is not None else estimate
+
+    def to_dict(self):
+        return {
+            "dtype": self.dtype,
+            "rows": self.rows,
+            "distinct": self.distinct.to_dict(),
+            "heavy": self.heavy.to_dict() if self.heavy is not None else None,
+            "frequency": self.frequency.to_dict() if self.frequency is not None else None,
+            "digest": self.digest.to_dict() if self.digest is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["dtype"], data["rows"], HyperLogLog.from_dict(data["distinct"]),
+            SpaceSaving.from_dict(data["heavy"]) if data["heavy"] else None,
+            CountMinSketch.from_dict(data["frequency"]) if data["frequency"] else None,
+            TDigest.from_dict(data["digest"]) if data["digest"] else None
+        )
+
+
+class FileSketches:
+    """一个文件各列的概要，按分块流式计算（每块的概要合并到整体），结果可与其他文件的概要合并"""
+
+    VERSION = 1
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, columns=None, rows=0):
+        self.columns = columns or {}  # 列名（日志消息列中的IP为 "列名[IP]"）-> ColumnSketch
+        self.rows = rows
+
+    @classmethod
+    def build(cls, df, message_columns=(), chunk_rows=100000):
+        sketches = cls()
+        for start in range(0, len(df), chunk_rows):
+            sketches.update(df.iloc[start:start + chunk_rows], message_columns)
+        return sketches
+
+    def update(self, chunk, message_columns=()):
+        """加入一个数据分块"""
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            self._column(str(col), chunk[col]).update(chunk[col])
+        for col in message_columns:
+            if col not in chunk.columns:
+                continue
+            ips = extract_ips(chunk[col].dropna().astype(str))
+            self._column(f"{col}[IP]", ips).update(ips)
+
+    def _column(self, name, series):
+        if name not in self.columns:
+            self.columns[name] = ColumnSketch.for_series(series)
+        return self.columns[name]
+
+    def merge(self, other):
+        self.rows += other.rows
+        for name, sketch in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(sketch)
+            else:
+                self.columns[name] = ColumnSketch.from_dict(sketch.to_dict())
+
+    def column(self, name):
+        sketch = self.columns.get(str(name))
+        if sketch is None:
+            raise KeyError(f"没有列 {name} 的概要，可用的列: {', '.join(self.columns)}")
+        return sketch
+
+    def distinct(self, column):
+        return self.column(column).distinct_count()
+
+    def top_k(self, column, k=10):
+        heavy = self.column(column).heavy
+        if heavy is None:
+            raise ValueError(f"列 {column} 为连续数值列，没有高频项概要")
+        return heavy.top_k(k)
+
+    def quantile(self, column, q):
+        digest = self.column(column).digest
+        if digest is None:
+            raise ValueError(f"列 {column} 不是数值列，没有分位数概要")
+        return digest.quantile(q)
+
+    def summary(self, top_k=10, unique_ratio=0.9):
+        """供提示词使用的近似统计：各列去重数、高频值（近乎唯一的列不列出）、数值列分位数"""
+        result = {}
+        for name, sketch in self.columns.items():
+            if not sketch.rows:
+                continue
+            distinct = sketch.distinct_count()
+            item = {"非空数": sketch.rows, "去重数≈": distinct}
+            if sketch.heavy is not None and distinct < unique_ratio * sketch.rows:
+                item["高频值≈"] = {value: count for value, count, _ in sketch.heavy.top_k(top_k)}
+            if sketch.digest is not None and len(sketch.digest.means):  # 全为inf/NaN时没有质心
+                item["分位数≈"] = {f"P{int(q * 100)}": round(sketch.digest.quantile(q), 4) for q in self.QUANTILES}
+            result[name] = item
+        return result
+
+    def to_dict(self):
+        return {"version": self.VERSION, "rows": self.rows,
+                "columns": {name: sketch.to_dict() for name, sketch in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != cls.VERSION:
+            return None
+        return cls({name: ColumnSketch.from_dict(item) for name, item in data["columns"].items()}, data["rows"])
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取保存的概要，不存在或版本不符时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取概要缓存失败: {str(e)}")
+            return None
+
+
+# 执行进程是常驻的，最近使用的概要保留在内存中
+_open_sketches = OrderedDict()
+_open_lock = threading.Lock()
+MAX_OPEN_SKETCHES = 16
+
+
+def open_sketches(path, df, message_columns=()):
+    """取得文件的概要：内存 -> 磁盘 -> 对df（文件读取后的原始数据）计算并保存。
+    path为None时（如按时间范围筛选后的数据）只计算不保存；行数与df不一致时重新计算"""
+    if path is None:
+        return FileSketches.build(df, message_columns)
+    with _open_lock:
+        sketches = _open_sketches.get(path)
+        if sketches is not None:
+            _open_sketches.move_to_end(path)
+    if sketches is None:
+        sketches = FileSketches.load(path)
+    if sketches is None or sketches.rows != len(df):
+        sketches = FileSketches.build(df, message_columns)
+        try:
+            sketches.save(path)
+        except Exception as e:
+            print(f"保存概要缓存失败: {str(e)}")
+    with _open_lock:
+        _open_sketches[path] = sketches
+        while len(_open_sketches) > MAX_OPEN_SKETCHES:
+            _open_sketches.popitem(last=False)
+    return sketches
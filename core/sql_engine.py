@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+from core.cancellation import CancelToken
+
+try:
+    import duckdb
+except ImportError:  # 未安装duckdb时SQL模式不可用
+    duckdb = None
+
+
+class SqlEngine:
+    """嵌入式列式SQL引擎（DuckDB）：CSV/JSON/Parquet 文件直接作为视图扫描（多线程并行扫描、谓词下推），
+    其他格式由文件处理器读取后注册为表；超出内存上限时溢写到临时目录"""
+
+    # 可由DuckDB直接扫描的格式，其余格式（Excel、TXT/LOG、非UTF-8编码文件）先用文件处理器读取
+    NATIVE_READERS = {
+        '.csv': "read_csv_auto('{path}')",
+        '.json': "read_json_auto('{path}')",
+        '.parquet': "read_parquet('{path}')"
+    }
+    ENCODING_CHECK_BYTES = 1024 * 1024
+
+    def __init__(self, threads=0, temp_dir=None):
+        if duckdb is None:
+            raise ValueError("SQL查询模式需要安装duckdb（pip install duckdb）")
+        self.con = duckdb.connect(database=":memory:")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if temp_dir:
+            self.con.execute(f"SET temp_directory = '{self._quote_literal(temp_dir)}'")
+        self.tables = {}  # 格式: {文件名: 表名}
+
+    @staticmethod
+    def is_available():
+        return duckdb is not None
+
+    @staticmethod
+    def _quote_literal(value):
+        return str(value).replace("'", "''")
+
+    @staticmethod
+    def _quote_identifier(name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def _table_name(self, file_name):
+        """由文件名生成表名（去掉扩展名，非字母数字字符替换为下划线，重名时追加序号）"""
+        base = re.sub(r'\W+', '_', os.path.splitext(file_name)[0]).strip('_') or "data"
+        if base[0].isdigit():
+            base = f"t_{base}"
+        name, counter = base, 1
+        while name in self.tables.values():
+            counter += 1
+            name = f"{base}_{counter}"
+        return name
+
+    def _is_utf8(self, file_path):
+        """DuckDB只能直接读取UTF-8文本，检查文件开头是否为UTF-8编码"""
+        with open(file_path, 'rb') as f:
+            head = f.read(self.ENCODING_CHECK_BYTES)
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # 读取边界截断了多字节字符时不算编码错误
+            return e.start >= len(head) - 3
+        return True
+
+    def register_file(self, file_name, file_path, loader=None):
+        """注册一个文件为表，返回表名。
+        Args:
+            file_name: 文件名
+            file_path: 文件完整路径
+            loader: 无法直接扫描时读取DataFrame的回调 loader(文件名)
+        """
+        table = self._table_name(file_name)
+        identifier = self._quote_identifier(table)
+        ext = os.path.splitext(file_path)[1].lower()
+
+        reader = self.NATIVE_READERS.get(ext)
+        if reader and (ext == '.parquet' or self._is_utf8(file_path)):
+            try:
+                source = reader.format(path=self._quote_literal(os.path.abspath(file_path)))
+                self.con.execute(f"CREATE VIEW {identifier} AS SELECT * FROM {source}")
+                self.con.execute(f"DESCRIBE {identifier}")  # 提前触发格式推断，失败时改用文件处理器
+                self.tables[file_name] = table
+                return table
+            except duckdb.Error as e:
+                print(f"直接扫描文件 {file_name} 失败，改用文件处理器读取: {str(e)}")
+                self.con.execute(f"DROP VIEW IF EXISTS {identifier}")
+
+        if loader is None:
+            raise ValueError(f"SQL模式不支持该文件格式: {ext}")
+        self.con.register(table, loader(file_name))
+        self.tables[file_name] = table
+        return table
+
+    def describe(self, table, sample_rows=2):
+        """表结构（列名和类型）和样本行，用于生成SQL的提示词"""
+        identifier = self._quote_identifier(table)
+        columns = [[row[0], row[1]] for row in self.con.execute(f"DESCRIBE {identifier}").fetchall()]
+        sample = self.con.execute(f"SELECT * FROM {identifier} LIMIT {int(sample_rows)}").df()
+        return {"columns": columns, "sample": sample.astype(str).to_dict(orient='records')}
+
+    def query(self, sql, cancel_token=None):
+        """执行查询并返回DataFrame；cancel_token 取消或超时时中断查询，内存上限作为DuckDB的内存限制"""
+        if cancel_token is None:
+            return self.con.execute(sql).df()
+
+        if cancel_token.memory_limit:
+            self.con.execute(f"SET memory_limit = '{cancel_token.memory_limit // (1024 * 1024)}MB'")
+
+        result = {}
+
+        def run():
+            try:
+                result["df"] = self.con.execute(sql).df()
+            except Exception as e:
+                result["error"] = e
+
+        # DuckDB执行时释放GIL，在后台线程执行，当前线程负责检查取消
+        worker = threading.Thread(target=run, name="sql-query", daemon=True)
+        worker.start()
+        while worker.is_alive():
+            worker.join(CancelToken.POLL_INTERVAL)
+            if worker.is_alive() and cancel_token.cancelled:
+                self.con.interrupt()
+                worker.join()
+                cancel_token.check()
+
+        if "error" in result:
+            raise result["error"]
+        return result["df"]
+
+    def close(self):
+        self.con.close()
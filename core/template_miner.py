@@ -0,0 +1,160 @@
+import re
+import numpy as np
+import pandas as pd
+
+
+class LogCluster:
+    """日志模板簇"""
+    __slots__ = ('cluster_id', 'template_tokens', 'size')
+
+    def __init__(self, cluster_id, template_tokens):
+        self.cluster_id = cluster_id
+        self.template_tokens = template_tokens
+        self.size = 1
+
+    @property
+    def template(self):
+        return " ".join(self.template_tokens)
+
+
+class TemplateMiner:
+    """Drain风格的流式日志模板挖掘：按 (长度, 前几个词) 构建前缀树，
+    在叶子节点中按相似度匹配模板簇，不同位置的词合并为通配符 <*>"""
+
+    WILDCARD = "<*>"
+    # 先屏蔽明显的变量（IP、时间、哈希、数字等），提高模板合并效果；屏蔽规则不匹配空白，不改变分词数量
+    MASKS = [
+        (re.compile(r'\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}:\d{2}(?:\.\d+)?)?'), '<TIME>'),
+        (re.compile(r'\b\d{1,2}:\d{2}:\d{2}(?:\.\d+)?\b'), '<TIME>'),
+        (re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b'), '<IP>'),
+        (re.compile(r'\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b'), '<UUID>'),
+        (re.compile(r'\b(?:0x)?[0-9a-fA-F]{16,}\b'), '<HEX>'),
+        (re.compile(r'(?<![\w.])[-+]?\d+(?:\.\d+)?(?![\w.])'), '<NUM>'),
+    ]
+    VARIABLE_PATTERN = re.compile(r'<(?:\*|[A-Z]+)>')
+    _LEAF = None  # 前缀树节点中存放模板簇列表的键
+
+    def __init__(self, depth=4, similarity_threshold=0.4, max_children=100):
+        self.depth = max(depth, 3)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.root = {}
+        self.clusters = []
+
+    def _mask(self, message):
+        for pattern, token in self.MASKS:
+            message = pattern.sub(token, message)
+        return message
+
+    def _tokenize(self, message):
+        return self._mask(message).split()
+
+    def _is_variable(self, token):
+        return self.VARIABLE_PATTERN.search(token) is not None
+
+    def _similarity(self, template_tokens, tokens):
+        """相同位置词相同的比例（通配符不计入），以及模板中的通配符数量"""
+        same = 0
+        wildcards = 0
+        for template_token, token in zip(template_tokens, tokens):
+            if template_token == self.WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                same += 1
+        return same / max(len(tokens), 1), wildcards
+
+    def _search(self, tokens):
+        node = self.root.get(len(tokens))
+        if node is None:
+            return None
+
+        for token in tokens[:self.depth - 2]:
+            if token in node:
+                node = node[token]
+            elif self.WILDCARD in node:
+                node = node[self.WILDCARD]
+            else:
+                return None
+
+        best, best_key = None, None
+        for cluster in node.get(self._LEAF, []):
+            similarity, wildcards = self._similarity(cluster.template_tokens, tokens)
+            key = (similarity, wildcards)
+            if similarity >= self.similarity_threshold and (best_key is None or key > best_key):
+                best, best_key = cluster, key
+        return best
+
+    def _add_to_tree(self, cluster):
+        node = self.root.setdefault(len(cluster.template_tokens), {})
+        for token in cluster.template_tokens[:self.depth - 2]:
+            # 含数字或变量的词作为通配分支，避免前缀树膨胀
+            if self._is_variable(token) or any(ch.isdigit() for ch in token):
+                token = self.WILDCARD
+            if token not in node and len(node) >= self.max_children:
+                token = self.WILDCARD
+            node = node.setdefault(token, {})
+        node.setdefault(self._LEAF, []).append(cluster)
+
+    def add_message(self, message):
+        """处理一条日志，返回所属模板簇"""
+        tokens = self._tokenize(str(message))
+        cluster = self._search(tokens)
+        if cluster is None:
+            cluster = LogCluster(len(self.clusters) + 1, tokens)
+            self.clusters.append(cluster)
+            self._add_to_tree(cluster)
+            return cluster
+
+        cluster.template_tokens = [
+            template_token if template_token == token else self.WILDCARD
+            for template_token, token in zip(cluster.template_tokens, tokens)
+        ]
+        cluster.size += 1
+        return cluster
+
+    def get_parameters(self, cluster, message):
+        """提取日志中对应模板变量位置的原始值"""
+        raw_tokens = str(message).split()
+        if len(raw_tokens) != len(cluster.template_tokens):
+            return []
+        return [
+            raw for raw, template_token in zip(raw_tokens, cluster.template_tokens)
+            if template_token == self.WILDCARD or self._is_variable(template_token)
+        ]
+
+
+def mine_templates(series, max_params=10, miner=None):
+    """对日志文本列做模板挖掘，返回与原列行对齐的DataFrame：
+    template_id、template 以及 param_1...param_n（模板中变量位置的原始值）"""
+    miner = miner or TemplateMiner()
+    # 相同文本只处理一次，按首次出现顺序流式送入
+    codes, uniques = pd.factorize(series.astype(str))
+    clusters = [miner.add_message(message) for message in uniques]
+
+    unique_ids = np.array([cluster.cluster_id for cluster in clusters], dtype=np.int64)
+    templates = {cluster.cluster_id: cluster.template for cluster in miner.clusters}
+    unique_params = [miner.get_parameters(cluster, message)[:max_params]
+                     for cluster, message in zip(clusters, uniques)]
+    param_count = max((len(params) for params in unique_params), default=0)
+
+    result = pd.DataFrame({"template_id": unique_ids[codes]}, index=series.index)
+    result["template"] = result["template_id"].map(templates)
+    if param_count:
+        param_table = np.array([params + [None] * (param_count - len(params)) for params in unique_params],
+                               dtype=object)[codes]
+        for i in range(param_count):
+            result[f"param_{i + 1}"] = param_table[:, i]
+    return result
+
+
+def template_histogram(series, top_n=20):
+    """模板直方图：用少量模板及其出现次数概括整列日志，用于替代提示词中的原始样本"""
+    mined = mine_templates(series, max_params=0)
+    counts = mined.groupby(["template_id", "template"]).size().sort_values(ascending=False)
+    return {
+        "模板总数": int(len(counts)),
+        "高频模板": [
+            {"模板ID": int(template_id), "模板": template, "次数": int(count)}
+            for (template_id, template), count in counts.head(top_n).items()
+        ]
+    }
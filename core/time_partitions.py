@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+from utils.helpers import get_file_fingerprint
+from core.time_window import find_time_column, extract_times, filter_time_range
+
+try:
+    import pyarrow  # noqa: F401  pandas读写Parquet需要
+except ImportError:  # 没有pyarrow时只记录时间范围（仍可跳过整个文件），不保存分区
+    pyarrow = None
+
+# 分区粒度 -> (时间取整单位, 分区文件名格式)
+GRANULARITIES = {
+    "day": ("D", "%Y%m%d"),
+    "hour": ("h", "%Y%m%d%H")
+}
+TIME_COLUMN = "__time__"  # 分区文件中保存的已解析时间，读取时无需重新解析
+
+
+class TimePartitionStore:
+    """按时间分区的数据缓存：文件首次按时间范围读取时，按时间列将数据切分为按天（或小时）的分区保存为Parquet，
+    清单中记录文件及各分区的最早、最晚时间。之后再按时间范围读取时只读取与范围重叠的分区，
+    文件整体不在范围内时不读取任何数据（文件是否变化由文件指纹判断，只需stat）"""
+
+    MANIFEST_VERSION = 2
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._manifests = {}  # 分区目录 -> 清单
+
+    def _partition_dir(self, full_path, granularity):
+        path_key = hashlib.sha1(os.path.abspath(full_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{path_key}-{get_file_fingerprint(full_path)}-{granularity}")
+
+    def _remove_stale(self, partition_dir):
+        """删除同一文件旧版本（指纹不同）的分区，当前版本其他粒度的分区保留"""
+        path_key, fingerprint, _ = os.path.basename(partition_dir).split("-")
+        for other in os.listdir(self.cache_dir):
+            parts = other.split("-")
+            if len(parts) == 3 and parts[0] == path_key and parts[1] != fingerprint:
+                self._manifests.pop(os.path.join(self.cache_dir, other), None)
+                shutil.rmtree(os.path.join(self.cache_dir, other), ignore_errors=True)
+
+    def _load_manifest(self, partition_dir):
+        manifest = self._manifests.get(partition_dir)
+        if manifest is not None:
+            return manifest
+        try:
+            with open(os.path.join(partition_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取时间分区清单失败: {str(e)}")
+            return None
+        if manifest.get("version") != self.MANIFEST_VERSION:
+            return None
+        self._manifests[partition_dir] = manifest
+        return manifest
+
+    def manifest(self, full_path, granularity):
+        """文件的分区清单（时间列、最早/最晚时间、各分区范围），尚未建立时返回None"""
+        return self._load_manifest(self._partition_dir(full_path, granularity))
+
+    def _write_partitions(self, partition_dir, df, times, granularity):
+        """将有时间的行按粒度切分保存，返回分区列表；无法写入Parquet时返回None"""
+        if pyarrow is None:
+            return None
+        freq, name_format = GRANULARITIES[granularity]
+        valid = times.notna().to_numpy()
+        data = df[valid].reset_index(drop=True)
+        data.columns = [str(col) for col in data.columns]
+        data[TIME_COLUMN] = times[valid].to_numpy()
+        keys = data[TIME_COLUMN].dt.floor(freq)
+
+        partitions = []
+        try:
+            # 分组保持组内原有行顺序
+            for key, part in data.groupby(keys, sort=True):
+                file_name = f"{pd.Timestamp(key).strftime(name_format)}.parquet"
+                part.to_parquet(os.path.join(partition_dir, file_name), index=False)
+                partitions.append({
+                    "file": file_name,
+                    "rows": len(part),
+                    "min": str(part[TIME_COLUMN].min()),
+                    "max": str(part[TIME_COLUMN].max())
+                })
+        except Exception as e:
+            # 混合类型等无法写入Parquet的数据只记录时间范围
+            print(f"保存时间分区失败: {str(e)}")
+            for item in partitions:
+                os.remove(os.path.join(partition_dir, item["file"]))
+            return None
+        return partitions
+
+    def build(self, full_path, df, granularity):
+        """为文件建立分区和清单，返回 (清单, 各行时间)；没有时间列时各行时间为None"""
+        partition_dir = self._partition_dir(full_path, granularity)
+        os.makedirs(partition_dir, exist_ok=True)
+        column, method = find_time_column(df)
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "granularity": granularity,
+            "time_column": None if column is None else str(column),
+            "method": method,
+            "rows": len(df),
+            "untimed_rows": 0,  # 无法识别时间的行数（按时间范围读取时排除）
+            "dtypes": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+            "min": None,
+            "max": None,
+            "partitions": None
+        }
+        times = None
+        if column is not None:
+            times = extract_times(df, column, method)
+            manifest["untimed_rows"] = int(times.isna().sum())
+            valid = times.dropna()
+            if not valid.empty:
+                manifest["min"], manifest["max"] = str(valid.min()), str(valid.max())
+            manifest["partitions"] = self._write_partitions(partition_dir, df, times, granularity)
+
+        tmp_path = os.path.join(partition_dir, f"manifest.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(partition_dir, "manifest.json"))
+        self._manifests[partition_dir] = manifest
+        self._remove_stale(partition_dir)
+        return manifest, times
+
+    @staticmethod
+    def _overlaps(item, start, end):
+        """清单或分区的时间范围是否与 [start, end) 重叠"""
+        if item["min"] is None:
+            return False
+        if start is not None and pd.Timestamp(item["max"]) < pd.Timestamp(start):
+            return False
+        if end is not None and pd.Timestamp(item["min"]) >= pd.Timestamp(end):
+            return False
+        return True
+
+    @staticmethod
+    def _empty_frame(manifest):
+        """与原文件列和类型相同的空表"""
+        columns = {}
+        for col, dtype in manifest["dtypes"].items():
+            try:
+                columns[col] = pd.Series(dtype=dtype)
+            except TypeError:
+                columns[col] = pd.Series(dtype=object)
+        return pd.DataFrame(columns)
+
+    def load(self, full_path, granularity, read, start=None, end=None):
+        """按时间范围读取文件
+        Args:
+            full_path: 文件路径
+            granularity: 分区粒度 "day" 或 "hour"
+            read: 读取整个文件的函数（首次建立分区或无法使用分区时调用）
+            start, end: 时间范围 [start, end)，为None表示不限
+        Returns:
+            (时间在范围内的行（没有时间列的文件返回全部行）, 读取的分区数, 分区总数, 因无法识别时间而排除的行数)
+        """
+        partition_dir = self._partition_dir(full_path, granularity)
+        manifest = self._load_manifest(partition_dir)
+        if manifest is None:
+            df = read()
+            manifest, times = self.build(full_path, df, granularity)
+            total = len(manifest["partitions"] or [])
+            if times is None:
+                return df, total, total, 0
+            df, _, untimed = filter_time_range(df, start, end, times)
+            return df, total, total, untimed
+
+        partitions = manifest["partitions"]
+        total = len(partitions or [])
+        if manifest["time_column"] is None:
+            return read(), 0, 0, 0
+        untimed = manifest["untimed_rows"]
+        if not self._overlaps(manifest, start, end):
+            return self._empty_frame(manifest), 0, total, untimed
+        if partitions is None:
+            df = read()
+            times = extract_times(df, manifest["time_column"], manifest["method"])
+            df, _, untimed = filter_time_range(df, start, end, times)
+            return df, 0, 0, untimed
+
+        selected = [item for item in partitions if self._overlaps(item, start, end)]
+        if not selected:
+            return self._empty_frame(manifest), 0, total, untimed
+        try:
+            frames = [pd.read_parquet(os.path.join(partition_dir, item["file"])) for item in selected]
+        except Exception as e:
+            # 分区文件被删除或损坏：重新建立
+            print(f"读取时间分区失败，重新建立: {str(e)}")
+            self._manifests.pop(partition_dir, None)
+            shutil.rmtree(partition_dir, ignore_errors=True)
+            return self.load(full_path, granularity, read, start, end)
+        data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        times = data.pop(TIME_COLUMN)
+        return filter_time_range(data, start, end, times)[0], len(selected), total, untimed
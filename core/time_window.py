@@ -0,0 +1,206 @@
+import re
+import warnings
+from datetime import datetime, timedelta, time
+import pandas as pd
+
+# 日志行中常见的时间格式：2024-01-01 12:00:00、2024-01-01T12:00:00(.123)、2024/01/01 12:00:00
+EMBEDDED_TIME = re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}[ T]\d{2}:\d{2}:\d{2}')
+SAMPLE_ROWS = 200
+MIN_PARSED_RATIO = 0.8  # 样本中能解析出时间的比例达到该值才认为是时间列
+
+
+def _to_datetime(values):
+    # 按首个值推断格式后整列向量化解析，无法解析的值为NaT
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pd.to_datetime(values, errors='coerce')
+
+
+def _drop_timezone(times):
+    if getattr(times.dt, "tz", None) is not None:
+        return times.dt.tz_convert(None)
+    return times
+
+
+def find_time_column(df):
+    """找出DataFrame中的时间列，返回 (列名, 方式)；方式为 "value"（整列为时间）或 "embedded"（文本中包含时间），
+    找不到时返回 (None, None)"""
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            return col, "value"
+
+    text_columns = [col for col in df.columns if pd.api.types.is_string_dtype(df[col].dtype)]
+    for col in text_columns:
+        sample = df[col].dropna().head(SAMPLE_ROWS).astype(str)
+        if sample.empty:
+            continue
+        # 纯数字列（计数、端口等）不作为时间列
+        if sample.str.fullmatch(r'\d+(\.\d+)?').mean() > 0.5:
+            continue
+        if _to_datetime(sample).notna().mean() >= MIN_PARSED_RATIO:
+            return col, "value"
+    for col in text_columns:
+        sample = df[col].dropna().head(SAMPLE_ROWS).astype(str)
+        if not sample.empty and sample.str.contains(EMBEDDED_TIME).mean() >= MIN_PARSED_RATIO:
+            return col, "embedded"
+    return None, None
+
+
+def extract_times(df, column=None, method=None):
+    """返回每行的时间（Series，无法解析为NaT）；未指定列时自动查找，找不到时间列返回None"""
+    if column is None:
+        column, method = find_time_column(df)
+        if column is None:
+            return None
+    values = df[column]
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return _drop_timezone(values)
+    if method == "embedded":
+        values = values.astype(str).str.extract(f'({EMBEDDED_TIME.pattern})', expand=False).str.replace('/', '-')
+    return _drop_timezone(_to_datetime(values))
+
+
+def filter_time_range(df, start=None, end=None, times=None):
+    """保留时间在 [start, end) 内的行；没有时间列时原样返回。
+    返回 (DataFrame, 是否找到时间列, 因无法识别时间而排除的行数)"""
+    if times is None:
+        times = extract_times(df)
+    if times is None:
+        return df, False, 0
+    valid = times.notna()
+    mask = valid.copy()
+    if start is not None:
+        mask &= times >= pd.Timestamp(start)
+    if end is not None:
+        mask &= times < pd.Timestamp(end)
+    return df[mask.to_numpy()].reset_index(drop=True), True, int((~valid).sum())
+
+
+# ---- 从分析请求中识别时间范围 ----
+_DATETIME = r'\d{4}[-/]\d{1,2}[-/]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?'
+_CLOCK = r'\d{1,2}:\d{2}(?::\d{2})?'
+_RANGE_SEPARATOR = r'(?:\s*(?:到|至|~|～|—)\s*|\s+(?:-|and|to|until)\s+)'
+ABSOLUTE_RANGE = re.compile(rf'({_DATETIME}){_RANGE_SEPARATOR}({_DATETIME}|{_CLOCK})')
+CLOCK_RANGE = re.compile(rf'(?<![\d:])({_CLOCK}){_RANGE_SEPARATOR}({_CLOCK})(?![\d:])')
+SINGLE_DATE = re.compile(r'(?<!\d)\d{4}[-/]\d{1,2}[-/]\d{1,2}(?!\d)')
+# 某个时间之后/之前（不限另一端）
+SINCE = re.compile(rf'(?<!\d)({_DATETIME})\s*(?:之后|以后|以来|起|开始)|(?i:\b(?:since|after|from)\s+)({_DATETIME})')
+BEFORE = re.compile(rf'(?<!\d)({_DATETIME})\s*(?:之前|以前)|(?i:\b(?:before|until|prior\s+to)\s+)({_DATETIME})')
+# “近”前面是附、接、将等字时是“附近”“接近”“将近”等词，不表示时间范围
+RELATIVE_CN = re.compile(r'(?:最近|过去|(?<![附接将靠临邻亲贴逼就远])近)\s*([0-9零一二两三四五六七八九十]*)\s*个?\s*(分钟|小时|天|日|周|星期)')
+RELATIVE_EN = re.compile(r'(?i)\b(?:last|past|previous)\s+(\d*)\s*(minute|hour|day|week)s?\b')
+_CN_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_UNIT_DELTAS = {
+    '分钟': timedelta(minutes=1), 'minute': timedelta(minutes=1),
+    '小时': timedelta(hours=1), 'hour': timedelta(hours=1),
+    '天': timedelta(days=1), '日': timedelta(days=1), 'day': timedelta(days=1),
+    '周': timedelta(weeks=1), '星期': timedelta(weeks=1), 'week': timedelta(weeks=1)
+}
+
+
+def _parse_count(text):
+    """解析数量（阿拉伯数字或不超过九十九的中文数字），为空时表示1"""
+    if not text:
+        return 1
+    if text.isdigit():
+        return int(text)
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return (_CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    return _CN_DIGITS.get(text, 1)
+
+
+def _parse_datetime(text):
+    return pd.Timestamp(text.replace('/', '-')).to_pydatetime()
+
+
+def _parse_clock(clock):
+    parts = [int(part) for part in clock.split(':')]
+    return time(parts[0], parts[1], parts[2] if len(parts) > 2 else 0)
+
+
+def _clock_on(day, clock):
+    return datetime.combine(day, clock if isinstance(clock, time) else _parse_clock(clock))
+
+
+def is_clock_range(time_range):
+    """是否为没有日期的时段（如 02:00到03:00），需按数据的日期确定具体时间"""
+    return bool(time_range) and isinstance(time_range[0], time) and not isinstance(time_range[0], datetime)
+
+
+def anchor_clock_range(time_range, latest=None):
+    """将没有日期的时段对应到 latest（数据中最晚的时间）之前最近一次出现的该时段；
+    latest为None（数据中没有时间）时以当前时间为准"""
+    start_clock, end_clock = time_range
+    latest = latest or datetime.now()
+    start, end = _clock_on(latest.date(), start_clock), _clock_on(latest.date(), end_clock)
+    if end <= start:
+        end += timedelta(days=1)  # 跨午夜
+    if start > latest:
+        start, end = start - timedelta(days=1), end - timedelta(days=1)
+    return start, end
+
+
+def parse_time_range(request, now=None):
+    """从请求文本中识别时间范围，返回 (开始, 结束)（一端可能为None表示不限），识别不到时返回None。
+    支持：2024-01-01 02:00 到 2024-01-01 03:00、2024-01-01 02:00到03:00、2024-01-01之后/之前、
+    最近24小时/过去7天/last 2 hours、今天/昨天、单个日期（整天）；
+    没有日期的 02:00到03:00 返回 (time, time)，由 anchor_clock_range 按数据的日期确定"""
+    now = now or datetime.now()
+    try:
+        match = ABSOLUTE_RANGE.search(request)
+        if match:
+            start = _parse_datetime(match.group(1))
+            end_text = match.group(2)
+            if re.fullmatch(_CLOCK, end_text):
+                end = _clock_on(start.date(), end_text)
+            else:
+                end = _parse_datetime(end_text)
+                if not re.search(_CLOCK, end_text):
+                    end += timedelta(days=1)  # 结束只有日期时包含当天
+            return start, end
+
+        match = CLOCK_RANGE.search(request)
+        if match:
+            dates = SINGLE_DATE.findall(request)
+            if len(dates) != 1:
+                return _parse_clock(match.group(1)), _parse_clock(match.group(2))
+            day = _parse_datetime(dates[0]).date()
+            start, end = _clock_on(day, match.group(1)), _clock_on(day, match.group(2))
+            if end <= start:
+                end += timedelta(days=1)  # 跨午夜
+            return start, end
+
+        match = SINCE.search(request)
+        if match:
+            return _parse_datetime(match.group(1) or match.group(2)), None
+        match = BEFORE.search(request)
+        if match:
+            return None, _parse_datetime(match.group(1) or match.group(2))
+
+        match = RELATIVE_CN.search(request) or RELATIVE_EN.search(request)
+        if match:
+            return now - _parse_count(match.group(1)) * _UNIT_DELTAS[match.group(2).lower()], None
+
+        today = datetime.combine(now.date(), datetime.min.time())
+        if re.search(r'今天|今日|(?i:\btoday\b)', request):
+            return today, None
+        if re.search(r'昨天|昨日|(?i:\byesterday\b)', request):
+            return today - timedelta(days=1), today
+
+        dates = SINGLE_DATE.findall(request)
+        if len(dates) == 1:
+            start = _parse_datetime(dates[0])
+            return start, start + timedelta(days=1)
+    except (ValueError, OverflowError):
+        pass  # 日期不合法（如2024-13-01）时视为未指定
+    return None
+
+
+def format_time_range(time_range):
+    start, end = time_range
+    if is_clock_range(time_range):
+        return f"每天 {start:%H:%M:%S} ~ {end:%H:%M:%S}（取数据中最后一次出现的该时段）"
+    start_text = f"{start:%Y-%m-%d %H:%M:%S}" if start else "不限"
+    end_text = f"{end:%Y-%m-%d %H:%M:%S}" if end else "不限"
+    return f"{start_text} ~ {end_text}"
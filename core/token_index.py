@@ -0,0 +1,214 @@
+import os
+import re
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils.helpers import get_file_fingerprint
+
+# IP、哈希（MD5/SHA1/SHA256）、主机名/域名；前后不能紧接其他词字符，避免截取到更长标识的一部分
+ENTITY_PATTERN = re.compile(
+    r'(?<![\w.:-])(?:'
+    r'(?:\d{1,3}\.){3}\d{1,3}'
+    r'|[0-9a-fA-F]{64}|[0-9a-fA-F]{40}|[0-9a-fA-F]{32}'
+    r'|(?:[A-Za-z0-9][A-Za-z0-9-]{0,62}\.)+[A-Za-z][A-Za-z0-9-]{1,62}'
+    r')(?!\.?[\w-])'
+)
+# 用户名：user=xxx、username: xxx、user xxx，以及sshd的 "for (invalid user) xxx from"（合并为一个正则，只扫描一遍）
+_USER_NAME = r'[A-Za-z_][\w.@\\$-]*'
+USER_PATTERN = re.compile(
+    r'\b(?:(?:[Uu]ser(?:name)?|[Aa]ccount|[Ll]ogin)\s*[=:]\s*"?|[Uu]ser\s+'
+    r'|for (?:invalid user |illegal user )?(?=' + _USER_NAME + r' from\b))(' + _USER_NAME + ')'
+)
+# 列名表示IP、用户、主机、哈希等实体时，整个单元格的值也作为令牌
+ENTITY_COLUMN = re.compile(r'(?i)(ip|addr|host|user|account|domain|hash|md5|sha|src|dst|source|dest)')
+MAX_TOKEN_LENGTH = 255
+
+
+def normalize_token(token):
+    return str(token).strip().lower()
+
+
+def is_entity_token(token):
+    """令牌是否为IP、哈希或主机名（这类值出现在任何文本列中都会被索引）"""
+    return ENTITY_PATTERN.fullmatch(token) is not None
+
+
+def _text_columns(df):
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_string_dtype(series.dtype) or pd.api.types.is_object_dtype(series.dtype):
+            yield col, series.reset_index(drop=True).dropna().astype(str)
+
+
+def extract_tokens(df):
+    """提取每行的实体令牌，返回以行号为索引的令牌Series（已转小写，可能有重复）"""
+    parts = []
+    for col, text in _text_columns(df):
+        if text.empty:
+            continue
+        parts.append(text.str.findall(ENTITY_PATTERN).explode())
+        parts.append(text.str.findall(USER_PATTERN).explode())
+        if ENTITY_COLUMN.search(str(col)):
+            whole = text.str.strip()
+            parts.append(whole[(whole.str.len() <= MAX_TOKEN_LENGTH) & ~whole.str.contains('\n', regex=False)])
+    if not parts:
+        return pd.Series([], dtype=object)
+    tokens = pd.concat(parts).dropna()
+    tokens = tokens[tokens.astype(str).str.len() > 0]
+    return tokens.astype(str).str.lower()
+
+
+class TokenIndex:
+    """倒排索引：令牌（IP、用户名、主机名、哈希）-> 所在行号（行位置，从0开始）。
+    令牌按字典序排列，查询时二分查找；各令牌的行号连续存放在一个数组中（CSR结构）"""
+
+    VERSION = 1
+
+    def __init__(self, tokens, starts, rows, row_count):
+        self.tokens = tokens  # 有序的令牌列表
+        self.starts = starts  # 第i个令牌的行号为 rows[starts[i]:starts[i+1]]
+        self.rows = rows
+        self.row_count = row_count
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @classmethod
+    def build(cls, df):
+        """对DataFrame建立索引（向量化提取令牌，数值排序去重）"""
+        tokens = extract_tokens(df)
+        row_dtype = np.int32 if len(df) < 2 ** 31 else np.int64
+        if tokens.empty:
+            return cls([], np.zeros(1, dtype=np.int64), np.zeros(0, dtype=row_dtype), len(df))
+
+        codes, uniques = pd.factorize(tokens.to_numpy())
+        # 令牌编号改为按字典序的名次，之后只需对整数排序
+        order = np.argsort(uniques)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        codes = rank[codes]
+        rows = tokens.index.to_numpy(dtype=np.int64)
+
+        sort = np.lexsort((rows, codes))
+        codes, rows = codes[sort], rows[sort]
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+        codes, rows = codes[keep], rows[keep]
+
+        starts = np.searchsorted(codes, np.arange(len(order) + 1)).astype(np.int64)
+        return cls(uniques[order].tolist(), starts, rows.astype(row_dtype), len(df))
+
+    def rows_for(self, token):
+        """令牌所在的行号（有序数组），未索引的令牌返回None"""
+        position = bisect.bisect_left(self.tokens, token)
+        if position == len(self.tokens) or self.tokens[position] != token:
+            return None
+        return self.rows[self.starts[position]:self.starts[position + 1]]
+
+    def save(self, base_path):
+        """保存为 base_path.npz（令牌以换行分隔后存为字节数组，不需要pickle）"""
+        text = "\n".join(self.tokens).encode('utf-8')
+        tmp_path = f"{base_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, version=np.array([self.VERSION]), row_count=np.array([self.row_count]),
+                 tokens=np.frombuffer(text, dtype=np.uint8), starts=self.starts, rows=self.rows)
+        os.replace(tmp_path, f"{base_path}.npz")
+
+    @classmethod
+    def load(cls, base_path):
+        """读取索引，不存在或版本不符时返回None"""
+        try:
+            with np.load(f"{base_path}.npz") as data:
+                if int(data["version"][0]) != cls.VERSION:
+                    return None
+                text = data["tokens"].tobytes().decode('utf-8')
+                tokens = text.split("\n") if text else []
+                return cls(tokens, data["starts"], data["rows"], int(data["row_count"][0]))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取令牌索引失败: {str(e)}")
+            return None
+
+
+def index_base_path(cache_dir, file_path):
+    """文件的索引路径（不含扩展名）：路径哈希-文件指纹，文件内容变化后对应新的索引"""
+    path_key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{path_key}-{get_file_fingerprint(file_path)}.tokens")
+
+
+def _remove_stale(base_path):
+    """删除同一文件旧指纹的索引"""
+    cache_dir, name = os.path.split(base_path)
+    prefix = name.split("-", 1)[0] + "-"
+    for other in os.listdir(cache_dir):
+        if other.startswith(prefix) and not other.startswith(name):
+            try:
+                os.remove(os.path.join(cache_dir, other))
+            except OSError:
+                pass
+
+
+# 执行进程是常驻的，最近使用的索引保留在内存中，同一文件再次查询时无需重新读取
+_open_indexes = OrderedDict()
+_open_lock = threading.Lock()
+MAX_OPEN_INDEXES = 8
+
+
+def open_index(base_path, df):
+    """取得文件的索引：内存 -> 磁盘 -> 对df（文件读取后的原始数据）建立并保存。行数与df不一致时重新建立"""
+    with _open_lock:
+        index = _open_indexes.get(base_path)
+        if index is not None:
+            _open_indexes.move_to_end(base_path)
+    if index is None:
+        index = TokenIndex.load(base_path)
+    if index is None or index.row_count != len(df):
+        index = TokenIndex.build(df)
+        try:
+            index.save(base_path)
+            _remove_stale(base_path)
+        except Exception as e:
+            print(f"保存令牌索引失败: {str(e)}")
+    with _open_lock:
+        _open_indexes[base_path] = index
+        while len(_open_indexes) > MAX_OPEN_INDEXES:
+            _open_indexes.popitem(last=False)
+    return index
+
+
+def scan_rows(df, token):
+    """不使用索引，在所有文本列中查找完整出现该令牌的行（不区分大小写）"""
+    pattern = re.compile(rf'(?<![\w.:-]){re.escape(token)}(?!\.?[\w-])', re.IGNORECASE)
+    mask = np.zeros(len(df), dtype=bool)
+    for _, text in _text_columns(df):
+        # 先按子串筛选候选行，只对候选行做边界匹配
+        candidates = text[text.str.lower().str.contains(token, regex=False).to_numpy(dtype=bool)]
+        if candidates.empty:
+            continue
+        matched = candidates.str.contains(pattern, regex=True)
+        mask[candidates.index[matched.to_numpy(dtype=bool)]] = True
+    return np.flatnonzero(mask)
+
+
+def lookup_token_rows(df, tokens, base_path=None):
+    """包含任一令牌的行号（有序）。有索引路径时使用倒排索引；
+    IP、哈希、主机名不在索引中即不存在，其他令牌（如未按 user=xxx 等形式出现的用户名）不在索引中时退回扫描"""
+    index = open_index(base_path, df) if base_path else None
+    found = []
+    for token in tokens:
+        token = normalize_token(token)
+        if not token:
+            continue
+        rows = index.rows_for(token) if index is not None else None
+        if rows is None and (index is None or not is_entity_token(token)):
+            rows = scan_rows(df, token)
+        if rows is not None and len(rows):
+            found.append(rows)
+    if not found:
+        return np.zeros(0, dtype=np.int64)
+    if len(found) == 1:
+        return np.asarray(found[0], dtype=np.int64)
+    return np.unique(np.concatenate(found)).astype(np.int64)
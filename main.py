@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from ui.main_window import LogAnalyzerGUI
 from utils.config import Config
@@ -15,5 +16,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-
+    # 执行进程池使用spawn方式启动子进程，打包为可执行文件时需要
+    multiprocessing.freeze_support()
     main()
@@ -1,8 +1,12 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit,
-                             QComboBox, QProgressBar, QPushButton, QGroupBox)
-from PyQt5.QtCore import Qt
+                             QComboBox, QProgressBar, QPushButton, QGroupBox, QSpinBox, QCheckBox,
+                             QDateTimeEdit, QMessageBox)
+from PyQt5.QtCore import Qt, QFileSystemWatcher, QDateTime
 from core.analysis_thread import AnalysisThread
-from utils.helpers import show_error_message
+from core.monitor_thread import MonitorThread
+from core.time_window import parse_time_range, format_time_range
+import os
+from utils.helpers import show_error_message, show_info_message, get_cache_dir
 
 
 class AnalysisTab(QWidget):
@@ -30,10 +34,83 @@ class AnalysisTab(QWidget):
         mode_layout.addWidget(QLabel("处理模式:"))
 
         self.mode_combo = QComboBox()
-        self.mode_combo.addItems(["代码处理(生成表格)", "直接回答"])
+        self.mode_combo.addItems(["代码处理(生成表格)", "直接回答", "全量回答(分块汇总)", "SQL查询(列式引擎)"])
         mode_layout.addWidget(self.mode_combo)
         mode_layout.addStretch()
 
+        # 资源上限（0表示不限制）
+        mode_layout.addWidget(QLabel("时间上限(秒):"))
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(0, 86400)
+        self.timeout_spin.setSpecialValueText("不限")
+        self.timeout_spin.setValue(self.processor.config.get("analysis_timeout_seconds", 600))
+        mode_layout.addWidget(self.timeout_spin)
+
+        mode_layout.addWidget(QLabel("内存上限(MB):"))
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(0, 1024 * 1024)
+        self.memory_spin.setSingleStep(512)
+        self.memory_spin.setSpecialValueText("不限")
+        self.memory_spin.setValue(self.processor.config.get("analysis_memory_limit_mb", 4096))
+        mode_layout.addWidget(self.memory_spin)
+
+        # 代码处理模式下收集执行性能报告（热点行、内存分配）
+        self.profile_check = QCheckBox("性能分析")
+        self.profile_check.setToolTip("记录生成代码的耗时热点和内存分配（执行会变慢）")
+        mode_layout.addWidget(self.profile_check)
+
+        # 时间范围：只读取范围内的数据（启用时间分区时跳过范围外的分区和文件）
+        range_layout = QHBoxLayout()
+        self.time_range_check = QCheckBox("时间范围:")
+        self.time_range_check.toggled.connect(self.toggle_time_range)
+        range_layout.addWidget(self.time_range_check)
+
+        now = QDateTime.currentDateTime()
+        self.range_start_edit = QDateTimeEdit(now.addDays(-1))
+        self.range_end_edit = QDateTimeEdit(now)
+        for edit in (self.range_start_edit, self.range_end_edit):
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+            edit.setCalendarPopup(True)
+            edit.setEnabled(False)
+        range_layout.addWidget(self.range_start_edit)
+        range_layout.addWidget(QLabel("至"))
+        range_layout.addWidget(self.range_end_edit)
+
+        self.detect_range_check = QCheckBox("从请求中识别时间范围")
+        self.detect_range_check.setToolTip("未指定时间范围时，识别请求中的“最近24小时”“昨天”“2024-01-01 02:00到03:00”等描述，"
+                                           "分析前显示识别结果供确认")
+        self.detect_range_check.setChecked(self.processor.config.get("detect_time_range", False))
+        self.detect_range_check.toggled.connect(
+            lambda checked: self.processor.config.set("detect_time_range", checked)
+        )
+        range_layout.addWidget(self.detect_range_check)
+        range_layout.addStretch()
+
+        # 持续监控：按间隔（或文件变化时）对最近时间窗口内的数据重新执行代码处理
+        monitor_layout = QHBoxLayout()
+        monitor_layout.addWidget(QLabel("持续监控 间隔(秒):"))
+        self.monitor_interval_spin = QSpinBox()
+        self.monitor_interval_spin.setRange(5, 86400)
+        self.monitor_interval_spin.setValue(self.processor.config.get("monitor_interval_seconds", 60))
+        monitor_layout.addWidget(self.monitor_interval_spin)
+
+        monitor_layout.addWidget(QLabel("时间窗口(分钟):"))
+        self.monitor_window_spin = QSpinBox()
+        self.monitor_window_spin.setRange(0, 7 * 24 * 60)
+        self.monitor_window_spin.setSpecialValueText("不限")
+        self.monitor_window_spin.setValue(self.processor.config.get("monitor_window_minutes", 60))
+        monitor_layout.addWidget(self.monitor_window_spin)
+
+        self.monitor_btn = QPushButton("开始监控")
+        self.monitor_btn.setToolTip("以代码处理模式持续分析所选文件最近时间窗口内的数据，结果变化时自动刷新")
+        self.monitor_btn.clicked.connect(self.toggle_monitor)
+        monitor_layout.addWidget(self.monitor_btn)
+        monitor_layout.addStretch()
+
+        # 所选文件变化时提前执行一次
+        self.monitor_watcher = QFileSystemWatcher(self)
+        self.monitor_watcher.fileChanged.connect(self.on_monitored_file_changed)
+
         # 进度条
         self.progress = QProgressBar()
         self.progress.setAlignment(Qt.AlignCenter)
@@ -48,13 +125,20 @@ class AnalysisTab(QWidget):
         self.start_btn = QPushButton("开始分析")
         self.start_btn.clicked.connect(self.start_analysis)
 
+        self.cancel_btn = QPushButton("取消分析")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_analysis)
+
         btn_layout.addWidget(self.back_btn)
         btn_layout.addStretch()
+        btn_layout.addWidget(self.cancel_btn)
         btn_layout.addWidget(self.start_btn)
 
         # 组装布局
         layout.addWidget(req_group)
         layout.addLayout(mode_layout)
+        layout.addLayout(range_layout)
+        layout.addLayout(monitor_layout)
         layout.addWidget(self.progress)
         layout.addLayout(btn_layout)
 
@@ -75,43 +159,238 @@ class AnalysisTab(QWidget):
             show_error_message(self, "警告", "请先选择文件")
             return
 
+        # 确定模式
+        mode = str(self.mode_combo.currentIndex() + 1)
+        confirmed, time_range = self.resolve_time_range(request)
+        if not confirmed:
+            return
+        self.run_analysis(selected_files, request, mode, profile=self.profile_check.isChecked(),
+                          time_range=time_range)
+
+    def toggle_time_range(self, checked):
+        self.range_start_edit.setEnabled(checked)
+        self.range_end_edit.setEnabled(checked)
+
+    def resolve_time_range(self, request):
+        """本次分析的时间范围：优先使用界面设置，否则从请求中识别（识别结果需用户确认）。
+        返回 (是否继续分析, 时间范围)，时间范围为None表示全部数据"""
+        if self.time_range_check.isChecked():
+            start = self.range_start_edit.dateTime().toPyDateTime()
+            end = self.range_end_edit.dateTime().toPyDateTime()
+            if end <= start:
+                start, end = end, start
+            return True, (start, end)
+        if not self.detect_range_check.isChecked():
+            return True, None
+        time_range = parse_time_range(request)
+        if time_range is None:
+            return True, None
+        reply = QMessageBox.question(
+            self, "确认时间范围",
+            f"从请求中识别到时间范围:\n{format_time_range(time_range)}\n\n"
+            f"是：只分析该范围内的数据（无法识别时间的行会被排除）\n否：分析全部数据",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+        )
+        if reply == QMessageBox.Cancel:
+            return False, None
+        return True, time_range if reply == QMessageBox.Yes else None
+
+    def optimize_code(self, result):
+        """根据上次执行的代码和性能报告，生成更快的代码并重新执行（同样收集性能报告，便于对比）"""
+        if not getattr(self, "last_run", None):
+            show_error_message(self, "警告", "没有可优化的分析")
+            return
+        files, request, time_range = self.last_run
+        self.run_analysis(files, request, "1", profile=True, time_range=time_range,
+                          optimize_from={"code": result["code"], "report": result["profile_report"]})
+
+    def run_analysis(self, selected_files, request, mode, profile=False, optimize_from=None, time_range=None):
+        """启动后台分析线程"""
+        if mode == "4":
+            time_range = None  # SQL查询直接扫描源文件，时间条件由SQL表达
+        self.last_run = (selected_files, request, time_range)
+
         # 准备分析
         self.start_btn.setEnabled(False)
+        self.monitor_btn.setEnabled(False)  # 分析期间不启动监控，两者共用代码缓存的待确认条目
+        self.cancel_btn.setEnabled(True)
         self.progress.setVisible(True)
         self.progress.setRange(0, 0)  # 无限进度
         if self.parent and hasattr(self.parent, 'statusBar'):
-            self.parent.statusBar().showMessage("分析中...")
-
-        # 确定模式
-        mode = "1" if self.mode_combo.currentText().startswith("代码处理") else "2"
+            if time_range:
+                self.parent.statusBar().showMessage(f"分析中（时间范围: {format_time_range(time_range)}）...")
+            else:
+                self.parent.statusBar().showMessage("分析中...")
 
         # 启动后台线程
+        self._stream_started = False
         self.analysis_thread = AnalysisThread(
             self.processor,
             selected_files,
             request,
-            mode
+            mode,
+            stream=self.processor.config.get("stream_responses", True),
+            timeout=self.timeout_spin.value(),
+            memory_limit_mb=self.memory_spin.value(),
+            profile=profile,
+            optimize_from=optimize_from,
+            time_range=time_range
         )
         self.analysis_thread.update_signal.connect(self.update_status)
+        self.analysis_thread.stream_signal.connect(self.stream_output)
+        self.analysis_thread.progress_signal.connect(self.update_progress)
         self.analysis_thread.complete_signal.connect(self.analysis_complete)
         self.analysis_thread.start()
 
+    def cancel_analysis(self):
+        """取消正在进行的分析"""
+        if getattr(self, "analysis_thread", None) and self.analysis_thread.isRunning():
+            self.analysis_thread.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.update_status("正在取消分析...")
+
     def update_status(self, message):
         """更新状态信息"""
         if self.parent and hasattr(self.parent, 'statusBar'):
             self.parent.statusBar().showMessage(message)
 
+    def update_progress(self, done, total):
+        """更新进度条（总数已知时显示确定进度）"""
+        if total > 0:
+            self.progress.setRange(0, total)
+            self.progress.setValue(done)
+
+    def stream_output(self, kind, text):
+        """将模型的流式输出实时追加到结果页"""
+        if not self.parent or not hasattr(self.parent, 'results_tab'):
+            return
+        if not self._stream_started:
+            self._stream_started = True
+            self.parent.results_tab.begin_stream()
+            self.parent.tabs.setCurrentIndex(3)  # 收到首个输出即切换到结果标签页
+        self.parent.results_tab.append_stream_text(kind, text)
+
     def analysis_complete(self, result):
         """分析完成处理"""
         self.progress.setVisible(False)
-        self.start_btn.setEnabled(True)
+        self.start_btn.setEnabled(not self.is_monitoring())
+        self.monitor_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
 
-        if result["status"] == "success":
+        metrics = result.get("metrics")
+        if result["status"] == "cancelled":
+            # 取消或超出资源上限：展示已得到的部分结果
+            self.update_status(result["message"])
+            if result.get("result") and self.parent:
+                self.parent.set_analysis_result(result["result"], metrics)
+                self.parent.tabs.setCurrentIndex(3)
+            self.save_metrics(metrics)
+            show_info_message(self, "分析已中止", result["message"])
+        elif result["status"] == "success":
             if self.parent:
                 self.parent.statusBar().showMessage("分析完成")
-                self.parent.set_analysis_result(result["result"])
+                self.parent.set_analysis_result(result["result"], metrics)  # 结果渲染耗时记入metrics
                 self.parent.tabs.setCurrentIndex(3)  # 切换到结果标签页
+            self.save_metrics(metrics)
         else:
             if self.parent and hasattr(self.parent, 'statusBar'):
                 self.parent.statusBar().showMessage("分析失败")
-            show_error_message(self, "错误", result["message"])
\ No newline at end of file
+            self.save_metrics(metrics)
+            show_error_message(self, "错误", result["message"])
+
+    def is_monitoring(self):
+        return bool(getattr(self, "monitor_thread", None)) and self.monitor_thread.isRunning()
+
+    def is_analyzing(self):
+        return bool(getattr(self, "analysis_thread", None)) and self.analysis_thread.isRunning()
+
+    def toggle_monitor(self):
+        """开始或停止持续监控"""
+        if self.is_monitoring():
+            self.stop_monitor()
+            return
+        if self.is_analyzing():
+            show_error_message(self, "警告", "请等待当前分析完成后再开始监控")
+            return
+
+        request = self.request_input.toPlainText().strip()
+        if not request:
+            show_error_message(self, "警告", "请输入分析请求")
+            return
+        selected_files = self.file_tab.get_selected_files()
+        if not selected_files:
+            show_error_message(self, "警告", "请先选择文件")
+            return
+
+        self.processor.config.set("monitor_interval_seconds", self.monitor_interval_spin.value())
+        self.processor.config.set("monitor_window_minutes", self.monitor_window_spin.value())
+
+        # 监控与普通分析共用代码缓存的待确认条目，监控期间不启动普通分析
+        self.start_btn.setEnabled(False)
+        self.monitor_btn.setText("停止监控")
+        self.monitor_interval_spin.setEnabled(False)
+        self.monitor_window_spin.setEnabled(False)
+
+        self.monitor_thread = MonitorThread(
+            self.processor,
+            selected_files,
+            request,
+            interval_seconds=self.monitor_interval_spin.value(),
+            window_minutes=self.monitor_window_spin.value(),
+            memory_limit_mb=self.memory_spin.value()
+        )
+        self.monitor_thread.status_signal.connect(self.update_status)
+        self.monitor_thread.result_signal.connect(self.monitor_result)
+        self.monitor_thread.complete_signal.connect(self.monitor_complete)
+        self.monitor_thread.start()
+
+        data_dir = self.processor.current_data_dir
+        paths = [os.path.join(data_dir, name) for name in selected_files]
+        self.monitor_watcher.addPaths([path for path in paths if os.path.exists(path)])
+
+    def stop_monitor(self, wait=False):
+        """停止持续监控；关闭窗口时等待监控线程结束"""
+        if self.is_monitoring():
+            self.monitor_thread.stop()
+            self.monitor_btn.setEnabled(False)
+            self.update_status("正在停止监控...")
+            if wait:
+                self.monitor_thread.wait()
+
+    def on_monitored_file_changed(self, path):
+        if self.is_monitoring():
+            self.monitor_thread.trigger()
+        # 轮转后原路径上的新文件需要重新加入监视
+        if os.path.exists(path) and path not in self.monitor_watcher.files():
+            self.monitor_watcher.addPath(path)
+
+    def monitor_result(self, update):
+        """监控结果变化时刷新结果页"""
+        if not self.parent:
+            return
+        self.parent.set_analysis_result(update["result"])
+        self.update_status(f"监控结果已更新（第 {update['tick']} 次执行，窗口内 {update['rows']} 行）")
+        if update["tick"] == 1:
+            self.parent.tabs.setCurrentIndex(3)
+
+    def monitor_complete(self, result):
+        """监控结束处理"""
+        files = self.monitor_watcher.files()
+        if files:
+            self.monitor_watcher.removePaths(files)
+        self.monitor_btn.setText("开始监控")
+        self.monitor_btn.setEnabled(not self.is_analyzing())
+        self.monitor_interval_spin.setEnabled(True)
+        self.monitor_window_spin.setEnabled(True)
+        self.start_btn.setEnabled(not self.is_analyzing())
+        self.update_status("监控已停止")
+        if result["status"] == "error":
+            show_error_message(self, "错误", result["message"])
+
+    def save_metrics(self, metrics):
+        """将本次分析的分阶段耗时追加到本地JSONL指标日志"""
+        if metrics is None:
+            return
+        log_file = (self.processor.config.get("metrics_log_file")
+                    or os.path.join(get_cache_dir(self.processor.config), "analysis_metrics.jsonl"))
+        metrics.append_to_log(log_file)
\ No newline at end of file
@@ -1,8 +1,7 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-                            QPushButton, QGroupBox, QFileDialog)
+                            QPushButton, QGroupBox, QFileDialog, QComboBox, QCheckBox)
 from utils.helpers import show_info_message, show_error_message
 import os
-from core.api_client import DeepSeekAPI
 
 class ConfigTab(QWidget):
     def __init__(self, config, parent=None):
@@ -58,8 +57,48 @@ class ConfigTab(QWidget):
         self.change_default_save_dir_btn.clicked.connect(self.change_default_save_dir)
         save_dir_layout.addWidget(self.change_default_save_dir_btn)
 
+        # 生成代码使用的数据处理库
+        backend_layout = QHBoxLayout()
+        backend_layout.addWidget(QLabel("数据处理引擎:"))
+
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItem("pandas（兼容性好）", "pandas")
+        self.backend_combo.addItem("polars（多线程惰性计算，适合大数据量）", "polars")
+        backend_index = self.backend_combo.findData(self.config.get("dataframe_backend", "pandas"))
+        self.backend_combo.setCurrentIndex(max(0, backend_index))
+        self.backend_combo.currentIndexChanged.connect(self.change_dataframe_backend)
+        backend_layout.addWidget(self.backend_combo)
+        backend_layout.addStretch()
+
         other_layout.addLayout(data_dir_layout)
         other_layout.addLayout(save_dir_layout)
+        other_layout.addLayout(backend_layout)
+
+        # 跟踪模式
+        self.follow_check = QCheckBox("跟踪模式：日志文件追加内容后只解析新增部分（CSV/TXT/LOG）")
+        self.follow_check.setChecked(self.config.get("follow_mode", False))
+        self.follow_check.toggled.connect(self.change_follow_mode)
+        other_layout.addWidget(self.follow_check)
+
+        # 令牌索引
+        self.token_index_check = QCheckBox("令牌索引：按IP、用户名、主机名、哈希查找行时使用倒排索引（首次查找时建立并缓存）")
+        self.token_index_check.setChecked(self.config.get("token_index", True))
+        self.token_index_check.toggled.connect(self.change_token_index)
+        other_layout.addWidget(self.token_index_check)
+
+        # 时间分区
+        partition_layout = QHBoxLayout()
+        partition_layout.addWidget(QLabel("时间分区:"))
+        self.partition_combo = QComboBox()
+        self.partition_combo.addItem("按天（按时间范围分析时跳过范围外的数据）", "day")
+        self.partition_combo.addItem("按小时（适合单日数据量很大的日志）", "hour")
+        self.partition_combo.addItem("不分区（读取全部数据后再按时间筛选）", "off")
+        partition_index = self.partition_combo.findData(self.config.get("time_partition", "day"))
+        self.partition_combo.setCurrentIndex(max(0, partition_index))
+        self.partition_combo.currentIndexChanged.connect(self.change_time_partition)
+        partition_layout.addWidget(self.partition_combo)
+        partition_layout.addStretch()
+        other_layout.addLayout(partition_layout)
 
         layout.addWidget(api_group)
         layout.addWidget(other_group)
@@ -69,16 +108,24 @@ class ConfigTab(QWidget):
         api_key = self.api_key_edit.text().strip()
         self.config.set("api_key", api_key)
 
-        # 更新处理器的API Key并重新初始化客户端，传入敏感词处理器
+        # 更新处理器的API Key并重新初始化客户端
         if hasattr(self.parent, 'processor'):
-            self.parent.processor.api_key = api_key
-            self.parent.processor.client = DeepSeekAPI(
-                api_key=api_key,
-                sensitive_processor=self.parent.processor.sensitive_processor
-            ) if api_key else None
+            self.parent.processor.set_api_key(api_key)
 
         show_info_message(self, "成功", "API Key已保存并生效")
 
+    def change_dataframe_backend(self):
+        self.config.set("dataframe_backend", self.backend_combo.currentData())
+
+    def change_follow_mode(self, checked):
+        self.config.set("follow_mode", checked)
+
+    def change_token_index(self, checked):
+        self.config.set("token_index", checked)
+
+    def change_time_partition(self):
+        self.config.set("time_partition", self.partition_combo.currentData())
+
     def change_default_data_dir(self):
         new_dir = QFileDialog.getExistingDirectory(
             self, "选择数据目录", self.config.get("data_dir")
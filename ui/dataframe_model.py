@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class DataFrameTableModel(QAbstractTableModel):
+    """直接以DataFrame为数据源的表格模型：只在单元格显示时才格式化，
+    排序和筛选通过向量化运算得到行号顺序，不复制原数据"""
+
+    EMPTY_VALUES = {'NaT', 'nan', 'None', '<NA>', ''}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._df = pd.DataFrame()
+        self._rows = np.arange(0)  # 当前显示顺序对应的原始行号（经过筛选和排序）
+        self._columns = {}  # 列号 -> 列数据数组（首次访问时取出，不复制）
+        self._text_columns = {}  # 列号 -> 小写字符串Series（首次筛选时转换）
+        self._sort = None  # (列号, 顺序)
+        self._filter_text = ""
+
+    def set_dataframe(self, df):
+        """设置新的数据源（None表示清空）"""
+        self.beginResetModel()
+        self._df = df if df is not None else pd.DataFrame()
+        self._rows = np.arange(len(self._df))
+        self._columns = {}
+        self._text_columns = {}
+        self._sort = None
+        self._filter_text = ""
+        self.endResetModel()
+
+    def dataframe(self):
+        return self._df
+
+    def visible_row_count(self):
+        return len(self._rows)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._df.shape[1]
+
+    def _column(self, col):
+        values = self._columns.get(col)
+        if values is None:
+            values = self._df.iloc[:, col].array  # 保留时间等类型的原始格式
+            self._columns[col] = values
+        return values
+
+    def format_value(self, value):
+        try:
+            text = str(value)
+        except Exception as e:
+            return f"数据错误: {str(e)}"
+        return '' if text in self.EMPTY_VALUES else text
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        value = self._column(index.column())[self._rows[index.row()]]
+        return self.format_value(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self._df.columns[section]) if section < self._df.shape[1] else None
+        return str(section + 1)
+
+    def _sorted_rows(self, rows, col, order):
+        """按列值对行号排序（稳定排序，空值排在最后）"""
+        values = pd.Series(self._column(col)[rows])
+        ascending = order == Qt.AscendingOrder
+        try:
+            ordered = values.sort_values(ascending=ascending, na_position='last', kind='stable')
+        except TypeError:
+            # 混合类型无法直接比较时按文本排序
+            ordered = values.astype(str).sort_values(ascending=ascending, kind='stable')
+        return rows[ordered.index.to_numpy()]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0 or column >= self._df.shape[1]:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._sort = (column, order)
+        self._rows = self._sorted_rows(self._rows, column, order)
+        self.layoutChanged.emit()
+
+    def _text_column(self, col):
+        text = self._text_columns.get(col)
+        if text is None:
+            text = self._df.iloc[:, col].astype(str).str.lower()
+            self._text_columns[col] = text
+        return text
+
+    def set_filter(self, text):
+        """只显示任一列包含指定文本（不区分大小写）的行"""
+        text = text.strip().lower()
+        if text == self._filter_text:
+            return
+        self.beginResetModel()
+        self._filter_text = text
+        if text:
+            mask = np.zeros(len(self._df), dtype=bool)
+            for col in range(self._df.shape[1]):
+                mask |= self._text_column(col).str.contains(text, regex=False).to_numpy(dtype=bool)
+            rows = np.flatnonzero(mask)
+        else:
+            rows = np.arange(len(self._df))
+        if self._sort is not None:
+            rows = self._sorted_rows(rows, *self._sort)
+        self._rows = rows
+        self.endResetModel()
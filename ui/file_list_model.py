@@ -0,0 +1,159 @@
+from datetime import datetime
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from utils.helpers import format_size
+
+
+class FileListModel(QAbstractTableModel):
+    """数据目录文件列表模型：按批增量加入、更新和删除文件，不重建整个列表。
+    排序在模型内用Python排序完成（筛选代理不再逐行比较），新加入的文件先追加到末尾，调用 resort 后归位"""
+
+    COLUMNS = ["文件名", "大小", "修改时间", "格式"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = []  # [[文件名, 大小, 修改时间, 格式]]
+        self._rows = {}  # 文件名 -> 行号
+        self._sort = None  # (列号, 顺序)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entries[index.row()]
+        value = entry[index.column()]
+        if role == Qt.DisplayRole:
+            if index.column() == 1:
+                return format_size(value)
+            if index.column() == 2:
+                return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+            return value
+        if role == Qt.ToolTipRole and index.column() == 0:
+            return value
+        if role == Qt.TextAlignmentRole and index.column() == 1:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def entry(self, row):
+        return self._entries[row]
+
+    def file_count(self):
+        return len(self._entries)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0 or column >= len(self.COLUMNS):
+            return
+        self._sort = (column, order)
+        self.resort()
+
+    def resort(self):
+        """按当前排序列重新排序，保持选中行等持久索引指向原来的文件"""
+        if self._sort is None:
+            return
+        column, order = self._sort
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        names = [self._entries[index.row()][0] for index in persistent]
+        if column == 0:
+            key = lambda entry: entry[0].lower()
+        else:
+            key = lambda entry: entry[column]
+        self._entries.sort(key=key, reverse=order == Qt.DescendingOrder)
+        self._rows = {entry[0]: row for row, entry in enumerate(self._entries)}
+        self.changePersistentIndexList(
+            persistent, [self.index(self._rows[name], index.column()) for name, index in zip(names, persistent)]
+        )
+        self.layoutChanged.emit()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries = []
+        self._rows = {}
+        self.endResetModel()
+
+    def upsert_entries(self, batch):
+        """加入一批文件信息：新文件追加到末尾，已有文件原地更新"""
+        new_entries = []
+        changed_rows = []
+        for name, size, mtime, fmt in batch:
+            row = self._rows.get(name)
+            if row is None:
+                new_entries.append([name, size, mtime, fmt])
+            else:
+                self._entries[row] = [name, size, mtime, fmt]
+                changed_rows.append(row)
+
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows), 0),
+                                  self.index(max(changed_rows), len(self.COLUMNS) - 1))
+        if new_entries:
+            first = len(self._entries)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_entries) - 1)
+            for offset, entry in enumerate(new_entries):
+                self._rows[entry[0]] = first + offset
+            self._entries.extend(new_entries)
+            self.endInsertRows()
+
+    def remove_entries(self, names):
+        rows = sorted((self._rows[name] for name in names if name in self._rows), reverse=True)
+        if not rows:
+            return
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._entries[row]
+            self.endRemoveRows()
+        self._rows = {entry[0]: row for row, entry in enumerate(self._entries)}
+
+
+class FileFilterProxyModel(QSortFilterProxyModel):
+    """按文件名、扩展名和修改时间筛选文件列表"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._name_text = ""
+        self._extensions = None  # 允许的扩展名集合，None表示全部
+        self._min_mtime = None  # 最早修改时间（时间戳），None表示不限
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # 交给源模型排序，代理只负责筛选
+        self.sourceModel().sort(column, order)
+
+    def set_name_filter(self, text):
+        self._name_text = text.strip().lower()
+        self.invalidateFilter()
+
+    def set_extension_filter(self, extensions):
+        self._extensions = {ext.lower() for ext in extensions} if extensions else None
+        self.invalidateFilter()
+
+    def set_recent_days(self, days):
+        """只显示最近若干天修改过的文件（days为None时不限）；0表示今天"""
+        if days is None:
+            self._min_mtime = None
+        else:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+            self._min_mtime = today - days * 86400
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._name_text and self._extensions is None and self._min_mtime is None:
+            return True
+        name, _, mtime, _ = self.sourceModel().entry(source_row)
+        if self._name_text and self._name_text not in name.lower():
+            return False
+        if self._extensions is not None:
+            dot = name.rfind('.')
+            if dot <= 0 or name[dot:].lower() not in self._extensions:
+                return False
+        if self._min_mtime is not None and mtime < self._min_mtime:
+            return False
+        return True
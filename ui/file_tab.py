@@ -1,19 +1,44 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
                              QPushButton, QListWidget, QGroupBox, QSplitter,
-                             QFileDialog, QListWidgetItem, QMessageBox)
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QFileIconProvider
+                             QFileDialog, QMessageBox, QProgressBar, QTableView,
+                             QHeaderView, QComboBox, QAbstractItemView)
+from PyQt5.QtCore import Qt, QTimer, QFileSystemWatcher
 import os
 import shutil
-from utils.helpers import get_file_list, show_info_message, show_error_message
+from utils.helpers import show_info_message, show_error_message, format_size
+from core.anonymize_thread import AnonymizeThread
+from core.dir_scanner import DirScanThread, detect_format
+from ui.file_list_model import FileListModel, FileFilterProxyModel
 
 
 class FileTab(QWidget):
+    # 扩展名筛选项 (显示名称, 扩展名列表)
+    EXTENSION_FILTERS = [
+        ("全部格式", None),
+        ("CSV", [".csv"]),
+        ("Excel", [".xlsx", ".xls"]),
+        ("JSON", [".json"]),
+        ("文本日志", [".txt", ".log"])
+    ]
+    # 修改时间筛选项 (显示名称, 天数)
+    DATE_FILTERS = [
+        ("全部时间", None),
+        ("今天", 0),
+        ("最近7天", 7),
+        ("最近30天", 30)
+    ]
+
     def __init__(self, processor, config, parent=None):
         super().__init__(parent)
         self.processor = processor
         self.config = config  # 配置对象（存储默认目录）
         self.selected_files = []
+        self.anonymize_thread = None
+        self.scan_thread = None
+        self._rescan_pending = False  # 扫描期间目录再次变化，扫描结束后需再比较一次
+        self._known_names = None  # 上次扫描得到的文件名集合（由扫描线程建立），目录变化时只比较文件名
+        self._scan_added = False  # 本次扫描是否加入了文件（结束后需重新排序）
+        self._changed_files = set()  # 内容变化待刷新大小的已选文件路径
         self.parent = parent  # 保存父窗口引用
         self.current_data_dir = self.config.get("data_dir")
         self.init_ui()
@@ -65,10 +90,71 @@ class FileTab(QWidget):
         list_group = QGroupBox("可用日志文件")
         list_layout = QVBoxLayout(list_group)
 
-        self.file_list = QListWidget()
-        self.file_list.setSelectionMode(QListWidget.ExtendedSelection)
+        # 筛选条件
+        filter_layout = QHBoxLayout()
+        self.name_filter_edit = QLineEdit()
+        self.name_filter_edit.setPlaceholderText("按文件名筛选...")
+        self.name_filter_edit.textChanged.connect(self.schedule_name_filter)
+        self.ext_filter_combo = QComboBox()
+        for label, extensions in self.EXTENSION_FILTERS:
+            self.ext_filter_combo.addItem(label, extensions)
+        self.ext_filter_combo.currentIndexChanged.connect(self.apply_extension_filter)
+        self.date_filter_combo = QComboBox()
+        for label, days in self.DATE_FILTERS:
+            self.date_filter_combo.addItem(label, days)
+        self.date_filter_combo.currentIndexChanged.connect(self.apply_date_filter)
+        self.file_count_label = QLabel()
+        filter_layout.addWidget(self.name_filter_edit, 1)
+        filter_layout.addWidget(self.ext_filter_combo)
+        filter_layout.addWidget(self.date_filter_combo)
+        filter_layout.addWidget(self.file_count_label)
+        list_layout.addLayout(filter_layout)
+
+        # 文件列表由后台扫描增量填充，按需渲染可见行
+        self.file_model = FileListModel(self)
+        self.file_proxy = FileFilterProxyModel(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        self.file_proxy.rowsInserted.connect(self.update_file_count)
+        self.file_proxy.rowsRemoved.connect(self.update_file_count)
+        self.file_proxy.modelReset.connect(self.update_file_count)
+        self.file_proxy.layoutChanged.connect(self.update_file_count)
+
+        self.file_list = QTableView()
+        self.file_list.setModel(self.file_proxy)
+        self.file_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.file_list.setSortingEnabled(True)
+        self.file_list.sortByColumn(2, Qt.DescendingOrder)  # 默认最新修改的文件在前
+        self.file_list.verticalHeader().setVisible(False)
+        self.file_list.verticalHeader().setDefaultSectionSize(22)
+        self.file_list.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for column in range(1, len(FileListModel.COLUMNS)):
+            self.file_list.horizontalHeader().setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        self.file_list.doubleClicked.connect(self.add_files)
         list_layout.addWidget(self.file_list)
 
+        # 文件名筛选防抖，避免每次按键都重新筛选大目录
+        self.name_filter_timer = QTimer(self)
+        self.name_filter_timer.setSingleShot(True)
+        self.name_filter_timer.setInterval(300)
+        self.name_filter_timer.timeout.connect(self.apply_name_filter)
+
+        # 监视数据目录，文件新增、删除或轮转时只比较变化的部分
+        self.dir_watcher = QFileSystemWatcher(self)
+        self.dir_watcher.directoryChanged.connect(self.schedule_rescan)
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(500)
+        self.rescan_timer.timeout.connect(self.rescan_changes)
+
+        # 目录监视不会在文件原地追加时触发：监视已选文件，内容变化时刷新其大小和修改时间
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.schedule_file_refresh)
+        self.file_refresh_timer = QTimer(self)
+        self.file_refresh_timer.setSingleShot(True)
+        self.file_refresh_timer.setInterval(500)
+        self.file_refresh_timer.timeout.connect(self.refresh_changed_files)
+
         # 已选文件区域
         selected_group = QGroupBox("已选择文件")
         selected_layout = QVBoxLayout(selected_group)
@@ -87,11 +173,26 @@ class FileTab(QWidget):
         self.next_btn.clicked.connect(self.go_to_analysis)
         self.next_btn.setEnabled(False)
 
+        # 去敏进度（后台处理时显示）
+        progress_layout = QHBoxLayout()
+        self.anonymize_label = QLabel()
+        self.anonymize_progress = QProgressBar()
+        self.anonymize_progress.setRange(0, 1000)  # 按千分比显示，避免字节数超出进度条的整数范围
+        self.cancel_anonymize_btn = QPushButton("取消去敏")
+        self.cancel_anonymize_btn.clicked.connect(self.cancel_anonymize)
+        progress_layout.addWidget(self.anonymize_label)
+        progress_layout.addWidget(self.anonymize_progress, 1)
+        progress_layout.addWidget(self.cancel_anonymize_btn)
+        self.anonymize_widgets = [self.anonymize_label, self.anonymize_progress, self.cancel_anonymize_btn]
+        for widget in self.anonymize_widgets:
+            widget.setVisible(False)
+
         # 组装布局
         layout.addLayout(dir_layout)
         layout.addLayout(add_file_layout)
         layout.addLayout(btn_layout)
         layout.addWidget(splitter)
+        layout.addLayout(progress_layout)
         layout.addWidget(self.next_btn)
 
         # 在按钮布局添加去敏相关按钮
@@ -178,38 +279,140 @@ class FileTab(QWidget):
                     self, "添加成功",
                     f"已添加 {len(added_files)} 个文件到数据目录"
                 )
-                self.update_file_list()
+                self.schedule_rescan()  # 只比较新增的文件
 
     def update_file_list(self):
-        """更新当前数据目录中的文件列表"""
-        self.file_list.clear()
-        try:
-            # 读取当前数据目录中的文件
-            files = get_file_list(self.current_data_dir)
-            icon_provider = QFileIconProvider()
+        """在后台重新扫描当前数据目录，扫描结果分批加入文件列表"""
+        self.file_model.clear()
+        self._rescan_pending = False
+        self._known_names = None
+        self.watch_directory(self.current_data_dir)
+        self.start_scan(known_names=None)
+
+    def watch_directory(self, directory):
+        watched = self.dir_watcher.directories()
+        if watched:
+            self.dir_watcher.removePaths(watched)
+        if directory and os.path.isdir(directory):
+            self.dir_watcher.addPath(directory)
+
+    def start_scan(self, known_names):
+        """启动后台扫描；known_names为上次扫描的文件名集合时只发送新增文件并报告删除的文件"""
+        self.stop_scan()
+        if not self.current_data_dir or not os.path.isdir(self.current_data_dir):
+            self.update_file_count()
+            return
+        self._scan_added = False
+        self.scan_thread = DirScanThread(self.current_data_dir, known_names)
+        self.scan_thread.batch_signal.connect(self.on_scan_batch)
+        self.scan_thread.complete_signal.connect(self.on_scan_complete)
+        self.scan_thread.start()
+        if known_names is None and self.parent:
+            self.parent.statusBar().showMessage("正在扫描数据目录...")
+
+    def stop_scan(self):
+        if self.scan_thread is not None and self.scan_thread.isRunning():
+            self.scan_thread.cancel()
+            self.scan_thread.wait()
+
+    def schedule_rescan(self, _path=None):
+        """目录变化时延迟比较，合并短时间内的多次变化"""
+        if self.scan_thread is not None and self.scan_thread.isRunning():
+            self._rescan_pending = True
+        else:
+            self.rescan_timer.start()
+
+    def rescan_changes(self):
+        # 首次扫描未完成时没有文件名集合，完整扫描
+        self.start_scan(known_names=self._known_names)
 
-            for file in files:
-                item = QListWidgetItem(icon_provider.icon(QFileIconProvider.File), file)
-                self.file_list.addItem(item)
+    def on_scan_batch(self, batch):
+        if self.sender() is not self.scan_thread:
+            return  # 已被新扫描取代的旧扫描结果
+        self.file_model.upsert_entries(batch)
+        self._scan_added = True
 
+    def on_scan_complete(self, result):
+        if self.sender() is not self.scan_thread:
+            return
+        if result["status"] == "success":
+            self._known_names = result["names"]
+            self.file_model.remove_entries(result["removed"])
+            # 扫描期间新文件追加在末尾，结束后统一排序一次
+            if self._scan_added:
+                self.file_model.resort()
             if self.parent:
-                self.parent.statusBar().showMessage(f"已加载 {len(files)} 个文件")
-        except Exception as e:
-            show_error_message(self, "警告", f"加载文件列表失败: {str(e)}")
+                self.parent.statusBar().showMessage(f"已加载 {result['count']} 个文件")
+        elif result["status"] == "error":
+            show_error_message(self, "警告", f"加载文件列表失败: {result['message']}")
+        if self._rescan_pending:
+            self._rescan_pending = False
+            self.rescan_timer.start()
+
+    def watch_selected_files(self):
+        """监视已选文件的内容变化（轮转后同名新文件出现时重新加入监视）"""
+        watched = self.file_watcher.files()
+        if watched:
+            self.file_watcher.removePaths(watched)
+        paths = [os.path.join(self.current_data_dir, name) for name in self.selected_files]
+        paths = [path for path in paths if os.path.isfile(path)]
+        if paths:
+            self.file_watcher.addPaths(paths)
+
+    def schedule_file_refresh(self, path):
+        self._changed_files.add(path)
+        self.file_refresh_timer.start()
+
+    def refresh_changed_files(self):
+        """只对内容变化的已选文件取stat，更新列表中的大小和修改时间"""
+        batch = []
+        for path in self._changed_files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # 已删除：由目录监视报告
+            name = os.path.basename(path)
+            batch.append((name, stat.st_size, stat.st_mtime, detect_format(name)))
+            if path not in self.file_watcher.files():
+                self.file_watcher.addPath(path)  # 被替换（轮转）后监视会失效
+        self._changed_files.clear()
+        if batch:
+            self.file_model.upsert_entries(batch)
+
+    def update_file_count(self, *args):
+        shown = self.file_proxy.rowCount()
+        total = self.file_model.file_count()
+        self.file_count_label.setText(f"{total} 个文件" if shown == total else f"{shown} / {total} 个文件")
+
+    def schedule_name_filter(self, _text=None):
+        self.name_filter_timer.start()
+
+    def apply_name_filter(self):
+        self.file_proxy.set_name_filter(self.name_filter_edit.text())
+        self.update_file_count()
+
+    def apply_extension_filter(self, _index=None):
+        self.file_proxy.set_extension_filter(self.ext_filter_combo.currentData())
+        self.update_file_count()
+
+    def apply_date_filter(self, _index=None):
+        self.file_proxy.set_recent_days(self.date_filter_combo.currentData())
+        self.update_file_count()
 
     def add_files(self):
         """添加文件到选择列表"""
-        selected = self.file_list.selectedItems()
+        selected = self.file_list.selectionModel().selectedRows(0)
         if not selected:
             show_info_message(self, "提示", "请先选择文件")
             return
 
-        for item in selected:
-            filename = item.text()
+        for index in sorted(selected, key=lambda index: index.row()):
+            filename = self.file_model.entry(self.file_proxy.mapToSource(index).row())[0]
             if not self.selected_list.findItems(filename, Qt.MatchExactly):
                 self.selected_list.addItem(filename)
                 self.selected_files.append(filename)
 
+        self.watch_selected_files()
         self.update_next_button()
 
     def remove_files(self):
@@ -218,12 +421,14 @@ class FileTab(QWidget):
             self.selected_files.remove(item.text())
             self.selected_list.takeItem(self.selected_list.row(item))
 
+        self.watch_selected_files()
         self.update_next_button()
 
     def clear_selection(self):
         """清空选择列表"""
         self.selected_list.clear()
         self.selected_files = []
+        self.watch_selected_files()
         self.update_next_button()
 
     def update_next_button(self):
@@ -231,7 +436,7 @@ class FileTab(QWidget):
         self.next_btn.setEnabled(len(self.selected_files) > 0)
         has_files = len(self.selected_files) > 0  # 补充缺失的 has_files 定义
         self.next_btn.setEnabled(has_files)
-        self.anonymize_btn.setEnabled(has_files)
+        self.anonymize_btn.setEnabled(has_files and not self.is_anonymizing())
 
     def go_to_analysis(self):
         """前往分析标签页"""
@@ -259,19 +464,59 @@ class FileTab(QWidget):
         if not save_dir:
             return
 
-        try:
-            # 执行去敏处理
-            results = self.processor.process_and_anonymize_files(
-                self.selected_files,
-                save_dir
-            )
-
+        # 在后台线程中执行去敏处理
+        self.anonymize_thread = AnonymizeThread(self.processor, list(self.selected_files), save_dir)
+        self.anonymize_thread.progress_signal.connect(self.update_anonymize_progress)
+        self.anonymize_thread.complete_signal.connect(self.anonymize_complete)
+        self.set_anonymize_running(True)
+        self.anonymize_thread.start()
+
+    def is_anonymizing(self):
+        return self.anonymize_thread is not None and self.anonymize_thread.isRunning()
+
+    def set_anonymize_running(self, running):
+        """切换去敏进度区的显示；处理期间禁止再次去敏和更换数据目录"""
+        for widget in self.anonymize_widgets:
+            widget.setVisible(running)
+        if running:
+            self.anonymize_label.setText("正在准备去敏...")
+            self.anonymize_progress.setValue(0)
+            self.cancel_anonymize_btn.setEnabled(True)
+        self.anonymize_btn.setEnabled(not running and len(self.selected_files) > 0)
+        self.change_dir_btn.setEnabled(not running)
+        self.apply_dir_btn.setEnabled(not running)
+
+    def update_anonymize_progress(self, progress):
+        """显示当前文件、已处理字节数和预计剩余时间"""
+        total = progress["bytes_total"]
+        self.anonymize_progress.setValue(int(progress["bytes_done"] * 1000 / total) if total else 0)
+        text = (f"文件 {min(progress['file_index'] + 1, progress['file_count'])}/{progress['file_count']}"
+                f"  {format_size(progress['bytes_done'])} / {format_size(total)}")
+        if progress["file_name"]:
+            text = f"{progress['file_name']}  " + text
+        eta = progress["eta_seconds"]
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            text += f"  预计剩余 {minutes}分{seconds:02d}秒" if minutes else f"  预计剩余 {seconds}秒"
+        self.anonymize_label.setText(text)
+
+    def cancel_anonymize(self):
+        if self.is_anonymizing():
+            self.anonymize_thread.cancel()
+            self.cancel_anonymize_btn.setEnabled(False)
+            self.anonymize_label.setText("正在取消...")
+
+    def anonymize_complete(self, result):
+        self.set_anonymize_running(False)
+        if result["status"] == "success":
             # 显示结果
             msg = "成功去敏并保存以下文件：\n"
-            for original, anonymized in results.items():
+            for original, anonymized in result["results"].items():
                 msg += f"- {original} → {os.path.basename(anonymized)}\n"
 
             show_info_message(self, "成功", msg)
-
-        except Exception as e:
-            show_error_message(self, "处理失败", f"去敏过程出错: {str(e)}")
\ No newline at end of file
+        elif result["status"] == "cancelled":
+            if self.parent:
+                self.parent.statusBar().showMessage(f"{result['message']}，已删除本次生成的文件")
+        else:
+            show_error_message(self, "处理失败", f"去敏过程出错: {result['message']}")
@@ -73,6 +73,13 @@ class LogAnalyzerGUI(QMainWindow):
         else:
             print(f"警告：图标文件不存在 - {icon_path}")
 
-    def set_analysis_result(self, result):
-        """将分析结果传递给结果标签页"""
-        self.results_tab.set_result(result)
\ No newline at end of file
+    def closeEvent(self, event):
+        """关闭窗口时停止目录扫描和持续监控，并释放后台执行进程"""
+        self.file_tab.stop_scan()
+        self.analysis_tab.stop_monitor(wait=True)
+        self.processor.shutdown()
+        super().closeEvent(event)
+
+    def set_analysis_result(self, result, metrics=None):
+        """将分析结果（及分阶段耗时）传递给结果标签页"""
+        self.results_tab.set_result(result, metrics)
\ No newline at end of file
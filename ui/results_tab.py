@@ -1,19 +1,26 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-                            QPushButton, QGroupBox, QTextEdit, QTableWidget, QTableWidgetItem,
-                            QSplitter, QFileDialog)
-from PyQt5.QtCore import Qt
+                            QPushButton, QGroupBox, QTextEdit, QTableView, QHeaderView,
+                            QSplitter, QFileDialog, QProgressBar)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QTextCursor
 import os
 import pandas as pd
+from ui.dataframe_model import DataFrameTableModel
+from core.export_thread import ExportThread
+from core.result_exporter import ResultExporter
 from utils.helpers import show_info_message, show_error_message, get_unique_filename
 
 
 class ResultsTab(QWidget):
+    COLUMN_SIZE_SAMPLE_ROWS = 200  # 自动列宽时采样的行数
+
     def __init__(self, config, parent=None):
         super().__init__(parent)
         self.config = config  # 配置对象（存储默认目录）
         self.parent = parent
         self.current_result = None
         self.current_save_dir = config.get("save_dir")
+        self._stream_kind = None  # 当前流式输出的类型
         self.init_ui()
 
     def init_ui(self):
@@ -50,10 +57,43 @@ class ResultsTab(QWidget):
         # 表格区域
         table_group = QGroupBox("结果表格")
         table_layout = QVBoxLayout(table_group)
-        self.result_table = QTableWidget()
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("筛选:"))
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("输入关键字筛选任一列包含该内容的行")
+        self.filter_edit.textChanged.connect(self.schedule_filter)
+        filter_layout.addWidget(self.filter_edit)
+        self.row_count_label = QLabel("")
+        filter_layout.addWidget(self.row_count_label)
+        table_layout.addLayout(filter_layout)
+
+        # 表格视图直接绑定DataFrame模型，只渲染可见行
+        self.table_model = DataFrameTableModel(self)
+        self.result_table = QTableView()
+        self.result_table.setModel(self.table_model)
+        self.result_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)  # 初始不排序
+        self.result_table.setSortingEnabled(True)
+        self.result_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # 按列宽自适应时只采样前若干行，避免遍历全部数据
+        self.result_table.horizontalHeader().setResizeContentsPrecision(self.COLUMN_SIZE_SAMPLE_ROWS)
         table_layout.addWidget(self.result_table)
+
+        # 输入停顿后再筛选，避免每次按键都扫描全表
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filter)
         splitter.addWidget(table_group)
-        splitter.setSizes([200, 400])
+
+        # 分阶段耗时
+        timing_group = QGroupBox("阶段耗时")
+        timing_layout = QVBoxLayout(timing_group)
+        self.timing_display = QTextEdit()
+        self.timing_display.setReadOnly(True)
+        timing_layout.addWidget(self.timing_display)
+        splitter.addWidget(timing_group)
+        splitter.setSizes([200, 400, 100])
 
         # 按钮区
         btn_layout = QHBoxLayout()
@@ -64,7 +104,22 @@ class ResultsTab(QWidget):
         self.new_analysis_btn = QPushButton("新分析")
         self.new_analysis_btn.clicked.connect(self.start_new_analysis)
 
+        # 根据性能报告重新生成更快的代码
+        self.optimize_btn = QPushButton("生成更快的代码")
+        self.optimize_btn.setEnabled(False)
+        self.optimize_btn.clicked.connect(self.optimize_code)
+
+        # 后台导出进度
+        self.export_progress = QProgressBar()
+        self.export_progress.setVisible(False)
+        self.cancel_export_btn = QPushButton("取消保存")
+        self.cancel_export_btn.setVisible(False)
+        self.cancel_export_btn.clicked.connect(self.cancel_export)
+
         btn_layout.addWidget(self.save_btn)
+        btn_layout.addWidget(self.optimize_btn)
+        btn_layout.addWidget(self.export_progress)
+        btn_layout.addWidget(self.cancel_export_btn)
         btn_layout.addStretch()
         btn_layout.addWidget(self.new_analysis_btn)
 
@@ -72,9 +127,64 @@ class ResultsTab(QWidget):
         layout.addWidget(splitter)
         layout.addLayout(btn_layout)
 
-    def set_result(self, result):
+    def set_result(self, result, metrics=None):
         self.current_result = result
-        self.display_results(result)
+        self.optimize_btn.setEnabled(bool(result.get("profile_report")))
+        if metrics is None:
+            self.display_results(result)
+            self.timing_display.clear()
+            return
+
+        table = result.get("result_table")
+        attrs = {"rows": len(table)} if isinstance(table, pd.DataFrame) else {}
+        with metrics.span("render", **attrs):
+            self.display_results(result)
+        self.timing_display.setText(metrics.format_text())
+
+    def begin_stream(self):
+        """开始接收流式输出，清除上一次的结果"""
+        self.current_result = None
+        self._stream_kind = None
+        self.optimize_btn.setEnabled(False)
+        self.summary_display.clear()
+        self.timing_display.clear()
+        self.clear_table()
+        self.save_btn.setEnabled(False)
+
+    def clear_table(self):
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.clear()
+        self.filter_edit.blockSignals(False)
+        self.table_model.set_dataframe(None)
+        self.row_count_label.clear()
+
+    def schedule_filter(self):
+        self.filter_timer.start()
+
+    def apply_filter(self):
+        """按筛选框内容过滤表格行（向量化匹配）"""
+        self.table_model.set_filter(self.filter_edit.text())
+        self.update_row_count()
+
+    def update_row_count(self):
+        total = len(self.table_model.dataframe())
+        shown = self.table_model.visible_row_count()
+        self.row_count_label.setText(f"{shown:,} / {total:,} 行" if shown != total else f"{total:,} 行")
+
+    def append_stream_text(self, kind, text):
+        """追加流式输出文本，分析完成后由 set_result 替换为最终结果"""
+        if kind != self._stream_kind:
+            header = "【推理过程】\n" if kind == "reasoning" else "【模型输出】\n"
+            if self._stream_kind is not None:
+                header = "\n\n" + header
+            self._stream_kind = kind
+            text = header + text
+
+        cursor = self.summary_display.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.summary_display.setTextCursor(cursor)
+        self.summary_display.ensureCursorVisible()
 
     def display_results(self, result):
         # 显示总结
@@ -82,24 +192,13 @@ class ResultsTab(QWidget):
             self.summary_display.setText(result["summary"])
             self.save_btn.setEnabled("result_table" in result and result["result_table"] is not None)
 
-        # 显示表格
+        # 显示表格（模型直接引用结果DataFrame，单元格在可见时才格式化）
+        self.clear_table()
         if "result_table" in result and isinstance(result["result_table"], pd.DataFrame):
-            df = result["result_table"].copy()
-            self.result_table.setRowCount(df.shape[0])
-            self.result_table.setColumnCount(df.shape[1])
-            self.result_table.setHorizontalHeaderLabels(df.columns)
-
-            for row in range(df.shape[0]):
-                for col in range(df.shape[1]):
-                    try:
-                        value = str(df.iloc[row, col])
-                        if value in ['NaT', 'nan', 'None', '']:
-                            value = ''
-                    except Exception as e:
-                        value = f"数据错误: {str(e)}"
-                    self.result_table.setItem(row, col, QTableWidgetItem(value))
-
+            self.result_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.table_model.set_dataframe(result["result_table"])
             self.result_table.resizeColumnsToContents()
+            self.update_row_count()
 
     def change_save_dir(self):
         """通过浏览更改当前保存目录（不影响默认目录）"""
@@ -125,26 +224,67 @@ class ResultsTab(QWidget):
             show_error_message(self, "错误", "没有可保存的结果")
             return
 
-        try:
-            df = self.current_result["result_table"]
-            base_name = "analysis_result"
-            # 使用当前保存目录作为保存路径
-            filename = get_unique_filename(self.current_save_dir, base_name, "csv")
-            file_path = os.path.join(self.current_save_dir, filename)
+        if getattr(self, "export_thread", None) and self.export_thread.isRunning():
+            show_error_message(self, "提示", "正在保存上一个结果，请稍候")
+            return
+
+        # 默认文件名位于当前保存目录，格式由对话框中的文件类型决定
+        base_name = "analysis_result"
+        filename = get_unique_filename(self.current_save_dir or ".", base_name, "csv")
+        filters, filter_formats = ResultExporter.dialog_filters()
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "保存结果", os.path.join(self.current_save_dir or "", filename), filters
+        )
+        if not file_path:
+            return
+
+        fmt = filter_formats.get(selected_filter) or ResultExporter.detect_format(file_path)
+        file_path = ResultExporter.ensure_extension(file_path, fmt)
+        df = self.current_result["result_table"]
+
+        # 在后台线程中分批写入
+        self.save_btn.setEnabled(False)
+        self.export_progress.setRange(0, max(len(df), 1))
+        self.export_progress.setValue(0)
+        self.export_progress.setVisible(True)
+        self.cancel_export_btn.setVisible(True)
+        self.export_thread = ExportThread(df, file_path, fmt)
+        self.export_thread.progress_signal.connect(self.update_export_progress)
+        self.export_thread.complete_signal.connect(self.export_complete)
+        self.export_thread.start()
+
+    def update_export_progress(self, done, total):
+        self.export_progress.setRange(0, max(total, 1))
+        self.export_progress.setValue(done)
+
+    def cancel_export(self):
+        if getattr(self, "export_thread", None) and self.export_thread.isRunning():
+            self.export_thread.cancel()
+
+    def export_complete(self, result):
+        self.export_progress.setVisible(False)
+        self.cancel_export_btn.setVisible(False)
+        self.save_btn.setEnabled(self.current_result is not None
+                                 and self.current_result.get("result_table") is not None)
+        if result["status"] == "success":
+            show_info_message(self, "成功", f"结果已保存至:\n{result['path']}")
+        elif result["status"] == "error":
+            show_error_message(self, "保存失败", f"无法保存结果: {result['message']}")
 
-            df.to_csv(file_path, index=False, encoding="utf-8-sig")
-            show_info_message(self, "成功", f"结果已保存至:\n{file_path}")
-        except Exception as e:
-            show_error_message(self, "保存失败", f"无法保存结果: {str(e)}")
+    def optimize_code(self):
+        """将当前结果的代码和性能报告交给分析页，生成更快的代码"""
+        if self.current_result and self.parent and hasattr(self.parent, 'analysis_tab'):
+            self.optimize_btn.setEnabled(False)
+            self.parent.analysis_tab.optimize_code(self.current_result)
 
     def start_new_analysis(self):
         """返回分析要求页并清除当前分析结果（保留已选文件）"""
         # 仅清除当前分析结果，不影响已选择的文件
         self.current_result = None
+        self.optimize_btn.setEnabled(False)
         self.summary_display.clear()
-        self.result_table.clear()
-        self.result_table.setRowCount(0)
-        self.result_table.setColumnCount(0)
+        self.timing_display.clear()
+        self.clear_table()
         self.save_btn.setEnabled(False)
 
         # 切换到分析要求页（数据分析标签页，索引为2）
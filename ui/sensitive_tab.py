@@ -1,9 +1,10 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-                             QPushButton, QTableWidget, QTableWidgetItem, QFileDialog,
+                             QPushButton, QTableView, QFileDialog, QCheckBox,
                              QGroupBox, QMessageBox, QHeaderView, QGridLayout, QApplication, QMenu)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 import os
 from utils.helpers import show_info_message, show_error_message
+from ui.sensitive_word_model import SensitiveWordModel
 
 
 class SensitiveWordTab(QWidget):
@@ -34,45 +35,65 @@ class SensitiveWordTab(QWidget):
         btn_layout.addWidget(self.export_btn)
         btn_layout.addStretch()
 
-        # 表格区域
-        self.table = QTableWidget()
-        self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(["敏感词", "替换词"])
+        # 搜索区域
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索敏感词或替换词...")
+        self.search_edit.textChanged.connect(self.schedule_search)
+        self.prefix_check = QCheckBox("前缀匹配")
+        self.prefix_check.toggled.connect(self.apply_search)
+        self.count_label = QLabel()
+        search_layout.addWidget(self.search_edit, 1)
+        search_layout.addWidget(self.prefix_check)
+        search_layout.addWidget(self.count_label)
+
+        # 搜索防抖，连续输入时只搜索一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.apply_search)
+
+        # 表格区域（模型直接读取敏感词字典，只渲染可见行）
+        self.model = SensitiveWordModel(self.sensitive_processor, self)
+        self.model.rowsInserted.connect(self.update_count)
+        self.model.rowsRemoved.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.verticalHeader().setDefaultSectionSize(22)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
 
         # 添加到主布局
         main_layout.addLayout(btn_layout)
+        main_layout.addLayout(search_layout)
         main_layout.addWidget(self.table)
 
     def refresh_table(self):
-        """刷新表格数据"""
-        words = self.sensitive_processor.get_all_sensitive_words()
-        self.table.setRowCount(len(words))
+        """重新加载全部敏感词（导入等批量修改后调用）"""
+        self.model.reload()
 
-        for row, (word, replacement) in enumerate(words):
-            word_item = QTableWidgetItem(word)
-            replacement_item = QTableWidgetItem(replacement)
+    def schedule_search(self, _text=None):
+        self.search_timer.start()
 
-            word_item.setFlags(word_item.flags() & ~Qt.ItemIsEditable)
-            replacement_item.setFlags(replacement_item.flags() & ~Qt.ItemIsEditable)
+    def apply_search(self, *args):
+        self.search_timer.stop()
+        self.model.set_search(self.search_edit.text(), prefix=self.prefix_check.isChecked())
 
-            self.table.setItem(row, 0, word_item)
-            self.table.setItem(row, 1, replacement_item)
+    def update_count(self, *args):
+        shown = self.model.rowCount()
+        total = self.model.total_count()
+        self.count_label.setText(f"共 {total} 个" if shown == total else f"匹配 {shown} / {total} 个")
 
     def show_context_menu(self, position):
         """显示右键菜单"""
-        item = self.table.itemAt(position)
-        if not item:
+        index = self.table.indexAt(position)
+        if not index.isValid():
             return
 
-        row = item.row()
-        word_item = self.table.item(row, 0)
-        if not word_item:
-            return
-
-        word = word_item.text()
+        word = self.model.word_at(index.row())
 
         # 创建菜单
         menu = QMenu(self)
@@ -85,7 +106,7 @@ class SensitiveWordTab(QWidget):
         if action == edit_action:
             self.edit_word_dialog(word)
         elif action == copy_action:
-            replacement = self.table.item(row, 1).text()
+            replacement = self.sensitive_processor.get_replacement(word)
             clipboard = QApplication.clipboard()
             clipboard.setText(replacement)
             show_info_message(self, "成功", "替换词已复制到剪贴板")
@@ -119,17 +140,13 @@ class SensitiveWordTab(QWidget):
 
             success, msg = self.sensitive_processor.add_sensitive_word(word, replacement)
             if success:
-                self.refresh_table()
+                self.model.word_added(word.strip())
             show_info_message(self, "结果", msg)
 
     def edit_word_dialog(self, old_word):
         """编辑敏感词对话框"""
         # 获取当前替换词
-        replacement = None
-        for word, rep in self.sensitive_processor.get_all_sensitive_words():
-            if word == old_word:
-                replacement = rep
-                break
+        replacement = self.sensitive_processor.get_replacement(old_word)
 
         if not replacement:
             show_error_message(self, "错误", "未找到该敏感词")
@@ -160,7 +177,7 @@ class SensitiveWordTab(QWidget):
                 old_word, new_word, new_replacement
             )
             if success:
-                self.refresh_table()
+                self.model.word_updated(old_word, new_word)
             show_info_message(self, "结果", msg)
 
     def delete_word(self, word):
@@ -175,7 +192,7 @@ class SensitiveWordTab(QWidget):
             # 调用处理器的删除方法
             success, msg = self.sensitive_processor.remove_sensitive_word(word)
             if success:
-                self.refresh_table()
+                self.model.word_removed(word)
                 show_info_message(self, "成功", f"敏感词 '{word}' 已删除")
             else:
                 show_error_message(self, "失败", msg)
@@ -201,7 +218,7 @@ class SensitiveWordTab(QWidget):
 
     def export_words(self):
         """导出敏感词"""
-        if not self.sensitive_processor.get_all_sensitive_words():
+        if not self.sensitive_processor.sensitive_words:
             show_info_message(self, "提示", "没有敏感词可导出")
             return
 
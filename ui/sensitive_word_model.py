@@ -0,0 +1,220 @@
+import bisect
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class WordSearchIndex:
+    """敏感词搜索索引：
+    前缀查询使用按小写排序的敏感词和替换词列表（二分查找）；
+    子串查询在所有词拼接成的小写文本中查找（C实现的 str.find），再通过行起始偏移二分定位到敏感词。
+    增删改时更新有序列表，拼接文本在下次子串查询时才重建"""
+
+    def __init__(self):
+        self._prefix_keys = []  # 有序的 (小写文本, 敏感词)，敏感词和替换词各一项
+        self._pairs = {}  # 敏感词 -> 替换词
+        self._text = ""
+        self._line_starts = []
+        self._line_words = []
+        self._text_dirty = True
+
+    def rebuild(self, pairs):
+        self._pairs = dict(pairs)
+        self._prefix_keys = sorted(
+            key for word, replacement in self._pairs.items() for key in self._keys(word, replacement)
+        )
+        self._text_dirty = True
+
+    @staticmethod
+    def _keys(word, replacement):
+        return [(word.lower(), word), (replacement.lower(), word)]
+
+    def add(self, word, replacement):
+        self._pairs[word] = replacement
+        for key in self._keys(word, replacement):
+            bisect.insort(self._prefix_keys, key)
+        self._text_dirty = True
+
+    def remove(self, word):
+        replacement = self._pairs.pop(word, None)
+        if replacement is None:
+            return
+        for key in self._keys(word, replacement):
+            position = bisect.bisect_left(self._prefix_keys, key)
+            if position < len(self._prefix_keys) and self._prefix_keys[position] == key:
+                del self._prefix_keys[position]
+        self._text_dirty = True
+
+    def _build_text(self):
+        # 每行为“敏感词\0替换词\n”，查询词不含这两个分隔符，因此匹配不会跨越两个词
+        parts = []
+        self._line_starts = []
+        self._line_words = []
+        offset = 0
+        for word, replacement in self._pairs.items():
+            line = f"{word}\0{replacement}\n".lower()
+            self._line_starts.append(offset)
+            self._line_words.append(word)
+            parts.append(line)
+            offset += len(line)
+        self._text = "".join(parts)
+        self._text_dirty = False
+
+    def search_prefix(self, query):
+        """敏感词或替换词以 query 开头（不区分大小写）的敏感词集合"""
+        query = query.lower()
+        start = bisect.bisect_left(self._prefix_keys, (query,))
+        matched = set()
+        for key, word in self._prefix_keys[start:]:
+            if not key.startswith(query):
+                break
+            matched.add(word)
+        return matched
+
+    def search_substring(self, query):
+        """敏感词或替换词包含 query（不区分大小写）的敏感词集合"""
+        query = query.lower().replace("\0", "").replace("\n", "")
+        if not query:
+            return set(self._pairs)
+        if self._text_dirty:
+            self._build_text()
+        matched = set()
+        text = self._text
+        position = text.find(query)
+        while position != -1:
+            line = bisect.bisect_right(self._line_starts, position) - 1
+            matched.add(self._line_words[line])
+            # 同一行只需命中一次，直接跳到下一行继续查找
+            next_line = line + 1
+            position = text.find(query, self._line_starts[next_line]) if next_line < len(self._line_starts) else -1
+        return matched
+
+
+class SensitiveWordModel(QAbstractTableModel):
+    """敏感词表格模型：直接读取敏感词处理器的字典，只渲染可见行；
+    增删改按行更新，搜索通过 WordSearchIndex 完成"""
+
+    COLUMNS = ["敏感词", "替换词"]
+
+    def __init__(self, sensitive_processor, parent=None):
+        super().__init__(parent)
+        self.sensitive_processor = sensitive_processor
+        self.search_index = WordSearchIndex()
+        self._words = []  # 显示顺序的全部敏感词
+        self._visible = []  # 当前显示的敏感词（未搜索时与 _words 相同）
+        self._rows = {}  # 敏感词 -> 在 _visible 中的行号
+        self._query = ""
+        self._prefix = False
+        self.reload()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        word = self._visible[index.row()]
+        if index.column() == 0:
+            return word
+        return self.sensitive_processor.get_replacement(word)
+
+    def word_at(self, row):
+        return self._visible[row]
+
+    def row_of(self, word):
+        """敏感词所在的行号，不在当前显示中时返回None"""
+        return self._rows.get(word)
+
+    def total_count(self):
+        return len(self._words)
+
+    def reload(self):
+        """从处理器重新加载全部敏感词（导入等批量修改后调用）"""
+        self.beginResetModel()
+        self._words = list(self.sensitive_processor.sensitive_words)
+        self.search_index.rebuild(self.sensitive_processor.sensitive_words.items())
+        self._apply_search()
+        self.endResetModel()
+
+    def _apply_search(self):
+        if not self._query:
+            self._visible = self._words  # 未搜索时共用同一列表
+        else:
+            if self._prefix:
+                matched = self.search_index.search_prefix(self._query)
+            else:
+                matched = self.search_index.search_substring(self._query)
+            self._visible = [word for word in self._words if word in matched]
+        self._rows = {word: row for row, word in enumerate(self._visible)}
+
+    def set_search(self, query, prefix=False):
+        """按子串（或前缀）搜索敏感词和替换词，空查询显示全部"""
+        query = query.strip()
+        if query == self._query and prefix == self._prefix:
+            return
+        self.beginResetModel()
+        self._query = query
+        self._prefix = prefix
+        self._apply_search()
+        self.endResetModel()
+
+    def _word_matches(self, word):
+        """单个敏感词是否符合当前搜索条件"""
+        if not self._query:
+            return True
+        query = self._query.lower()
+        texts = (word.lower(), self.sensitive_processor.get_replacement(word).lower())
+        if self._prefix:
+            return any(text.startswith(query) for text in texts)
+        return any(query in text for text in texts)
+
+    def word_added(self, word):
+        """新增敏感词后调用：追加到末尾，符合当前搜索条件时插入一行"""
+        self.search_index.add(word, self.sensitive_processor.get_replacement(word))
+        if not self._word_matches(word):
+            self._words.append(word)
+            return
+        row = len(self._visible)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._words.append(word)
+        if self._visible is not self._words:
+            self._visible.append(word)
+        self._rows[word] = row
+        self.endInsertRows()
+
+    def word_removed(self, word):
+        """删除敏感词后调用"""
+        self.search_index.remove(word)
+        row = self._rows.pop(word, None)
+        if row is None:
+            self._words.remove(word)
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._visible[row]
+        if self._visible is not self._words:
+            self._words.remove(word)
+        for later in self._visible[row:]:
+            self._rows[later] = self._rows[later] - 1
+        self.endRemoveRows()
+
+    def word_updated(self, old_word, new_word):
+        """修改敏感词或替换词后调用：在原行更新，不改变行顺序"""
+        self.search_index.remove(old_word)
+        self.search_index.add(new_word, self.sensitive_processor.get_replacement(new_word))
+        if self._visible is not self._words:
+            self._words[self._words.index(old_word)] = new_word
+
+        row = self._rows.pop(old_word, None)
+        if row is None:
+            return
+        self._visible[row] = new_word
+        self._rows[new_word] = row
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
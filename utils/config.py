@@ -8,8 +8,11 @@ class Config:
         # 初始化为空目录，不自动设置
         self.config = {
             "api_key": "",
+            "api_base_url": "https://api.deepseek.com",
             "data_dir": "",
             "save_dir": "",
+            "cache_dir": "",
+            "stream_responses": True,
             "verbose_logging": False
         }
         self.load()
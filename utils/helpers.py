@@ -1,5 +1,6 @@
 import os
 import re
+import hashlib
 from PyQt5.QtWidgets import QMessageBox
 
 
@@ -51,6 +52,14 @@ def get_unique_filename(directory, base_name, extension):
     return filename
 
 
+def format_size(num_bytes):
+    """将字节数格式化为便于阅读的大小"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
 def is_valid_file(file_path):
     """验证支持的文件类型"""
     if not os.path.exists(file_path):
@@ -69,4 +78,21 @@ def is_valid_file(file_path):
     if ext.lower() not in supported_exts:
         return False, f"不支持的文件格式: {ext}。支持: {', '.join(supported_exts)}"
 
-    return True, "有效的文件"
\ No newline at end of file
+    return True, "有效的文件"
+
+
+def get_file_fingerprint(file_path):
+    """生成文件指纹（绝对路径+大小+修改时间），文件内容变化后指纹随之改变"""
+    stat = os.stat(file_path)
+    raw = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_cache_dir(config, sub_dir=""):
+    """获取缓存目录（未配置时默认使用项目根目录下的cache），不存在则创建"""
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = config.get("cache_dir") or os.path.join(root_dir, "cache")
+    if sub_dir:
+        cache_dir = os.path.join(cache_dir, sub_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir